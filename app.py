@@ -1,6 +1,5 @@
 ﻿from __future__ import annotations
 import logging
-import time
 import os
 from dotenv import load_dotenv
 
@@ -13,8 +12,9 @@ if "GEMINI_API_KEY" in os.environ and "GOOGLE_API_KEY" not in os.environ:
 
 import mimetypes
 import shutil
+from contextlib import aclosing
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
 from datetime import datetime
 import random
 import config
@@ -41,7 +41,23 @@ from fastapi import FastAPI
 
 # Імпарты з вашага праекта
 from services.adk_service import ADKService
-from tools.text_to_speech_tool import register_voice_user, unregister_voice_user, stream_speech
+from services.worker_pool import PoolSaturatedError
+from services.turn_scheduler import SessionBusyError
+from services.voice_pipeline import SentenceSegmenter, OrderedTtsPipeline
+from services.voice_protocol import ResponseStream, negotiate_protocol
+from services.vad import StreamingVad, UtteranceBuffer
+from services.audio_codec import WAV_HEADER_SIZE, AudioEncoder
+from services.audio_egress import AudioEgressBuffer
+from services.metrics import ENDPOINT_STAGE, VoiceTrace, cancellation, voice_traces
+from services.voice_memory import SystemPromptCache, VoiceConversation
+from services.live_voice import GeminiLiveBackend
+from services.upload_store import UploadStore, UploadTooLargeError, parse_size_limits
+from services.artifact_store import ArtifactStore
+from services.history_store import ChatHistoryStore
+from tools.text_to_speech_tool import (
+    register_voice_user, unregister_voice_user, stream_speech, speak_phrase, prewarm_tts_cache, tts_cache, tts_engine,
+    warmup_tts_clients, check_tts_clients, tts_clients_health, tts_pools_stats,
+)
 
 # ---------------------------------------------------------------------
 # Ініцыялізацыя Сэрвісаў ---------------------------------------------
@@ -68,11 +84,40 @@ def get_genai_client():
         genai_client = genai.Client(api_key=config.GEMINI_API_KEY)
     return genai_client
 
+# Static system prompt of the simple voice agent in a Gemini context cache (shared by all connections)
+voice_prompt_cache = None
+
+def get_voice_prompt_cache():
+    global voice_prompt_cache
+    if not voice_prompt_cache:
+        voice_prompt_cache = SystemPromptCache(
+            get_genai_client(),
+            model=config.SIMPLE_VOICE_MODEL,
+            system_prompt=config.SIMPLE_VOICE_SYSTEM_PROMPT,
+            ttl_seconds=config.VOICE_PROMPT_CACHE_TTL,
+            min_tokens=config.VOICE_PROMPT_CACHE_MIN_TOKENS,
+        )
+    return voice_prompt_cache
+
+# Content-addressed storage for uploaded files
+upload_store = UploadStore(
+    FILES_DIR / "uploads",
+    size_limits=parse_size_limits(config.UPLOAD_SIZE_LIMITS),
+    default_limit=config.UPLOAD_DEFAULT_MAX_BYTES,
+    inline_max_bytes=config.UPLOAD_INLINE_MAX_BYTES,
+    index_size=config.UPLOAD_INDEX_MAX_ENTRIES,
+    client_factory=lambda: get_genai_client() if config.GEMINI_API_KEY else None,
+)
+
+# Content-addressed storage for agent artifacts served from /api/files
+artifact_store = ArtifactStore(FILES_DIR, url_prefix="/api/files", index_size=config.ARTIFACT_INDEX_MAX_ENTRIES)
+
 # CORS for frontend
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import File, UploadFile, Form, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
-from typing import List, Optional
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional, Tuple
 import asyncio
 import json
 
@@ -84,384 +129,692 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store chat history in memory (per user)
-chat_histories: Dict[str, List[Dict]] = {}
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject chat uploads whose declared size is above the largest cap before the body is read.
+
+    Bodies without Content-Length (chunked) are capped while they are parsed (UploadStore.receive_form).
+    """
+    if request.url.path.startswith("/api/chat") and request.method == "POST":
+        declared = request.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > upload_store.max_body:
+            return JSONResponse({"error": "Upload too large"}, status_code=413)
+    return await call_next(request)
+
+
+# Store chat history in memory (per user, bounded)
+chat_histories = ChatHistoryStore(
+    max_messages=config.CHAT_HISTORY_MAX_MESSAGES,
+    max_users=config.CHAT_HISTORY_MAX_USERS,
+    ttl_seconds=config.CHAT_HISTORY_TTL,
+)
 
 # ---------------------------------------------------------------------
 # REST API Endpoints --------------------------------------------------
 
 @app.post("/api/chat")
-async def api_chat(
-    text: str = Form(""),
-    user_id: str = Form("default"),
-    files: List[UploadFile] = File(default=[]),
-):
-    """Handle chat messages from the frontend"""
+async def api_chat(request: Request):
+    """Handle chat messages from the frontend (form fields `text`, `user_id`, `files`).
+
+    Text and all attachments go to the agent as one multi-part turn; only when the
+    attachments exceed the inline request budget are they split into several turns,
+    which run one after another. Turns of one session never overlap: a request
+    waits for the previous one and gets 429 when too many are already queued.
+    """
+    text, user_id, attachments = await _read_chat_form(request)
     session_id = await adk_service.get_or_create_session(user_id)
     
-    if user_id not in chat_histories:
-        chat_histories[user_id] = []
-    
     response = {"text": None, "audio": None, "image": None}
     
-    # Process files if any
-    for uploaded_file in files:
-        try:
-            file_bytes = await uploaded_file.read()
-            mime = uploaded_file.content_type or _guess_mime(Path(uploaded_file.filename))
-            
-            # Save file
-            file_path = FILES_DIR / uploaded_file.filename
-            with open(file_path, "wb") as f:
-                f.write(file_bytes)
-            
-            text_reply, delta, parts = adk_service.run_agent(
-                session_id=session_id,
-                user_id=user_id,
-                text=text if text else None,
-                file_data=file_bytes,
-                mime_type=mime,
-            )
-            
-            if text_reply:
-                response["text"] = text_reply
-            
-            # Handle artifacts (audio/image)
-            for filename, version in delta.items():
+    if text or attachments:
+        ticket = _admit_turn(session_id)
+        batches = _batch_attachments(attachments, config.CHAT_MAX_INLINE_BYTES) or [[]]
+        results: List[Any] = []
+        async with ticket:
+            for idx, batch in enumerate(batches):
                 try:
-                    part = await adk_service.artifact_service.load_artifact(
-                        app_name=getattr(adk_service, "app_name", "app"),
-                        user_id=user_id,
+                    results.append(await adk_service.run_agent_async(
                         session_id=session_id,
-                        filename=filename,
-                        version=version,
-                    )
-                    if part and getattr(part, "inline_data", None) and getattr(part.inline_data, "data", None):
-                        artifact_path = FILES_DIR / filename
-                        with open(artifact_path, "wb") as f:
-                            f.write(part.inline_data.data)
-                        
-                        mime_type = getattr(part.inline_data, "mime_type", "")
-                        if mime_type.startswith("audio"):
-                            response["audio"] = f"/api/files/{filename}"
-                        elif mime_type.startswith("image"):
-                            response["image"] = f"/api/files/{filename}"
-                except Exception as e:
-                    log.error(f"Error loading artifact: {e}")
-            
-            text = ""  # Clear text after first file
-            
-        except Exception as e:
-            log.exception(f"Error processing file: {e}")
-    
-    # Process text-only message
-    if text and not files:
-        try:
-            text_reply, delta, parts = adk_service.run_agent(
-                session_id=session_id,
-                user_id=user_id,
-                text=text,
-                file_data=None,
-                mime_type=None,
-            )
-            
-            if text_reply:
-                response["text"] = text_reply
-            
-            # Handle artifacts
-            for filename, version in delta.items():
-                try:
-                    part = await adk_service.artifact_service.load_artifact(
-                        app_name=getattr(adk_service, "app_name", "app"),
                         user_id=user_id,
-                        session_id=session_id,
-                        filename=filename,
-                        version=version,
-                    )
-                    if part and getattr(part, "inline_data", None) and getattr(part.inline_data, "data", None):
-                        artifact_path = FILES_DIR / filename
-                        with open(artifact_path, "wb") as f:
-                            f.write(part.inline_data.data)
-                        
-                        mime_type = getattr(part.inline_data, "mime_type", "")
-                        if mime_type.startswith("audio"):
-                            response["audio"] = f"/api/files/{filename}"
-                        elif mime_type.startswith("image"):
-                            response["image"] = f"/api/files/{filename}"
+                        # The text belongs to the first turn; later turns only carry the remaining files
+                        text=(text or None) if idx == 0 else None,
+                        attachments=batch,
+                    ))
                 except Exception as e:
-                    log.error(f"Error loading artifact: {e}")
-                    
-        except Exception as e:
-            log.exception(f"Error running agent: {e}")
+                    results.append(e)
+        
+        replies, delta = [], {}
+        for result in results:
+            if isinstance(result, BaseException):
+                log.error(f"Error running agent: {result!r}")
+                continue
+            text_reply, turn_delta, _ = result
+            if text_reply:
+                replies.append(text_reply)
+            delta.update(turn_delta)
+        
+        if replies:
+            response["text"] = "\n\n".join(replies)
+        elif all(isinstance(r, BaseException) for r in results):
             response["text"] = "Прабачце, адбылася памылка. Паспрабуйце яшчэ раз."
+        
+        # Handle artifacts (audio/image)
+        for artifact in await artifact_store.materialize_many(
+            adk_service.artifact_service, adk_service.app_name, user_id, session_id, delta
+        ):
+            response[artifact.kind] = artifact.url
     
     # Store in history
     if text:
-        chat_histories[user_id].append({"role": "user", "content": text})
+        chat_histories.append(user_id, "user", text)
     if response["text"]:
-        chat_histories[user_id].append({"role": "assistant", "content": response["text"]})
+        chat_histories.append(user_id, "assistant", response["text"])
     
     return response
 
 
+@app.post("/api/chat/stream")
+async def api_chat_stream(request: Request):
+    """Stream the agent reply as Server-Sent Events.
+
+    Events: `delta` (partial text), `tool` (tool call started / finished),
+    `artifact` (audio/image ready), `error`, and a closing `done` with the full text.
+    Attachments are batched and the session turn is queued the same way as in /api/chat.
+    """
+    text, user_id, attachments = await _read_chat_form(request)
+    session_id = await adk_service.get_or_create_session(user_id)
+
+    batches = _batch_attachments(attachments, config.CHAT_MAX_INLINE_BYTES) or [[]]
+    # Admit before the response starts so a full queue is still a plain 429
+    ticket = _admit_turn(session_id) if text or attachments else None
+
+    async def event_source():
+        try:
+            # Flush headers and the first bytes right away (time-to-first-byte)
+            yield ": stream opened\n\n"
+            replies: Dict[int, str] = {}
+            streamed: set[int] = set()
+            if ticket is not None:
+                async with ticket:
+                    streams = [
+                        adk_service.run_agent_stream(
+                            session_id=session_id,
+                            user_id=user_id,
+                            text=(text or None) if idx == 0 else None,
+                            attachments=batch,
+                            streaming=True,
+                        )
+                        for idx, batch in enumerate(batches)
+                    ]
+                    async with aclosing(_chain_streams(streams)) as agent_events:
+                        async for idx, ev in agent_events:
+                            if isinstance(ev, PoolSaturatedError):
+                                log.warning(f"Chat stream rejected for user {user_id}: {ev}")
+                                yield _sse("error", {"message": config.DEFAULT_BUSY})
+                                continue
+                            if isinstance(ev, Exception):
+                                log.error(f"Error streaming agent reply: {ev!r}")
+                                yield _sse("error", {"message": "Прабачце, адбылася памылка. Паспрабуйце яшчэ раз."})
+                                continue
+
+                            if ev.partial:
+                                if ev.content and ev.content.parts:
+                                    delta_text = "".join(
+                                        p.text for p in ev.content.parts if p.text and not getattr(p, "thought", False)
+                                    )
+                                    if delta_text:
+                                        # Turns run one after another; separate their replies like `done` does
+                                        if idx not in streamed and streamed:
+                                            delta_text = "\n\n" + delta_text
+                                        streamed.add(idx)
+                                        yield _sse("delta", {"text": delta_text})
+                                continue
+
+                            for call in ev.get_function_calls():
+                                yield _sse("tool", {"name": call.name, "status": "started"})
+                            for resp in ev.get_function_responses():
+                                yield _sse("tool", {"name": resp.name, "status": "done"})
+
+                            if ev.actions and ev.actions.artifact_delta:
+                                for artifact in await artifact_store.materialize_many(
+                                    adk_service.artifact_service, adk_service.app_name, user_id, session_id,
+                                    ev.actions.artifact_delta,
+                                ):
+                                    yield _sse("artifact", {"kind": artifact.kind, "url": artifact.url})
+
+                            if ev.is_final_response() and ev.content and ev.content.parts:
+                                reply = "\n".join(p.text for p in ev.content.parts if p.text and not getattr(p, "thought", False))
+                                if reply:
+                                    replies[idx] = reply
+
+            final_text = "\n\n".join(replies[i] for i in sorted(replies))
+            yield _sse("done", {"text": final_text})
+
+            if text:
+                chat_histories.append(user_id, "user", text)
+            if final_text:
+                chat_histories.append(user_id, "assistant", final_text)
+        finally:
+            # The ticket was admitted before the response started: release it even when the
+            # client leaves at the first yield (async with ticket has not been entered yet)
+            if ticket is not None:
+                ticket.release()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Covers a generator that never starts (client gone before the body is sent)
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+
 @app.get("/api/chat/history")
-async def get_chat_history(user_id: str = "default"):
-    """Get chat history for a user"""
-    return {"history": chat_histories.get(user_id, [])}
+async def get_chat_history(user_id: str = "default", cursor: Optional[int] = None, limit: int = 50):
+    """Get a page of chat history for a user.
+
+    Without `cursor` the newest messages are returned; pass the returned
+    `next_cursor` to fetch the page before it (null when there is nothing older).
+    """
+    limit = max(1, min(limit, config.CHAT_HISTORY_PAGE_MAX))
+    messages, next_cursor = chat_histories.page(user_id, before=cursor, limit=limit)
+    return {"history": [m.to_dict() for m in messages], "next_cursor": next_cursor}
 
 
 @app.delete("/api/chat/history")
 async def clear_chat_history(user_id: str = "default"):
     """Clear chat history for a user"""
-    if user_id in chat_histories:
-        chat_histories[user_id] = []
+    chat_histories.clear(user_id)
     return {"status": "ok"}
 
 
+@app.get("/api/health")
+async def get_health():
+    """Liveness plus the state of the TTS backends ("degraded" while a backend has no connected client)"""
+    tts = tts_clients_health()
+    status = "ok" if all(pool["ready"] for pool in tts.values()) else "degraded"
+    return {"status": status, "agent": adk_service is not None, "tts": tts}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics (worker pools, queues)"""
+    return {
+        "agent_stream_pool": adk_service.stream_pool.stats(),
+        "cancellation": cancellation.snapshot(),
+        "session_turns": adk_service.turns.stats(),
+        "chat_history": chat_histories.stats(),
+        "sessions": adk_service.sessions.stats(),
+        "voice_latency": voice_traces.snapshot(),
+        "voice_egress": {uid: buf.stats() for uid, buf in voice_egress_buffers.items()},
+        "tts_streams": tts_engine.stats(),
+        "tts_pools": tts_pools_stats(),
+        "tts_cache": tts_cache.stats() if tts_cache else None,
+        "voice_prompt_cache": voice_prompt_cache.stats() if voice_prompt_cache else None,
+    }
+
+
+@app.on_event("startup")
+async def on_startup():
+    # TTS Spaces are connected in the background; the first request waits only if that is not done yet
+    warmup_tts_clients()
+    if config.TTS_HEALTH_INTERVAL > 0:
+        app.state.tts_health = asyncio.create_task(_tts_health_loop(config.TTS_HEALTH_INTERVAL))
+    if tts_cache is not None and config.TTS_PREWARM_PHRASES:
+        # In the background: startup does not wait for the remote TTS
+        app.state.tts_prewarm = asyncio.create_task(prewarm_tts_cache(config.TTS_PREWARM_PHRASES))
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    tts_engine.shutdown()
+    if voice_prompt_cache:
+        await voice_prompt_cache.close()
+    if adk_service:
+        adk_service.stream_pool.shutdown(wait=False)
+        close = getattr(adk_service.session_service, "close", None)
+        if close is not None:
+            # Скідае чаргу адкладзеных запісаў сесій
+            close()
+
+
 @app.get("/api/files/{filename}")
-async def get_file(filename: str):
-    """Serve files (audio, images, etc.)"""
-    file_path = FILES_DIR / filename
-    if not file_path.exists():
-        return {"error": "File not found"}, 404
+async def get_file(filename: str, request: Request):
+    """Serve files (audio, images, etc.) with ETag, caching and Range support"""
+    file_path = artifact_store.resolve(filename)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
     
     mime = _guess_mime(file_path)
-    return FileResponse(file_path, media_type=mime)
+    return artifact_store.file_response(file_path, request, media_type=mime)
 
 
 # WebSocket for real-time voice agent
 # Global dictionary to track active voice tasks for interruption
 active_voice_tasks: Dict[str, asyncio.Task] = {}
+# Outgoing audio buffers of open voice connections (occupancy is reported on /api/metrics)
+voice_egress_buffers: Dict[str, AudioEgressBuffer] = {}
 
 @app.websocket("/api/voice")
-async def voice_websocket(websocket: WebSocket, user_id: str = "voice_user"):
-    """Real-time voice conversation with the agent"""
+async def voice_websocket(
+    websocket: WebSocket,
+    user_id: str = "voice_user",
+    proto: Optional[str] = None,
+    vad: Optional[str] = None,
+    codec: Optional[str] = None,
+    mode: Optional[str] = None,
+):
+    """Real-time voice conversation with the agent
+
+    `?proto=2` switches reply text to `response_delta` / `response_snapshot`
+    messages; without it every `response` carries the whole text (v1).
+    `?vad=server` makes the server cut utterances itself (client may stream continuously);
+    otherwise the client ends each utterance with `end_audio`.
+    `?codec=f32|pcm16|mulaw[@rate]` picks the encoding of outgoing audio chunks
+    (announced in an `audio_format` message); each chunk stays a standalone WAV.
+    `?mode=live` (simple voice agent) opens a Gemini Live session when speech starts and
+    streams the audio into it as it arrives; `end_audio` only finalizes the turn.
+    """
     await websocket.accept()
-    log.info(f"Voice WebSocket connected for user {user_id}")
+    protocol = negotiate_protocol(proto)
+    log.info(f"Voice WebSocket connected for user {user_id} (protocol v{protocol})")
+    await websocket.send_json({"type": "hello", "proto": protocol})
+    audio_encoder = AudioEncoder.negotiate(codec or config.VOICE_AUDIO_CODEC)
+    await websocket.send_json(audio_encoder.describe())
     
     session_id = await adk_service.get_or_create_session(user_id)
+    # The id is reused for every turn of the connection: keep the session from TTL/LRU eviction while it is open
+    adk_service.sessions.pin(user_id)
     
-    # Create queue for streaming audio and register user
-    audio_queue = asyncio.Queue()
+    # Bounded outgoing audio buffer (byte budget + overflow policy); TTS tool threads write into it too
+    audio_egress = AudioEgressBuffer(
+        max_bytes=config.VOICE_EGRESS_MAX_BYTES,
+        policy=config.VOICE_EGRESS_POLICY,
+        frame_bytes=config.VOICE_EGRESS_FRAME_BYTES,
+    )
+    voice_egress_buffers[user_id] = audio_egress
     loop = asyncio.get_running_loop()
-    register_voice_user(user_id, audio_queue, loop)
+    register_voice_user(user_id, audio_egress, loop)
     
-    # Accumulator for continuous audio upload
-    audio_accumulator = bytearray()
+    # 16 kHz int16 PCM of the current utterance, capped; WAV header space reserved up front
+    server_vad = vad == "server" if vad else config.VOICE_SERVER_VAD
+    vad_detector = StreamingVad(
+        hangover_ms=config.VOICE_VAD_HANGOVER_MS,
+        max_seconds=config.VOICE_MAX_UTTERANCE_SECONDS,
+    ) if server_vad else None
+    utterance = vad_detector.buffer if vad_detector else UtteranceBuffer(
+        int(config.VOICE_MAX_UTTERANCE_SECONDS * 16000) * 2
+    )
     
     async def audio_sender():
-        """Consumes audio chunks from queue and sends to websocket"""
+        """Sends (coalesced) audio frames from the egress buffer to the websocket"""
         try:
             while True:
-                chunk = await audio_queue.get()
-                if chunk is None: break # Sentinel
-                await websocket.send_bytes(chunk)
-                audio_queue.task_done()
+                frame = await audio_egress.get()
+                if frame is None: break # Buffer closed
+                await websocket.send_bytes(audio_encoder.encode(frame))
+            if audio_egress.overflowed:
+                # Slow client under the "disconnect" policy
+                log.warning(f"Voice client {user_id} is not keeping up with audio; disconnecting")
+                await websocket.close(code=1013)
         except Exception as e:
             log.error(f"Audio sender error: {e}")
 
     # Start audio sender task
     sender_task = asyncio.create_task(audio_sender())
 
-    async def process_voice_message(audio_data: bytes):
+    voice_mode = "simple" if config.SIMPLE_VOICE_AGENT else "agent"
+    # Live mode: model session opened at speech start, audio uploaded while the user speaks
+    live_backend = None
+    if (mode or config.VOICE_DEFAULT_MODE) == "live":
+        if not config.SIMPLE_VOICE_AGENT:
+            log.warning("Live voice mode needs SIMPLE_VOICE_AGENT; using the agent path")
+        else:
+            live_backend = GeminiLiveBackend(
+                get_genai_client,
+                model=config.VOICE_LIVE_MODEL,
+                system_prompt=config.SIMPLE_VOICE_SYSTEM_PROMPT,
+                max_session_seconds=config.VOICE_LIVE_SESSION_SECONDS,
+            )
+            if vad_detector is not None:
+                log.warning("Live voice mode uses client endpointing (end_audio); server VAD is off")
+                vad_detector = None
+                utterance = UtteranceBuffer(int(config.VOICE_MAX_UTTERANCE_SECONDS * 16000) * 2)
+    live_input: Optional[asyncio.Queue] = None  # frames of the utterance being spoken (live mode)
+    live_task: Optional[asyncio.Task] = None  # live turn of that utterance (becomes the active task on end_audio)
+    # Trace of the utterance being received: starts on its first frame (speech start with server VAD)
+    pending_trace: Optional[VoiceTrace] = None
+    conversation = VoiceConversation(
+        get_genai_client,
+        summary_model=config.VOICE_MEMORY_SUMMARY_MODEL,
+        token_budget=config.VOICE_MEMORY_TOKEN_BUDGET,
+        keep_turns=config.VOICE_MEMORY_KEEP_TURNS,
+    ) if config.SIMPLE_VOICE_AGENT and config.VOICE_MEMORY_ENABLED else None
+
+    def receive_trace(mode: str) -> VoiceTrace:
+        """Closes the receive stage of the current utterance; its trace starts now if no frame was seen."""
+        nonlocal pending_trace
+        trace, pending_trace = pending_trace or voice_traces.start(user_id, mode), None
+        trace.mark(ENDPOINT_STAGE)
+        trace.attrs["endpointing"] = "server" if vad_detector is not None else "client"
+        return trace
+
+    def start_voice_turn(wav: bytearray, trace: VoiceTrace):
+        # Cancel previous task if still running
+        if user_id in active_voice_tasks and not active_voice_tasks[user_id].done():
+            active_voice_tasks[user_id].cancel()
+        trace.mark("wav_ready")
+        trace.attrs["audio_bytes"] = len(wav)
+        active_voice_tasks[user_id] = asyncio.create_task(process_voice_message(wav, trace))
+
+    async def send_trace(trace: VoiceTrace):
+        """Per-stage timings of the turn for the client debug panel."""
+        if config.SIMPLE_VOICE_DEBUG_TIMESTAMPS:
+            await websocket.send_json({"type": "trace", **trace.to_dict()})
+
+    async def say_fixed(phrase: str, trace: Optional[VoiceTrace] = None):
+        """Fixed replies (busy / error / no answer) are spoken too; their audio is pre-warmed in the TTS cache"""
+        try:
+            async with aclosing(speak_phrase(phrase)) as chunks:
+                async for chunk in chunks:
+                    if trace is not None:
+                        trace.mark("first_tts_chunk")
+                    if not await audio_egress.put(chunk):
+                        break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"Could not speak the fixed reply to user {user_id}: {e}")
+
+    async def speak_reply(text_chunks: AsyncIterator[str], response_text: ResponseStream, trace: VoiceTrace):
+        """Streams reply text to the client and speaks it sentence by sentence while it is generated"""
+        async def send_audio(audio_chunk: bytes):
+            trace.mark("first_tts_chunk")
+            # Goes through the connection's egress buffer, drained by the audio_sender task
+            await audio_egress.put(audio_chunk)
+
+        # Sentences go to TTS as soon as they are complete; sentence N+1 is
+        # synthesized while N is still playing, output order is preserved
+        segmenter = SentenceSegmenter(
+            max_chars=config.VOICE_SEGMENT_MAX_CHARS,
+            first_clause_chars=config.VOICE_FIRST_SEGMENT_CHARS,
+        )
+        tts_pipeline = OrderedTtsPipeline(stream_speech, send_audio, lookahead=config.VOICE_TTS_LOOKAHEAD)
+        try:
+            async with aclosing(text_chunks) as chunks:
+                async for text_chunk in chunks:
+                    trace.mark("first_token")
+                    # Send intermediate text to UI for live transcription
+                    await response_text.append(text_chunk)
+
+                    for sentence in segmenter.feed(text_chunk):
+                        trace.mark("first_segment")
+                        tts_pipeline.put(sentence)
+
+            await response_text.finish()
+
+            # Process remaining text in buffer
+            tail = segmenter.flush()
+            if tail:
+                trace.mark("first_segment")
+                tts_pipeline.put(tail)
+            trace.mark("llm_done")
+
+            # Wait for all TTS to finish
+            await tts_pipeline.close()
+            trace.mark("last_tts_chunk")
+            trace.attrs["segments"] = tts_pipeline.segments
+        finally:
+            tts_pipeline.cancel()
+
+    def start_live_turn(pcm_chunks: asyncio.Queue) -> asyncio.Task:
+        # Speech start does not interrupt the running reply (it may be echo or noise the
+        # client does not treat as barge-in); that happens on end_audio or an explicit interrupt
+        return asyncio.create_task(process_live_turn(pcm_chunks, active_voice_tasks.get(user_id)))
+
+    async def process_live_turn(pcm_chunks: asyncio.Queue, previous: Optional[asyncio.Task]):
+        """Live mode: the utterance is streamed into the model session while the user is speaking.
+
+        pcm_chunks carries PCM frames and, on end_audio, the turn's VoiceTrace as the end marker.
+        While the previous reply is still running, frames are buffered and the live turn is
+        opened only once it finishes (its session and context stay intact) or, on end_audio,
+        after it has been interrupted.
+        """
+        trace: Optional[VoiceTrace] = None
+        outcome = "error"
+        turn = None
+        pending = UtteranceBuffer(int(config.VOICE_MAX_UTTERANCE_SECONDS * 16000) * 2)
+        fallback = False
+
+        async def open_turn():
+            nonlocal turn, fallback
+            try:
+                turn = await live_backend.start_turn()
+            except Exception as e:
+                log.warning(f"Live session unavailable for user {user_id} ({e}); using a standard voice turn")
+                fallback = True
+                return
+            if len(pending):
+                await turn.send_audio(memoryview(pending.take())[WAV_HEADER_SIZE:])
+
+        try:
+            while True:
+                item = await pcm_chunks.get()
+                if isinstance(item, VoiceTrace):
+                    trace = item
+                    break
+                if turn is None and not fallback and (previous is None or previous.done()):
+                    await open_turn()
+                if turn is not None:
+                    await turn.send_audio(item)
+                else:
+                    pending.append(item)
+
+            if previous is not None and not previous.done():
+                # A finished utterance over the reply is a barge-in, as in the standard path
+                previous.cancel()
+                cancellation.inc("voice_turns_interrupted")
+                await asyncio.wait([previous], timeout=1.0)
+                cancellation.inc("voice_audio_chunks_discarded", await audio_egress.clear())
+            if turn is None and not fallback:
+                await open_turn()
+
+            if fallback:
+                # The standard path owns the trace from here on
+                wav_trace, trace = trace, None
+                wav = pending.take()
+                wav_trace.mark("wav_ready")
+                await process_voice_message(wav, wav_trace)
+                return
+
+            # Only the finalize signal is left on the critical path after endpointing
+            await turn.end_audio()
+            trace.mark("finalized")
+            await websocket.send_json({"type": "processing", "trace_id": trace.trace_id})
+            response_text = ResponseStream(websocket.send_json, protocol)
+            await speak_reply(turn.replies(), response_text, trace)
+            outcome = "ok"
+            if not response_text.text.strip():
+                await say_fixed(config.DEFAULT_NO_ANSWER, trace)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            log.exception(f"Live voice turn failed for user {user_id}: {e}")
+            await live_backend.reset()
+            try:
+                await websocket.send_json({"type": "error", "message": str(e)})
+            except: pass
+            await say_fixed(config.DEFAULT_ERROR)
+        finally:
+            if trace is not None:
+                voice_traces.finish(trace, outcome)
+                if outcome != "cancelled":
+                    try:
+                        await send_trace(trace)
+                    except Exception: pass
+
+    async def process_voice_message(audio_data: bytearray, trace: VoiceTrace):
         """Internal helper to process voice and send streamed response"""
+        outcome = "error"
         try:
-            start_ts = time.time()
-            perf_logs = []
-            
-            def perf_log(msg: str):
-                log.info(msg)
-                perf_logs.append(msg)
-                
-            perf_log(f"[Perf] Server: Audio Received. Size: {len(audio_data)} bytes. TS: {start_ts}")
-            await websocket.send_json({"type": "processing"})
+            await websocket.send_json({"type": "processing", "trace_id": trace.trace_id})
             
             collected_text = []
+            audio_streamed = False  # the TTS tool spoke straight into the egress buffer
             
             # Check if Simple Voice Agent mode is enabled
             if config.SIMPLE_VOICE_AGENT:
-                perf_log(f"[Perf] Using Simple Voice Agent (Model: {config.SIMPLE_VOICE_MODEL}). Overhead: {time.time() - start_ts:.3f}s")
-                gen_start = time.time()
-                
+                response_text = None
                 try:
                     # Initialize Gemini Client
                     client = get_genai_client()
-                    prompt = config.SIMPLE_VOICE_SYSTEM_PROMPT
-                    
-                    # Generate content STREAM
-                    # We stream text from LLM, and as soon as we have a full sentence, we trigger TTS
-                    response_stream = await client.aio.models.generate_content_stream(
-                        model=config.SIMPLE_VOICE_MODEL,
-                        contents=[
+                    # Earlier turns of this connection (summarized when long) + the new utterance
+                    if conversation is not None:
+                        contents = conversation.contents(audio_data)
+                    else:
+                        contents = [
                             types.Content(
                                 role="user",
-                                parts=[
-                                    types.Part(
-                                        inline_data=types.Blob(
-                                            mime_type="audio/wav",
-                                            data=audio_data
-                                        )
-                                    )
-                                ]
+                                parts=[types.Part(inline_data=types.Blob(mime_type="audio/wav", data=audio_data))],
                             )
-                        ],
-                        config=types.GenerateContentConfig(
-                            system_instruction=prompt,
-                            temperature=0.7
-                        )
-                    )
-                    
-                    perf_log(f"[Perf] Gemini Stream Started. TTFT: {time.time() - gen_start:.3f}s")
-                    
-                    text_buffer = ""
-                    sentence_buffer = ""
-                    first_token = True
-                    sent_first_audio_chunk = False
-                    
-                    # Internal queue for sentences to be processed by TTS
-                    tts_sentence_queue = asyncio.Queue()
-                    
-                    async def tts_worker():
-                        nonlocal sent_first_audio_chunk
-                        try:
-                            while True:
-                                sentence = await tts_sentence_queue.get()
-                                if sentence is None: break # Sentinel
-                                
-                                log.info(f"TTS Worker: Processing sentence: {sentence[:30]}...")
-                                async for audio_chunk in stream_speech(sentence):
-                                    if not sent_first_audio_chunk:
-                                        perf_log(f"[Perf] First TTS Chunk sent. Pipeline Latency: {time.time() - start_ts:.3f}s")
-                                        sent_first_audio_chunk = True
-                                    # Use the user's audio_queue which is consumed by the audio_sender task
-                                    await audio_queue.put(audio_chunk)
-                                tts_sentence_queue.task_done()
-                        except Exception as e:
-                            log.error(f"TTS Worker Error: {e}")
-
-                    # Start worker
-                    worker_task = asyncio.create_task(tts_worker())
+                        ]
+                    # System prompt: cached_content when the context cache is available, inline otherwise
+                    if config.VOICE_PROMPT_CACHE:
+                        prompt_fields = await get_voice_prompt_cache().config_fields()
+                    else:
+                        prompt_fields = {"system_instruction": config.SIMPLE_VOICE_SYSTEM_PROMPT}
                     
+                    # Generate content STREAM
+                    # We stream text from LLM, and as soon as we have a full sentence, we trigger TTS
                     try:
-                        async for chunk in response_stream:
-                            if chunk.text:
-                                if first_token:
-                                    perf_log(f"[Perf] First LLM Token. Latency: {time.time() - gen_start:.3f}s")
-                                    first_token = False
-                                    
-                                text_chunk = chunk.text
-                                text_buffer += text_chunk
-                                sentence_buffer += text_chunk
-                                
-                                # Send intermediate text to UI for live transcription
-                                await websocket.send_json({
-                                    "type": "response",
-                                    "text": text_buffer # Send full accumulated text for simple UI update
-                                })
-
-                                # Check for sentence delimiters logic removed. 
-                                # We wait for the full text to accumulate in sentence_buffer and send it all at once after the loop.
-
-                        # Process remaining text in buffer
-                        if sentence_buffer.strip():
-                             await tts_sentence_queue.put(sentence_buffer)
-
-                        # Wait for all TTS to finish
-                        await tts_sentence_queue.put(None) # Sentinel
-                        await worker_task
-                    finally:
-                        if not worker_task.done():
-                            worker_task.cancel()
-
-                    perf_log(f"[Perf] LLM Stream Complete. Total Gen Time: {time.time() - gen_start:.3f}s")
+                        response_stream = await client.aio.models.generate_content_stream(
+                            model=config.SIMPLE_VOICE_MODEL,
+                            contents=contents,
+                            config=types.GenerateContentConfig(temperature=0.7, **prompt_fields),
+                        )
+                    except Exception as e:
+                        if "cached_content" not in prompt_fields:
+                            raise
+                        # Cache expired/evicted on the API side: retry once with the inline prompt
+                        log.warning(f"Cached system prompt rejected ({e}); retrying inline")
+                        get_voice_prompt_cache().invalidate()
+                        response_stream = await client.aio.models.generate_content_stream(
+                            model=config.SIMPLE_VOICE_MODEL,
+                            contents=contents,
+                            config=types.GenerateContentConfig(
+                                system_instruction=config.SIMPLE_VOICE_SYSTEM_PROMPT, temperature=0.7
+                            ),
+                        )
                     
-                    # Send Debug Info if enabled
-                    if config.SIMPLE_VOICE_DEBUG_TIMESTAMPS:
-                        debug_msg = "\n".join(perf_logs)
-                        await websocket.send_json({
-                            "type": "response",
-                            "text": f"\n\n--- Debug Timestamps (Streamed) ---\n{debug_msg}"
-                        })
+                    trace.mark("llm_stream_open")
+                    
+                    response_text = ResponseStream(websocket.send_json, protocol)
+                    await speak_reply(_gemini_text(response_stream), response_text, trace)
+                    outcome = "ok"
+                    if not response_text.text.strip():
+                        await say_fixed(config.DEFAULT_NO_ANSWER, trace)
 
                 except Exception as genai_err:
                     log.error(f"Gemini API Error: {genai_err}")
                     await websocket.send_json({"type": "error", "message": f"Gemini Error: {str(genai_err)}"})
+                    await say_fixed(config.DEFAULT_ERROR)
+                finally:
+                    # What the user has heard (also of an interrupted reply) stays in the context
+                    if conversation is not None and response_text is not None:
+                        conversation.add_turn(audio_data, response_text.text)
 
             else:
-                # Start streaming the agent response via ADK Service
-                async for ev in adk_service.run_agent_stream(
+                # Start streaming the agent response via ADK Service (one turn per session)
+                response_text = ResponseStream(websocket.send_json, protocol)
+                async with adk_service.turns.admit(session_id), aclosing(adk_service.run_agent_stream(
                     session_id=session_id,
                     user_id=user_id,
                     text=None,
                     file_data=audio_data,
-                    mime_type="audio/wav", 
-                ):
-                    # Handle text response
-                    if ev.is_final_response() and ev.content:
-                        text_parts = [p.text for p in ev.content.parts if p.text]
-                        if text_parts:
-                            full_text = "\n".join(text_parts)
-                            # Avoid sending "[Audio streamed directly]" if it leaks
-                            if "[Audio streamed directly]" not in full_text:
-                                collected_text.append(full_text)
-                                await websocket.send_json({
-                                    "type": "response",
-                                    "text": full_text
-                                })
+                    mime_type="audio/wav",
+                )) as agent_events:
+                    async for ev in agent_events:
+                        trace.mark("agent_first_event")
+                        # Handle text response
+                        if ev.is_final_response() and ev.content:
+                            text_parts = [p.text for p in ev.content.parts if p.text]
+                            if text_parts:
+                                full_text = "\n".join(text_parts)
+                                # Avoid sending "[Audio streamed directly]" if it leaks
+                                if "[Audio streamed directly]" not in full_text:
+                                    trace.mark("first_text")
+                                    collected_text.append(full_text)
+                                    await response_text.append(("\n" if response_text.text else "") + full_text)
+                                else:
+                                    audio_streamed = True
                     
-                    # Handle generated audio (Legacy/Standard Artifacts)
-                    if ev.actions and ev.actions.artifact_delta:
-                        for filename, version in ev.actions.artifact_delta.items():
-                            try:
-                                # Load and send audio artifact immediately
-                                part = await adk_service.artifact_service.load_artifact(
-                                    app_name=adk_service.app_name,
-                                    user_id=user_id,
-                                    session_id=session_id,
-                                    filename=filename,
-                                    version=version,
-                                )
-                                if part and getattr(part, "inline_data", None):
-                                    if getattr(part.inline_data, "mime_type", "").startswith("audio"):
-                                        # Send raw audio bytes
-                                        await websocket.send_bytes(part.inline_data.data)
-                            except Exception as e:
-                                log.error(f"Error loading audio artifact: {e}")
+                        # Handle generated audio (Legacy/Standard Artifacts)
+                        if ev.actions and ev.actions.artifact_delta:
+                            for filename, version in ev.actions.artifact_delta.items():
+                                try:
+                                    # Load and send audio artifact immediately
+                                    part = await adk_service.artifact_service.load_artifact(
+                                        app_name=adk_service.app_name,
+                                        user_id=user_id,
+                                        session_id=session_id,
+                                        filename=filename,
+                                        version=version,
+                                    )
+                                    if part and getattr(part, "inline_data", None):
+                                        if getattr(part.inline_data, "mime_type", "").startswith("audio"):
+                                            # Send raw audio bytes
+                                            trace.mark("first_tts_chunk")
+                                            await audio_egress.put(part.inline_data.data)
+                                except Exception as e:
+                                    log.error(f"Error loading audio artifact: {e}")
+                await response_text.finish()
+                trace.mark("agent_done")
+                outcome = "ok"
             
             # After agent finishes, automatically stream TTS for collected text
-                            except Exception as e:
-                                log.error(f"Error loading audio artifact: {e}")
-            
             # NOTE: For Simple Voice Agent, TTS is handled inside the 'if' block above (streamed).
             # The code below is only for the ADK agent path (legacy/non-simple).
-            if not config.SIMPLE_VOICE_AGENT and collected_text:
+            if not config.SIMPLE_VOICE_AGENT and not collected_text:
+                if not audio_streamed and trace.at("first_tts_chunk") is None:
+                    await say_fixed(config.DEFAULT_NO_ANSWER, trace)
+            elif not config.SIMPLE_VOICE_AGENT:
                 final_text = " ".join(collected_text)
-                perf_log(f"[Perf] Streaming TTS for voice response. Text Len: {len(final_text)}. Time from start: {time.time() - start_ts:.3f}s")
-                tts_start = time.time()
-                first_chunk = True
+                trace.attrs["text_chars"] = len(final_text)
                 try:
-                    async for chunk in stream_speech(final_text):
-                        if first_chunk:
-                            perf_log(f"[Perf] First TTS Audio Chunk Yielded. TTS Latency: {time.time() - tts_start:.3f}s")
-                            first_chunk = False
-                        await websocket.send_bytes(chunk)
-                        
-                    # Send Debug Info if enabled
-                    if config.SIMPLE_VOICE_DEBUG_TIMESTAMPS:
-                        debug_msg = "\n".join(perf_logs)
-                        await websocket.send_json({
-                            "type": "response",
-                            "text": f"\n\n--- Debug Timestamps ---\n{debug_msg}"
-                        })
+                    async with aclosing(stream_speech(final_text)) as tts_chunks:
+                        async for chunk in tts_chunks:
+                            trace.mark("first_tts_chunk")
+                            if not await audio_egress.put(chunk):
+                                break
+                    trace.mark("last_tts_chunk")
 
                 except Exception as tts_err:
+                    outcome = "error"
                     log.error(f"TTS streaming error: {tts_err}")
                             
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except (PoolSaturatedError, SessionBusyError) as e:
+            outcome = "rejected"
+            log.warning(f"Voice turn rejected for user {user_id}: {e}")
+            try:
+                await websocket.send_json({"type": "error", "message": config.DEFAULT_BUSY})
+            except: pass
+            await say_fixed(config.DEFAULT_BUSY)
         except Exception as e:
             log.exception(f"Error in process_voice_message: {e}")
             try:
                 await websocket.send_json({"type": "error", "message": str(e)})
             except: pass
+            await say_fixed(config.DEFAULT_ERROR)
+        finally:
+            voice_traces.finish(trace, outcome)
+            if outcome != "cancelled":
+                try:
+                    await send_trace(trace)
+                except Exception: pass
             
     try:
         while True:
@@ -474,49 +827,68 @@ async def voice_websocket(websocket: WebSocket, user_id: str = "voice_user"):
                 break
             
             if "bytes" in data:
-                # Continuous streaming: append raw chunks to accumulator
-                audio_accumulator.extend(data["bytes"])
+                if live_backend is not None:
+                    if live_input is None:
+                        # Speech start: the turn starts collecting frames as they arrive
+                        live_input = asyncio.Queue()
+                        live_task = start_live_turn(live_input)
+                        pending_trace = voice_traces.start(user_id, "live")
+                    live_input.put_nowait(data["bytes"])
+                elif vad_detector is not None:
+                    # Server-side endpointing: every finished utterance becomes a turn
+                    for wav in vad_detector.process(data["bytes"]):
+                        log.info(f"VAD endpoint: utterance of {len(wav)} bytes. Starting processing...")
+                        start_voice_turn(wav, receive_trace(voice_mode))
+                    if not vad_detector.in_speech:
+                        # Too short to be an utterance (or nothing started): its trace is dropped
+                        pending_trace = None
+                    elif pending_trace is None:
+                        pending_trace = voice_traces.start(user_id, voice_mode)
+                else:
+                    if pending_trace is None:
+                        pending_trace = voice_traces.start(user_id, voice_mode)
+                    if not utterance.full and not utterance.append(data["bytes"]):
+                        log.warning(f"Voice utterance of user {user_id} hit the {config.VOICE_MAX_UTTERANCE_SECONDS}s cap; dropping the rest")
                 
             elif "text" in data:
                 msg = json.loads(data["text"])
                 msg_type = msg.get("type")
 
                 if msg_type == "end_audio":
-                    if not audio_accumulator:
+                    if live_backend is not None:
+                        if live_input is not None:
+                            live_input.put_nowait(receive_trace("live"))
+                            active_voice_tasks[user_id] = live_task
+                            live_input, live_task = None, None
                         continue
-                        
-                    log.info(f"Received end_audio. Accumulated {len(audio_accumulator)} bytes. Starting processing...")
-                    
-                    # Wrap accumulated raw PCM into a WAV file for Gemini
-                    # (Assuming frontend sends 16kHz 16-bit Mono PCM)
-                    import struct
-                    def create_wav_header(data_len):
-                        header = struct.pack('<4sI4s4sIHHIIHH4sI', 
-                            b'RIFF', data_len + 36, b'WAVE', b'fmt ', 16, 1, 1, 16000, 32000, 2, 16, b'data', data_len)
-                        return header
-
-                    full_wav = create_wav_header(len(audio_accumulator)) + audio_accumulator
-                    
-                    # Cancel previous task if still running
-                    if user_id in active_voice_tasks and not active_voice_tasks[user_id].done():
-                        active_voice_tasks[user_id].cancel()
-                    
-                    task = asyncio.create_task(process_voice_message(full_wav))
-                    active_voice_tasks[user_id] = task
-                    
-                    # Clear accumulator for next utterance
-                    audio_accumulator = bytearray()
+                    trace = receive_trace(voice_mode)
+                    if vad_detector is not None:
+                        wav = vad_detector.flush()
+                        if wav is None:
+                            continue
+                    else:
+                        if not len(utterance):
+                            continue
+                        # Header is written into the reserved space; the buffer itself is handed over
+                        wav = utterance.take()
+
+                    log.info(f"Received end_audio. Accumulated {len(wav)} bytes. Starting processing...")
+                    start_voice_turn(wav, trace)
                 
                 elif msg_type == "interrupt":
                     log.info(f"Interruption received for user {user_id}")
-                    # Clear queue
-                    while not audio_queue.empty():
-                        try: audio_queue.get_nowait()
-                        except: pass
-                    
+                    # The reply is cancelled; an utterance being spoken (live_input) keeps collecting
                     if user_id in active_voice_tasks:
-                        active_voice_tasks[user_id].cancel()
-                        del active_voice_tasks[user_id]
+                        task = active_voice_tasks.pop(user_id)
+                        if not task.done():
+                            cancellation.inc("voice_turns_interrupted")
+                        task.cancel()
+                        # Let the turn unwind (closes LLM/TTS streams) before clearing its audio
+                        await asyncio.wait([task], timeout=1.0)
+
+                    # Clear unsent audio
+                    discarded = await audio_egress.clear()
+                    cancellation.inc("voice_audio_chunks_discarded", discarded)
                     await websocket.send_json({"type": "interruption_handshake"})
                 
                 elif msg_type == "end_audio":
@@ -528,7 +900,19 @@ async def voice_websocket(websocket: WebSocket, user_id: str = "voice_user"):
     except Exception as e:
         log.exception(f"Voice WebSocket error: {e}")
     finally:
+        adk_service.sessions.unpin(user_id)
         unregister_voice_user(user_id)
+        await audio_egress.close()
+        if voice_egress_buffers.get(user_id) is audio_egress:
+            del voice_egress_buffers[user_id]
+        log.info(f"Voice audio egress for user {user_id}: {audio_encoder.stats()}, buffer: {audio_egress.stats()}")
+        if live_task is not None:
+            live_task.cancel()
+        if live_backend is not None:
+            await live_backend.close()
+        if conversation is not None:
+            conversation.close()
+            log.info(f"Voice conversation of user {user_id}: {conversation.stats()}")
         if sender_task:
             sender_task.cancel()
         if user_id in active_voice_tasks:
@@ -540,6 +924,98 @@ async def voice_websocket(websocket: WebSocket, user_id: str = "voice_user"):
 # Утыліты -------------------------------------------------------------
 
 
+async def _read_chat_form(request: Request) -> Tuple[str, str, List[types.Part]]:
+    """Reads `text`, `user_id` and the attached files of a chat request as agent parts.
+
+    Files are spooled into the content-addressed store while the body arrives;
+    a file over its MIME size cap (or a body over the global cap) is answered with 413.
+    """
+    try:
+        fields, uploads = await upload_store.receive_form(
+            request.headers.get("content-type", ""), request.stream(), lambda name: _guess_mime(Path(name))
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed form data: {e}")
+
+    parts: List[types.Part] = []
+    for stored in uploads:
+        try:
+            parts.append(await upload_store.to_part(stored))
+        except Exception as e:
+            log.exception(f"Error processing file: {e}")
+    return fields.get("text", ""), fields.get("user_id", "default"), parts
+
+
+def _batch_attachments(parts: List[types.Part], max_inline_bytes: int) -> List[List[types.Part]]:
+    """Packs attachments into as few turns as fit the inline request budget (in order)."""
+    batches: List[List[types.Part]] = []
+    current: List[types.Part] = []
+    current_size = 0
+    for part in parts:
+        size = len(part.inline_data.data) if part.inline_data and part.inline_data.data else 0
+        if current and current_size + size > max_inline_bytes:
+            batches.append(current)
+            current, current_size = [], 0
+        current.append(part)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _tts_health_loop(interval: float):
+    """Periodic TTS health checks; unhealthy clients reconnect in the background."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await check_tts_clients()
+        except Exception as e:
+            log.warning(f"TTS health check failed: {e}")
+
+
+async def _gemini_text(response_stream):
+    """Text chunks of a generate_content_stream response; an abandoned stream is closed, not drained."""
+    finished = False
+    try:
+        async for chunk in response_stream:
+            if chunk.text:
+                yield chunk.text
+        finished = True
+    finally:
+        if not finished:
+            cancellation.inc("llm_streams_cancelled")
+            await response_stream.aclose()
+
+
+async def _chain_streams(streams: List[Any]):
+    """Runs async event streams one after another (one turn per session) and yields (index, event).
+
+    A stream that fails yields (index, exception) once and stops; the next one still runs.
+    """
+    for idx, stream in enumerate(streams):
+        try:
+            async with aclosing(stream) as events:
+                async for ev in events:
+                    yield idx, ev
+        except Exception as e:
+            yield idx, e
+
+
+def _admit_turn(session_id: str):
+    """Queue a turn for the session or answer 429 when its queue is full."""
+    try:
+        return adk_service.turns.admit(session_id)
+    except SessionBusyError as e:
+        log.warning(f"Chat turn rejected: {e}")
+        raise HTTPException(status_code=429, detail=config.DEFAULT_BUSY)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 def _guess_mime(p: Path) -> str:
     mime, _ = mimetypes.guess_type(str(p))
     if mime:
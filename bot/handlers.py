@@ -10,6 +10,7 @@ from google.genai import errors as genai_errors
 
 from bot import helpers
 from services.adk_service import ADKService
+from services.turn_scheduler import SessionBusyError
 from chat_dataset_logger import save_message
 import config
 
@@ -40,7 +41,7 @@ def is_mime_type_supported(mime_type: str | None) -> bool:
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /start command."""
     await helpers._safe_call(
-        context.bot.send_message(update.effective_chat.id, "Вітаю! Я гатовы."),
+        context.bot.send_message(update.effective_chat.id, config.DEFAULT_GREETING),
         action="send_message:start"
     )
 
@@ -83,11 +84,24 @@ async def _process_message_task(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     adk_service: ADKService = context.application.adk_service
+    ticket = None
 
     try:
         session_id = await adk_service.get_or_create_session(user_id)
         log.info(f"Processing message for user {user_id} in session {session_id}")
 
+        # Адзін ход на сесію: паведамленне чакае папярэднія, поўная чарга — "заняты"
+        try:
+            ticket = adk_service.turns.admit(
+                session_id,
+                text=user_text,
+                coalesce=config.SESSION_COALESCE_TURNS and not file_to_download,
+            )
+        except SessionBusyError as e:
+            log.warning(f"Message of user {user_id} rejected: {e}")
+            await helpers._safe_call(context.bot.send_message(chat_id, config.DEFAULT_BUSY), action="send_message:busy")
+            return
+
         if file_to_download:
             log.info(f"Downloading file: {file_to_download.file_id}")
             tg_file = await context.bot.get_file(file_to_download.file_id)
@@ -115,6 +129,13 @@ async def _process_message_task(update: Update, context: ContextTypes.DEFAULT_TY
             image_bytes=user_image_bytes,
         )
 
+        await ticket.wait()
+        if ticket.superseded:
+            # Тэкст перайшоў у навейшае паведамленне — адказ прыйдзе на яго
+            log.info(f"Message of user {user_id} coalesced into a newer one")
+            return
+        user_text = ticket.text or ""
+
         await helpers._safe_call(context.bot.send_chat_action(chat_id, "typing"), action="chat_action:typing")
 
         reply_text, delta, parts = "", {}, []
@@ -126,8 +147,7 @@ async def _process_message_task(update: Update, context: ContextTypes.DEFAULT_TY
         else:
             try:
                 reply_text, delta, parts = await asyncio.wait_for(
-                    asyncio.to_thread(
-                        adk_service.run_agent, 
+                    adk_service.run_agent_async(
                         session_id, user_id, 
                         text=user_text, file_data=file_data, mime_type=mime_type
                     ),
@@ -168,4 +188,7 @@ async def _process_message_task(update: Update, context: ContextTypes.DEFAULT_TY
 
     except Exception as exc:
         log.exception(f"Unhandled error in message processing task for user {user_id}: {exc}")
-        await helpers._safe_call(context.bot.send_message(chat_id, config.DEFAULT_ERROR), action="send_message:error")
\ No newline at end of file
+        await helpers._safe_call(context.bot.send_message(chat_id, config.DEFAULT_ERROR), action="send_message:error")
+    finally:
+        if ticket is not None:
+            ticket.release()
\ No newline at end of file
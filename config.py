@@ -32,13 +32,125 @@ WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
 # Agent Configuration
 # GEMINI_API_KEY is already set above
 AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", 60))
+# Max number of agent turns running at the same time (across all users)
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 8))
+# Shared worker pool for streamed agent runs (voice): threads and waiting slots
+AGENT_STREAM_WORKERS = int(os.getenv("AGENT_STREAM_WORKERS", 4))
+AGENT_STREAM_QUEUE_SIZE = int(os.getenv("AGENT_STREAM_QUEUE_SIZE", 16))
+# Inline attachment budget for one agent turn (Gemini request size limit); larger uploads are split
+CHAT_MAX_INLINE_BYTES = int(os.getenv("CHAT_MAX_INLINE_BYTES", 20 * 1024 * 1024))
+
+# Agent Sessions: idle sessions are evicted, old events trimmed after each turn
+SESSION_TTL = int(os.getenv("SESSION_TTL", 2 * 3600))
+SESSION_MAX_RESIDENT = int(os.getenv("SESSION_MAX_RESIDENT", 500))
+SESSION_MAX_EVENTS = int(os.getenv("SESSION_MAX_EVENTS", 60))
+# "memory" або "sqlite" (сесіі перажываюць рэстарт; запіс адкладзены, пачкамі)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 256))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", 0.5))
+# Адзін ход на сесію; больш за SESSION_MAX_QUEUED_TURNS у чарзе — 429 / "заняты"
+SESSION_MAX_QUEUED_TURNS = int(os.getenv("SESSION_MAX_QUEUED_TURNS", 2))
+# Telegram: некалькі тэкставых паведамленняў, што чакаюць у чарзе, злучаюцца ў адзін ход
+SESSION_COALESCE_TURNS = os.getenv("SESSION_COALESCE_TURNS", "true").lower() == "true"
+
+# Chat History (in-memory, bounded)
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 200))
+CHAT_HISTORY_MAX_USERS = int(os.getenv("CHAT_HISTORY_MAX_USERS", 1000))
+CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", 24 * 3600))
+CHAT_HISTORY_PAGE_MAX = int(os.getenv("CHAT_HISTORY_PAGE_MAX", 100))
+
+# Upload Configuration
+# Per-MIME size caps ("type/subtype" or "type/*"), comma separated
+UPLOAD_SIZE_LIMITS = os.getenv(
+    "UPLOAD_SIZE_LIMITS", "image/*=20MB,audio/*=50MB,video/*=200MB,application/pdf=50MB,text/*=5MB"
+)
+UPLOAD_DEFAULT_MAX_BYTES = int(os.getenv("UPLOAD_DEFAULT_MAX_BYTES", 20 * 1024 * 1024))
+# Larger uploads are sent to the agent via the Gemini Files API instead of inline bytes
+UPLOAD_INLINE_MAX_BYTES = int(os.getenv("UPLOAD_INLINE_MAX_BYTES", 10 * 1024 * 1024))
+# Content hashes remembered for dedupe / Gemini file reuse (LRU; files stay on disk)
+UPLOAD_INDEX_MAX_ENTRIES = int(os.getenv("UPLOAD_INDEX_MAX_ENTRIES", 1024))
+# Artifact names remembered as already written (LRU; older ones are checked on disk)
+ARTIFACT_INDEX_MAX_ENTRIES = int(os.getenv("ARTIFACT_INDEX_MAX_ENTRIES", 1024))
 
 # Voice Agent Configuration
 SIMPLE_VOICE_AGENT = os.getenv("SIMPLE_VOICE_AGENT", "True").lower() == "true"
 SIMPLE_VOICE_SYSTEM_PROMPT = os.getenv("SIMPLE_VOICE_SYSTEM_PROMPT", "Ты карысны выключна беларускамоўны галасавы памочнік Юзік. Адкажы сцісла і па сутнасці.")
 SIMPLE_VOICE_MODEL = os.getenv("SIMPLE_VOICE_MODEL", "gemini-2.5-flash-lite")
-SIMPLE_VOICE_DEBUG_TIMESTAMPS = os.getenv("SIMPLE_VOICE_DEBUG_TIMESTAMPS", "True").lower() == "true"
+SIMPLE_VOICE_DEBUG_TIMESTAMPS = os.getenv("SIMPLE_VOICE_DEBUG_TIMESTAMPS", "False").lower() == "true"
+# Voice TTS pipeline: reply is spoken sentence by sentence while the LLM is still streaming
+VOICE_TTS_LOOKAHEAD = int(os.getenv("VOICE_TTS_LOOKAHEAD", 1))  # segments synthesized ahead of playback
+VOICE_SEGMENT_MAX_CHARS = int(os.getenv("VOICE_SEGMENT_MAX_CHARS", 220))
+VOICE_FIRST_SEGMENT_CHARS = int(os.getenv("VOICE_FIRST_SEGMENT_CHARS", 60))  # first segment may end at a comma
+# Voice input: server-side VAD endpointing (per connection via ?vad=server) and utterance cap
+VOICE_SERVER_VAD = os.getenv("VOICE_SERVER_VAD", "False").lower() == "true"
+VOICE_VAD_HANGOVER_MS = int(os.getenv("VOICE_VAD_HANGOVER_MS", 600))
+VOICE_MAX_UTTERANCE_SECONDS = float(os.getenv("VOICE_MAX_UTTERANCE_SECONDS", 30))
+# Default encoding of TTS audio on /api/voice (f32 | pcm16 | mulaw, optionally "@<rate>"); clients may pass ?codec=
+VOICE_AUDIO_CODEC = os.getenv("VOICE_AUDIO_CODEC", "pcm16")
+# Simple voice agent memory: earlier turns of the connection within a token budget, older ones summarized
+VOICE_MEMORY_ENABLED = os.getenv("VOICE_MEMORY_ENABLED", "True").lower() == "true"
+VOICE_MEMORY_TOKEN_BUDGET = int(os.getenv("VOICE_MEMORY_TOKEN_BUDGET", 8000))
+VOICE_MEMORY_KEEP_TURNS = int(os.getenv("VOICE_MEMORY_KEEP_TURNS", 4))  # most recent turns kept verbatim (as text)
+VOICE_MEMORY_SUMMARY_MODEL = os.getenv("VOICE_MEMORY_SUMMARY_MODEL", SIMPLE_VOICE_MODEL)  # also transcribes each turn
+# SIMPLE_VOICE_SYSTEM_PROMPT via Gemini explicit context caching (falls back to inline when unsupported)
+VOICE_PROMPT_CACHE = os.getenv("VOICE_PROMPT_CACHE", "True").lower() == "true"
+VOICE_PROMPT_CACHE_TTL = int(os.getenv("VOICE_PROMPT_CACHE_TTL", 3600))
+# Prompts shorter than the model's explicit-cache minimum are never cached (the API rejects them)
+VOICE_PROMPT_CACHE_MIN_TOKENS = int(os.getenv("VOICE_PROMPT_CACHE_MIN_TOKENS", 1024))
+# Voice mode when the client does not pass ?mode=: "standard" (upload on end_audio) or "live"
+VOICE_DEFAULT_MODE = os.getenv("VOICE_DEFAULT_MODE", "standard").lower()
+# Live mode: Gemini Live model (text output, spoken by our TTS); sessions are reopened after this age
+VOICE_LIVE_MODEL = os.getenv("VOICE_LIVE_MODEL", "gemini-live-2.5-flash-preview")
+VOICE_LIVE_SESSION_SECONDS = float(os.getenv("VOICE_LIVE_SESSION_SECONDS", 540))
+# Per-connection outgoing audio buffer: byte budget, overflow policy (drop | pause | disconnect), coalesced frame size
+VOICE_EGRESS_MAX_BYTES = int(os.getenv("VOICE_EGRESS_MAX_BYTES", 4 * 1024 * 1024))
+VOICE_EGRESS_POLICY = os.getenv("VOICE_EGRESS_POLICY", "pause").lower()
+VOICE_EGRESS_FRAME_BYTES = int(os.getenv("VOICE_EGRESS_FRAME_BYTES", 32 * 1024))
+
+# TTS Gradio clients connect in the background after startup; a request waits at most this long for them
+TTS_CLIENT_WAIT = float(os.getenv("TTS_CLIENT_WAIT", 60))
+TTS_HEALTH_INTERVAL = float(os.getenv("TTS_HEALTH_INTERVAL", 60))  # seconds between health checks, 0 = off
+# TTS client pools per Space: clients, concurrent calls, admission queue (voice requests go before batch ones)
+TTS_STREAM_CLIENTS = int(os.getenv("TTS_STREAM_CLIENTS", 2))
+TTS_STREAM_CONCURRENCY = int(os.getenv("TTS_STREAM_CONCURRENCY", 4))
+TTS_BATCH_CLIENTS = int(os.getenv("TTS_BATCH_CLIENTS", 1))
+TTS_BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", 4))
+TTS_ADMISSION_MAX_WAITERS = int(os.getenv("TTS_ADMISSION_MAX_WAITERS", 64))
+TTS_ADMISSION_TIMEOUT = float(os.getenv("TTS_ADMISSION_TIMEOUT", 30))  # seconds a call may wait for a slot
+TTS_ADMISSION_STARVATION_MS = float(os.getenv("TTS_ADMISSION_STARVATION_MS", 10000))  # then batch calls stop yielding to voice
+# Speak through the batch Space (one chunk, no streaming) when every BexttsAssist slot is busy
+TTS_STREAM_FALLBACK = os.getenv("TTS_STREAM_FALLBACK", "True").lower() == "true"
+# Standard-mode synthesis: long text is split at sentences into segments of at most this many chars,
+# synthesized concurrently and stitched into one artifact
+TTS_SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", 300))
+# Seconds a later segment of an already admitted request may wait for a pool slot (no waiter limit)
+TTS_SEGMENT_SLOT_TIMEOUT = float(os.getenv("TTS_SEGMENT_SLOT_TIMEOUT", 120))
+# Save each finished in-order prefix of the segments as a playable artifact version before the full one
+TTS_SEGMENT_PROGRESSIVE = os.getenv("TTS_SEGMENT_PROGRESSIVE", "True").lower() == "true"
+# Read TTS result files straight into memory instead of Gradio's temp-file download
+TTS_FETCH_IN_MEMORY = os.getenv("TTS_FETCH_IN_MEMORY", "True").lower() == "true"
+# Streaming TTS (BexttsAssist): shared producer pool — concurrent jobs and jobs waiting for a worker
+TTS_STREAM_WORKERS = int(os.getenv("TTS_STREAM_WORKERS", 8))
+TTS_STREAM_QUEUE_SIZE = int(os.getenv("TTS_STREAM_QUEUE_SIZE", 32))
+
+# TTS cache: identical text (+ voice, model) is synthesized once; memory LRU + files on disk
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "True").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")  # empty = memory only
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", 32 * 1024 * 1024))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+TTS_CACHE_MAX_TEXT_CHARS = int(os.getenv("TTS_CACHE_MAX_TEXT_CHARS", 500))  # longer replies are not cached
 
 # Default Bot Replies
 DEFAULT_NO_ANSWER = "🌀 Прабачце, не атрымалася сфарміраваць адказ. Паспрабуйце яшчэ раз."
-DEFAULT_ERROR = "Упс, Юзік страціў гузік ці інакш адбылася памылка! Паспрабуйце пазней."
\ No newline at end of file
+DEFAULT_ERROR = "Упс, Юзік страціў гузік ці інакш адбылася памылка! Паспрабуйце пазней."
+DEFAULT_BUSY = "⏳ Юзік зараз вельмі заняты. Паспрабуйце крыху пазней."
+DEFAULT_GREETING = "Вітаю! Я гатовы."
+
+# Phrases synthesized into the TTS cache at startup ("|"-separated); the defaults are the
+# fixed replies the voice socket speaks (busy / error / no answer)
+TTS_PREWARM_PHRASES = [
+    p.strip() for p in os.getenv(
+        "TTS_PREWARM_PHRASES", "|".join([DEFAULT_NO_ANSWER, DEFAULT_ERROR, DEFAULT_BUSY])
+    ).split("|") if p.strip()
+]
\ No newline at end of file
@@ -41,7 +41,12 @@ const elements = {
 // ===========================
 // API Functions
 // ===========================
-async function sendMessage(text, files = []) {
+/**
+ * Stream a reply from /api/chat/stream (Server-Sent Events over POST).
+ * `handlers` receives: onDelta(text), onTool(name, status), onArtifact(kind, url),
+ * onError(message), onDone(text).
+ */
+async function streamMessage(text, files, handlers) {
     const formData = new FormData();
     formData.append('text', text);
     formData.append('user_id', state.userId);
@@ -50,29 +55,73 @@ async function sendMessage(text, files = []) {
         formData.append('files', file);
     }
 
-    try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            body: formData,
-        });
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        body: formData,
+        headers: { 'Accept': 'text/event-stream' },
+    });
 
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+    if (!response.ok || !response.body) {
+        const error = new Error(`HTTP error! status: ${response.status}`);
+        error.status = response.status;
+        throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            dispatchSseFrame(frame, handlers);
         }
+    }
+}
 
-        return await response.json();
-    } catch (error) {
-        console.error('Error sending message:', error);
-        throw error;
+function dispatchSseFrame(frame, handlers) {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trimStart());
+        }
+    }
+    if (dataLines.length === 0) return; // comment / keep-alive
+
+    const data = JSON.parse(dataLines.join('\n'));
+    switch (event) {
+        case 'delta':
+            handlers.onDelta?.(data.text);
+            break;
+        case 'tool':
+            handlers.onTool?.(data.name, data.status);
+            break;
+        case 'artifact':
+            handlers.onArtifact?.(data.kind, data.url);
+            break;
+        case 'error':
+            handlers.onError?.(data.message);
+            break;
+        case 'done':
+            handlers.onDone?.(data.text);
+            break;
     }
 }
 
 async function clearHistory() {
     try {
-        await fetch('/api/chat/history', {
+        await fetch(`/api/chat/history?user_id=${encodeURIComponent(state.userId)}`, {
             method: 'DELETE',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ user_id: state.userId }),
         });
     } catch (error) {
         console.error('Error clearing history:', error);
@@ -99,6 +148,39 @@ function addMessage(role, content, type = 'text') {
     scrollToBottom();
 }
 
+/**
+ * Add an empty bot text message and return a handle to fill it while streaming.
+ */
+function addStreamingMessage() {
+    const message = { role: 'bot', content: '', type: 'text', id: Date.now() };
+    state.messages.push(message);
+    const messageEl = renderMessage(message);
+    const contentEl = messageEl.querySelector('.message-content');
+
+    const render = () => {
+        contentEl.innerHTML = formatMarkdown(message.content);
+        scrollToBottom();
+    };
+
+    return {
+        append(text) {
+            message.content += text;
+            render();
+        },
+        set(text) {
+            message.content = text;
+            render();
+        },
+        isEmpty() {
+            return message.content.length === 0;
+        },
+        remove() {
+            state.messages = state.messages.filter(m => m !== message);
+            messageEl.remove();
+        },
+    };
+}
+
 function renderMessage(message) {
     const messageEl = document.createElement('div');
     messageEl.className = `message ${message.role}`;
@@ -122,6 +204,7 @@ function renderMessage(message) {
     messageEl.appendChild(avatar);
     messageEl.appendChild(contentEl);
     elements.messagesContainer.appendChild(messageEl);
+    return messageEl;
 }
 
 function formatMarkdown(text) {
@@ -179,6 +262,18 @@ function showTypingIndicator() {
     scrollToBottom();
 }
 
+function setTypingStatus(text) {
+    const indicator = document.getElementById('typing-indicator');
+    if (!indicator) return;
+    let status = indicator.querySelector('.typing-status');
+    if (!status) {
+        status = document.createElement('div');
+        status.className = 'typing-status';
+        indicator.querySelector('.message-content').appendChild(status);
+    }
+    status.textContent = text;
+}
+
 function hideTypingIndicator() {
     state.isTyping = false;
     const indicator = document.getElementById('typing-indicator');
@@ -414,33 +509,66 @@ async function handleSendMessage() {
     // Show typing indicator
     showTypingIndicator();
 
-    try {
-        const response = await sendMessage(text, files);
-        hideTypingIndicator();
-
-        // Handle response
-        if (response.text) {
-            addMessage('bot', response.text, 'text');
-        }
+    await handleStreamedReply(text, files);
+}
 
-        if (response.audio) {
-            addMessage('bot', response.audio, 'audio');
-            // Initialize audio player after DOM update
-            setTimeout(() => {
-                const audioMessages = document.querySelectorAll('.audio-message:not([data-initialized])');
-                audioMessages.forEach(container => {
-                    initAudioPlayer(container);
-                    container.dataset.initialized = 'true';
-                });
-            }, 100);
+async function handleStreamedReply(text, files) {
+    let reply = null;
+    const ensureReply = () => {
+        if (!reply) {
+            hideTypingIndicator();
+            reply = addStreamingMessage();
         }
+        return reply;
+    };
 
-        if (response.image) {
-            addMessage('bot', response.image, 'image');
-        }
+    try {
+        await streamMessage(text, files, {
+            onDelta: (delta) => ensureReply().append(delta),
+            onTool: (name, status) => {
+                if (status === 'started') setTypingStatus(`🔧 ${name}...`);
+            },
+            onArtifact: (kind, url) => addBotMedia(kind, url),
+            onError: (message) => {
+                hideTypingIndicator();
+                addMessage('bot', message, 'text');
+            },
+            onDone: (finalText) => {
+                hideTypingIndicator();
+                // The final event carries the authoritative full text
+                if (finalText) {
+                    ensureReply().set(finalText);
+                } else if (reply && reply.isEmpty()) {
+                    reply.remove();
+                }
+            },
+        });
     } catch (error) {
         hideTypingIndicator();
-        addMessage('bot', 'Прабачце, адбылася памылка. Паспрабуйце яшчэ раз.', 'text');
+        if (reply && reply.isEmpty()) reply.remove();
+        if (error.status === 413) {
+            addMessage('bot', 'Файл занадта вялікі. Паспрабуйце файл меншага памеру.', 'text');
+        } else if (error.status === 429) {
+            addMessage('bot', '⏳ Юзік яшчэ адказвае на папярэднія паведамленні. Паспрабуйце крыху пазней.', 'text');
+        } else {
+            addMessage('bot', 'Прабачце, адбылася памылка. Паспрабуйце яшчэ раз.', 'text');
+        }
+    }
+}
+
+function addBotMedia(kind, url) {
+    if (kind === 'audio') {
+        addMessage('bot', url, 'audio');
+        // Initialize audio player after DOM update
+        setTimeout(() => {
+            const audioMessages = document.querySelectorAll('.audio-message:not([data-initialized])');
+            audioMessages.forEach(container => {
+                initAudioPlayer(container);
+                container.dataset.initialized = 'true';
+            });
+        }, 100);
+    } else if (kind === 'image') {
+        addMessage('bot', url, 'image');
     }
 }
 
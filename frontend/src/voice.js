@@ -28,8 +28,19 @@ const state = {
     lastVadEndTimestamp: 0, // Debug: Timestamp when VAD detected speech end
     firstProcessingTimestamp: 0, // Debug: Timestamp when sever sent "processing"
     firstAudioTimestamp: 0, // Debug: Timestamp when first audio chunk arrived
+    // Reply text reassembled from response_delta / response_snapshot (protocol v2)
+    response: { turn: 0, seq: 0, text: '', synced: true },
+    audioFormat: { codec: 'f32', sample_rate: null }, // announced by the server in `audio_format`
 };
 
+const VOICE_PROTOCOL = 2;
+// ?vad=server: the server detects the end of speech, so the mic is streamed continuously
+const SERVER_VAD = new URLSearchParams(window.location.search).get('vad') === 'server';
+// Encoding of TTS audio from the server: f32 | pcm16 | mulaw, optionally "@<rate>" (e.g. mulaw@16000)
+const AUDIO_CODEC = new URLSearchParams(window.location.search).get('codec') || 'pcm16';
+// ?mode=live: the server uploads speech to the model while it is spoken (end_audio only finalizes)
+const VOICE_MODE = new URLSearchParams(window.location.search).get('mode');
+
 // ===========================
 // DOM Elements
 // ===========================
@@ -57,7 +68,10 @@ function connectWebSocket() {
         host = `${window.location.hostname}:7860`;
     }
 
-    const wsUrl = `${protocol}//${host}/api/voice?user_id=${state.userId}`;
+    let wsUrl = `${protocol}//${host}/api/voice?user_id=${state.userId}&proto=${VOICE_PROTOCOL}`;
+    if (SERVER_VAD) wsUrl += '&vad=server';
+    wsUrl += `&codec=${encodeURIComponent(AUDIO_CODEC)}`;
+    if (VOICE_MODE) wsUrl += `&mode=${encodeURIComponent(VOICE_MODE)}`;
 
     state.websocket = new WebSocket(wsUrl);
 
@@ -119,10 +133,24 @@ function handleServerMessage(data) {
             }
             setProcessingState(true);
             break;
+        case 'audio_format':
+            state.audioFormat = data;
+            break;
+        case 'hello':
+            if (data.proto !== VOICE_PROTOCOL) console.warn(`Server speaks voice protocol v${data.proto}`);
+            break;
         case 'response':
             setProcessingState(false);
             updateTranscript(data.text, true);
             break;
+        case 'response_delta':
+            setProcessingState(false);
+            applyResponseDelta(data);
+            break;
+        case 'response_snapshot':
+            setProcessingState(false);
+            applyResponseSnapshot(data);
+            break;
         case 'error':
             setProcessingState(false);
             updateStatus('Памылка: ' + data.message);
@@ -130,7 +158,36 @@ function handleServerMessage(data) {
         case 'interruption_handshake':
             console.log('Server acknowledged interruption');
             break;
+        case 'trace':
+            // Sent only with SIMPLE_VOICE_DEBUG_TIMESTAMPS enabled on the server
+            console.log(`[Perf] Voice trace ${data.trace_id} (${data.mode}, ${data.outcome})`);
+            console.table(data.stages);
+            break;
+    }
+}
+
+function applyResponseDelta(data) {
+    const response = state.response;
+    if (data.turn !== response.turn) {
+        // New reply: deltas start at seq 1
+        state.response = { turn: data.turn, seq: 0, text: '', synced: true };
+    }
+    const current = state.response;
+    if (!current.synced || data.seq !== current.seq + 1) {
+        // A delta was lost; wait for the next snapshot to resync
+        current.synced = false;
+        return;
     }
+    current.seq = data.seq;
+    current.text += data.text;
+    updateTranscript(current.text, true);
+}
+
+function applyResponseSnapshot(data) {
+    const current = state.response;
+    if (data.turn === current.turn && current.synced && data.seq < current.seq) return;
+    state.response = { turn: data.turn, seq: data.seq, text: data.text, synced: true };
+    updateTranscript(data.text, true);
 }
 
 // ===========================
@@ -155,14 +212,55 @@ async function handleIncomingAudioChunk(blob) {
 
     try {
         const arrayBuffer = await blob.arrayBuffer();
-        // Decode the audio data asynchronously
-        const audioBuffer = await state.audioContext.decodeAudioData(arrayBuffer);
-        scheduleAudioBuffer(audioBuffer);
+        // μ-law WAV is not decoded by every browser, so it is expanded here
+        const audioBuffer = state.audioFormat.codec === 'mulaw'
+            ? decodeMulawWav(arrayBuffer)
+            : await state.audioContext.decodeAudioData(arrayBuffer);
+        if (audioBuffer) scheduleAudioBuffer(audioBuffer);
     } catch (e) {
         console.error("Error decoding audio chunk:", e);
     }
 }
 
+const MULAW_TABLE = (() => {
+    const table = new Float32Array(256);
+    for (let i = 0; i < 256; i++) {
+        const u = ~i & 0xFF;
+        const exponent = (u >> 4) & 0x07;
+        const magnitude = ((((u & 0x0F) << 3) + 0x84) << exponent) - 0x84;
+        table[i] = ((u & 0x80) ? -magnitude : magnitude) / 32768;
+    }
+    return table;
+})();
+
+function decodeMulawWav(arrayBuffer) {
+    const view = new DataView(arrayBuffer);
+    let offset = 12;
+    let sampleRate = 0;
+    let channels = 1;
+    while (offset + 8 <= view.byteLength) {
+        const id = String.fromCharCode(view.getUint8(offset), view.getUint8(offset + 1), view.getUint8(offset + 2), view.getUint8(offset + 3));
+        const size = view.getUint32(offset + 4, true);
+        const body = offset + 8;
+        if (id === 'fmt ') {
+            channels = view.getUint16(body + 2, true);
+            sampleRate = view.getUint32(body + 4, true);
+        } else if (id === 'data') {
+            const bytes = new Uint8Array(arrayBuffer, body, Math.min(size, view.byteLength - body));
+            const frames = Math.floor(bytes.length / channels);
+            if (!frames || !sampleRate) return null;
+            const buffer = state.audioContext.createBuffer(channels, frames, sampleRate);
+            for (let c = 0; c < channels; c++) {
+                const out = buffer.getChannelData(c);
+                for (let i = 0; i < frames; i++) out[i] = MULAW_TABLE[bytes[i * channels + c]];
+            }
+            return buffer;
+        }
+        offset = body + size + (size & 1);
+    }
+    return null;
+}
+
 function scheduleAudioBuffer(buffer) {
     const source = state.audioContext.createBufferSource();
     source.buffer = buffer;
@@ -279,6 +377,7 @@ async function initVAD() {
                     state.lastVadEndTimestamp = Date.now();
                     state.firstProcessingTimestamp = 0;
                     state.firstAudioTimestamp = 0;
+                    if (SERVER_VAD) return; // the server cuts the utterance itself
                     console.log(`[Perf] Client: VAD Speech End. Sending signal...`);
 
                     // We already sent the chunks in onFrameProcessed.
@@ -402,7 +501,8 @@ async function startSession() {
             const processor = context.createScriptProcessor(4096, 1, 1);
 
             processor.onaudioprocess = (e) => {
-                if (state.isStreaming && state.isConnected && state.websocket.readyState === WebSocket.OPEN) {
+                const streaming = SERVER_VAD ? !state.isSpeaking : state.isStreaming;
+                if (streaming && state.isConnected && state.websocket.readyState === WebSocket.OPEN) {
                     const inputData = e.inputBuffer.getChannelData(0);
                     const buffer = new ArrayBuffer(inputData.length * 2);
                     const view = new DataView(buffer);
@@ -1,15 +1,25 @@
 # services/adk_service.py
 
+import asyncio
 import logging
-from typing import List, Dict, Tuple
+import threading
+from contextlib import aclosing
+from typing import Any, List, Dict, Sequence, Tuple
 
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.sessions import InMemorySessionService
 from google.adk.artifacts import InMemoryArtifactService
 from google.genai import types
 # Імпарт genai_errors больш не патрэбны тут
 from router_agent.agent import router_agent 
 from bot import helpers                    
+from services.worker_pool import BoundedWorkerPool
+from services.session_manager import SessionManager
+from services.sqlite_session_service import SqliteSessionService
+from services.turn_scheduler import TurnScheduler
+from services.metrics import cancellation
+import config
 
 log = logging.getLogger(__name__)
 
@@ -17,7 +27,7 @@ class ADKService:
     def __init__(self):
         log.info("Initializing ADKService with REAL components...")
         self.artifact_service = InMemoryArtifactService()
-        self.session_service = InMemorySessionService()
+        self.session_service = self._create_session_service()
         self.runner = Runner(
             agent=router_agent,
             app_name=router_agent.name,
@@ -25,34 +35,71 @@ class ADKService:
             artifact_service=self.artifact_service,
         )
         self.app_name = router_agent.name
-        self.user_sessions: Dict[str, str] = {}
+        # user_id -> session_id з TTL/LRU-выцясненнем і абрэзкай старых падзей
+        self.sessions = SessionManager(
+            self.session_service,
+            self.artifact_service,
+            self.app_name,
+            ttl_seconds=config.SESSION_TTL,
+            max_sessions=config.SESSION_MAX_RESIDENT,
+            max_events=config.SESSION_MAX_EVENTS,
+            is_busy=lambda session_id: self.turns.busy(session_id),
+        )
+        # Не больш за адзін ход на сесію, абмежаваная чарга астатніх
+        self.turns = TurnScheduler(max_queued=config.SESSION_MAX_QUEUED_TURNS)
+        # Глабальны ліміт адначасовых агентавых хадоў (абараняе квоту Gemini)
+        self.agent_slots = asyncio.Semaphore(config.AGENT_MAX_CONCURRENCY)
+        # Агульны пул патокаў для run_agent_stream (замест новага executor-а на кожны выклік)
+        self.stream_pool = BoundedWorkerPool(
+            "adk-stream",
+            max_workers=config.AGENT_STREAM_WORKERS,
+            max_queue=config.AGENT_STREAM_QUEUE_SIZE,
+        )
 
-    async def get_or_create_session(self, user_id: str) -> str:
-        # (без змен)
-        if user_id not in self.user_sessions:
-            log.info(f"Creating new session for user {user_id}")
-            session = await self.session_service.create_session(
-                app_name=self.app_name, user_id=user_id
+    @staticmethod
+    def _create_session_service():
+        if config.SESSION_BACKEND == "sqlite":
+            log.info(f"Using SQLite session backend at {config.SESSION_DB_PATH}")
+            return SqliteSessionService(
+                config.SESSION_DB_PATH,
+                cache_size=config.SESSION_CACHE_SIZE,
+                flush_interval=config.SESSION_FLUSH_INTERVAL,
             )
-            self.user_sessions[user_id] = session.id
-        return self.user_sessions[user_id]
+        if config.SESSION_BACKEND != "memory":
+            log.warning(f"Unknown SESSION_BACKEND '{config.SESSION_BACKEND}', falling back to memory")
+        return InMemorySessionService()
 
-    def run_agent(
-        self, session_id: str, user_id: str, text: str | None, file_data: bytes | None = None, mime_type: str | None = None
-    ) -> Tuple[str, Dict, List[types.Part]]:
-        """Запускае агент з тэкстам і/або дадзенымі файла (сінхронна)."""
-        
+    async def get_or_create_session(self, user_id: str) -> str:
+        return await self.sessions.get_or_create(user_id)
+
+    @staticmethod
+    def _build_content(
+        text: str | None, file_data: bytes | None, mime_type: str | None,
+        attachments: Sequence[types.Part] | None = None,
+    ) -> types.Content | None:
+        """Збірае адзін шматчасткавы user-turn: тэкст, файл і дадатковыя ўкладанні."""
         parts = []
         if text:
             parts.append(types.Part(text=text))
         if file_data and mime_type:
             blob = types.Blob(data=file_data, mime_type=mime_type)
             parts.append(types.Part(inline_data=blob))
-
+        if attachments:
+            parts.extend(attachments)
         if not parts:
+            return None
+        return types.Content(role="user", parts=parts)
+
+    def run_agent(
+        self, session_id: str, user_id: str, text: str | None, file_data: bytes | None = None, mime_type: str | None = None,
+        attachments: Sequence[types.Part] | None = None,
+    ) -> Tuple[str, Dict, List[types.Part]]:
+        """Запускае агент з тэкстам і/або дадзенымі файла (сінхронна)."""
+        
+        content = self._build_content(text, file_data, mime_type, attachments)
+        if content is None:
             return "", {}, []
         
-        content = types.Content(role="user", parts=parts)
         final_parts, delta = [], {}
         
         for ev in self.runner.run(user_id=user_id, session_id=session_id, new_message=content):
@@ -60,57 +107,123 @@ class ADKService:
                 final_parts = ev.content.parts or []
             if ev.actions and ev.actions.artifact_delta:
                 delta.update(ev.actions.artifact_delta)
+        self.sessions.compact(user_id, session_id)
+
+        reply = "\n".join(p.text for p in final_parts if p.text)
+        return reply, delta, final_parts
+
+    async def run_agent_async(
+        self, session_id: str, user_id: str, text: str | None, file_data: bytes | None = None, mime_type: str | None = None,
+        attachments: Sequence[types.Part] | None = None,
+    ) -> Tuple[str, Dict, List[types.Part]]:
+        """Асінхронны варыянт run_agent праз Runner.run_async — не блакуе event loop.
+
+        Колькасць адначасовых хадоў абмежавана config.AGENT_MAX_CONCURRENCY.
+        """
+        content = self._build_content(text, file_data, mime_type, attachments)
+        if content is None:
+            return "", {}, []
+
+        final_parts, delta = [], {}
+
+        async with self.agent_slots:
+            async for ev in self.runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
+                if ev.is_final_response() and ev.content:
+                    final_parts = ev.content.parts or []
+                if ev.actions and ev.actions.artifact_delta:
+                    delta.update(ev.actions.artifact_delta)
+        self.sessions.compact(user_id, session_id)
+        self.sessions.touch(user_id)
 
         reply = "\n".join(p.text for p in final_parts if p.text)
         return reply, delta, final_parts
 
     async def run_agent_stream(
-        self, session_id: str, user_id: str, text: str | None, file_data: bytes | None = None, mime_type: str | None = None
+        self, session_id: str, user_id: str, text: str | None, file_data: bytes | None = None, mime_type: str | None = None,
+        attachments: Sequence[types.Part] | None = None, streaming: bool = False,
     ):
-        """Запускае агент і вяртае генератар падзей."""
-        parts = []
-        if text:
-            parts.append(types.Part(text=text))
+        """Запускае агент і вяртае генератар падзей.
+
+        Runner выконваецца ў агульным self.stream_pool; калі пул перапоўнены,
+        генератар кідае PoolSaturatedError яшчэ да першай падзеі.
+        Пры streaming=True мадэль працуе ў рэжыме SSE і генератар аддае
+        таксама частковыя (partial) падзеі з кавалкамі тэксту.
+        """
         if file_data and mime_type:
             # Check if it is already WAV from our new VAD
-            if mime_type == "audio/wav" or (file_data.startswith(b'RIFF') and file_data[8:12] == b'WAVE'):
-                blob = types.Blob(data=file_data, mime_type="audio/wav")
-            else:
-                blob = types.Blob(data=file_data, mime_type=mime_type)
-            parts.append(types.Part(inline_data=blob))
+            if file_data.startswith(b'RIFF') and file_data[8:12] == b'WAVE':
+                mime_type = "audio/wav"
 
-        if not parts:
+        content = self._build_content(text, file_data, mime_type, attachments)
+        if content is None:
             return
-
-        content = types.Content(role="user", parts=parts)
-        
-        
-        # True streaming using a queue to bridge sync runner and async generator
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
         
+        # True streaming using a queue to bridge the worker thread and this async generator
         loop = asyncio.get_running_loop()
         event_queue = asyncio.Queue()
         
-        def sync_run_and_push():
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE) if streaming else RunConfig()
+        # Воркер запускае run_async на ўласным loop-е, каб яго задачу можна было адмяніць
+        worker: Dict[str, Any] = {"stop": threading.Event()}
+
+        def run_in_worker():
+            if worker["stop"].is_set():
+                loop.call_soon_threadsafe(event_queue.put_nowait, None)
+                return
+            # Лічым толькі хады, што сапраўды пачаліся (не адмененыя ў чарзе пула)
+            cancellation.inc("agent_runs_started")
+            worker_loop = asyncio.new_event_loop()
+
+            async def consume():
+                async with aclosing(self.runner.run_async(
+                    user_id=user_id, session_id=session_id, new_message=content, run_config=run_config
+                )) as events:
+                    async for ev in events:
+                        loop.call_soon_threadsafe(event_queue.put_nowait, ev)
+                # Абрэзка правіць захаваныя падзеі — толькі на галоўным loop-е (да сігналу канца)
+                loop.call_soon_threadsafe(self.sessions.compact, user_id, session_id)
+
+            task = worker_loop.create_task(consume())
+            worker["loop"], worker["task"] = worker_loop, task
+            if worker["stop"].is_set():
+                # Кансумер сышоў, пакуль задача стваралася
+                task.cancel()
             try:
-                for ev in self.runner.run(user_id=user_id, session_id=session_id, new_message=content):
-                    loop.call_soon_threadsafe(event_queue.put_nowait, ev)
+                worker_loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                log.info(f"Agent run for session {session_id} cancelled")
             except Exception as e:
-                log.error(f"Error in sync runner: {e}")
-                # Optionally push error to queue or handle it
+                log.error(f"Error in agent runner: {e}")
             finally:
+                worker_loop.close()
                 loop.call_soon_threadsafe(event_queue.put_nowait, None) # Sentinel
 
-        # Fire and forget the thread (or keep ref to verify completion)
-        executor = ThreadPoolExecutor(max_workers=1)
-        loop.run_in_executor(executor, sync_run_and_push)
+        future = self.stream_pool.submit(run_in_worker)
 
-        while True:
-            ev = await event_queue.get()
-            if ev is None:
-                break
-            yield ev
+        finished = False
+        try:
+            while True:
+                ev = await event_queue.get()
+                if ev is None:
+                    finished = True
+                    break
+                yield ev
+        finally:
+            # Як і ў run_agent_async: актыўная сесія (напр. галасавы сокет) пераходзіць у канец LRU
+            self.sessions.touch(user_id)
+            if not finished:
+                # Кансумер сышоў (interrupt / кліент закрыў злучэнне): спыняем ход агента
+                worker["stop"].set()
+                cancellation.inc("agent_runs_cancelled")
+                if future.cancel():
+                    cancellation.inc("agent_runs_cancelled_queued")
+                elif "task" in worker and not worker["task"].done():
+                    try:
+                        worker["loop"].call_soon_threadsafe(worker["task"].cancel)
+                    except RuntimeError:
+                        # Воркер ужо закрыў свой loop — ход скончыўся сам
+                        pass
+                cancellation.inc("agent_events_discarded", event_queue.qsize())
 
     async def send_media_from_parts(
         self, chat_id: int, context, parts: List[types.Part]
@@ -0,0 +1,193 @@
+# services/artifact_store.py
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+log = logging.getLogger(__name__)
+
+# <sha256>.<ext> — імёны, пад якімі ляжаць матэрыялізаваныя артэфакты
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_READ_CHUNK = 64 * 1024
+
+
+@dataclass
+class MaterializedArtifact:
+    filename: str
+    kind: str
+    url: str
+    digest: str
+    mime_type: str
+
+
+class ArtifactStore:
+    """
+    Матэрыялізацыя ADK-артэфактаў на дыск па хэшы зместу.
+
+    Аднолькавыя байты запісваюцца адзін раз (імя файла — sha256), таму
+    `tts_output.wav` розных карыстальнікаў больш не перазапісваюць адзін
+    аднаго, а адказы /api/files можна кэшаваць як immutable.
+    """
+
+    def __init__(self, root: Path, url_prefix: str = "/api/files", index_size: int = 1024):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        self.index_size = max(1, index_size)
+        # Імёны, запісаныя нядаўна (LRU); астатнія правяраюцца па дыску
+        self._written: "OrderedDict[str, None]" = OrderedDict()
+
+    async def materialize_many(
+        self, artifact_service, app_name: str, user_id: str, session_id: str, delta: Dict[str, int]
+    ) -> List[MaterializedArtifact]:
+        """Адначасова загружае і захоўвае ўсе аўдыя/выявы з artifact_delta."""
+        results = await asyncio.gather(
+            *(
+                self.materialize(artifact_service, app_name, user_id, session_id, filename, version)
+                for filename, version in delta.items()
+            )
+        )
+        return [r for r in results if r is not None]
+
+    async def materialize(
+        self, artifact_service, app_name: str, user_id: str, session_id: str, filename: str, version: int
+    ) -> Optional[MaterializedArtifact]:
+        try:
+            part = await artifact_service.load_artifact(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                filename=filename,
+                version=version,
+            )
+            if not (part and getattr(part, "inline_data", None) and getattr(part.inline_data, "data", None)):
+                return None
+
+            mime_type = getattr(part.inline_data, "mime_type", "") or ""
+            if mime_type.startswith("audio"):
+                kind = "audio"
+            elif mime_type.startswith("image"):
+                kind = "image"
+            else:
+                return None
+
+            data = part.inline_data.data
+            digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+            ext = Path(filename).suffix.lower() or mimetypes.guess_extension(mime_type) or ""
+            name = f"{digest}{ext}"
+            await self._write_once(name, data)
+            return MaterializedArtifact(
+                filename=filename, kind=kind, url=f"{self.url_prefix}/{name}", digest=digest, mime_type=mime_type
+            )
+        except Exception as e:
+            log.error(f"Error loading artifact {filename} v{version}: {e}")
+            return None
+
+    async def _write_once(self, name: str, data: bytes):
+        if name in self._written:
+            self._written.move_to_end(name)
+            return
+        path = self.root / name
+        if not path.exists():
+            await asyncio.to_thread(_atomic_write, path, data)
+        self._written[name] = None
+        while len(self._written) > self.index_size:
+            self._written.popitem(last=False)
+
+    # ────────────────────────── раздача файлаў ──────────────────────────
+    def resolve(self, filename: str) -> Optional[Path]:
+        path = (self.root / filename).resolve()
+        if path.parent != self.root.resolve() or not path.is_file():
+            return None
+        return path
+
+    def file_response(self, path: Path, request: Request, media_type: str) -> Response:
+        """
+        Адказ з ETag, Cache-Control і падтрымкай HTTP Range (адзін дыяпазон).
+
+        Для content-addressed файлаў ETag моцны (sha256), а кэш — immutable;
+        для астатніх — ETag па mtime/памеры і рэвалідацыя.
+        """
+        stat = path.stat()
+        size = stat.st_size
+        if _CONTENT_ADDRESSED.match(path.name):
+            etag = f'"{path.stem}"'
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            etag = f'W/"{int(stat.st_mtime)}-{size}"'
+            cache_control = "no-cache"
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        # Некалькі дыяпазонаў не падтрымліваем — тады аддаем увесь файл
+        if range_header and _RANGE.match(range_header.strip()) and (not if_range or if_range.strip() == etag):
+            parsed = _parse_range(range_header, size)
+            if parsed is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if parsed != (0, size - 1):
+                start, end = parsed
+                length = end - start + 1
+                headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)})
+                return StreamingResponse(
+                    _iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers
+                )
+
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """'bytes=a-b' -> (start, end) уключна; None, калі дыяпазон немагчымы."""
+    match = _RANGE.match(header.strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — апошнія N байтаў
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+async def _iter_file(path: Path, start: int, length: int) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(_READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _atomic_write(path: Path, data: bytes):
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,236 @@
+# services/audio_codec.py
+
+import logging
+import struct
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_MULAW = 7
+
+_RIFF_HEADER = struct.Struct("<4sI4s")
+_CHUNK_HEADER = struct.Struct("<4sI")
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+WAV_HEADER_SIZE = _WAV_HEADER.size
+
+# Байтаў на сэмпл для кожнага кодэка
+_CODECS: Dict[str, Tuple[int, int]] = {
+    "f32": (WAVE_FORMAT_IEEE_FLOAT, 4),
+    "pcm16": (WAVE_FORMAT_PCM, 2),
+    "mulaw": (WAVE_FORMAT_MULAW, 1),
+}
+DEFAULT_CODEC = "pcm16"
+
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 32635
+
+
+@dataclass
+class WavInfo:
+    format_code: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data: memoryview
+
+
+def parse_wav(data) -> Optional[WavInfo]:
+    """Разбірае RIFF/WAVE па чанках; None, калі гэта не WAV. data — без капіявання (memoryview)."""
+    view = memoryview(data)
+    if len(view) < _RIFF_HEADER.size:
+        return None
+    riff, _, wave = _RIFF_HEADER.unpack_from(view, 0)
+    if riff != b"RIFF" or wave != b"WAVE":
+        return None
+
+    fmt = None
+    offset = _RIFF_HEADER.size
+    while offset + _CHUNK_HEADER.size <= len(view):
+        chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(view, offset)
+        body = offset + _CHUNK_HEADER.size
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+        elif chunk_id == b"data" and fmt is not None:
+            # Стрымінгавыя WAV часам маюць памер data 0 / 0xFFFFFFFF — бярэм усё, што ёсць
+            end = len(view) if chunk_size in (0, 0xFFFFFFFF) else min(len(view), body + chunk_size)
+            format_code, channels, sample_rate, _, _, bits = fmt
+            return WavInfo(format_code, channels, sample_rate, bits, view[body:end])
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def wav_header(data_len: int, format_code: int, sample_rate: int, channels: int, bytes_per_sample: int) -> bytes:
+    return _WAV_HEADER.pack(*_header_fields(data_len, format_code, sample_rate, channels, bytes_per_sample))
+
+
+def wav_buffer(data_len: int, format_code: int, sample_rate: int, channels: int, bytes_per_sample: int) -> bytearray:
+    """
+    Буфер пад WAV: загаловак ужо запісаны (pack_into), data — data_len нулявых байтаў
+    з зрушэння WAV_HEADER_SIZE. Дадзеныя пішуцца адразу на месца — без `header + payload`.
+    """
+    buf = bytearray(WAV_HEADER_SIZE + data_len)
+    write_wav_header(buf, data_len, format_code, sample_rate, channels, bytes_per_sample)
+    return buf
+
+
+def write_wav_header(
+    buf: bytearray, data_len: int, format_code: int, sample_rate: int, channels: int, bytes_per_sample: int
+):
+    """Запісвае WAV-загаловак у першыя WAV_HEADER_SIZE байтаў buf — без новага буфера."""
+    _WAV_HEADER.pack_into(buf, 0, *_header_fields(data_len, format_code, sample_rate, channels, bytes_per_sample))
+
+
+def concat_wav(chunks) -> bytes:
+    """
+    Склейвае WAV-кавалкі аднаго фармату ў адзін WAV з правільным загалоўкам
+    (адно капіяванне data у вынік). Адзін кавалак вяртаецца як ёсць.
+    """
+    if len(chunks) == 1:
+        return bytes(chunks[0])
+    infos = [parse_wav(chunk) for chunk in chunks]
+    if any(info is None for info in infos):
+        raise ValueError("Only WAV chunks can be concatenated")
+    first = infos[0]
+    fmt = (first.format_code, first.channels, first.sample_rate, first.bits_per_sample)
+    for info in infos[1:]:
+        if (info.format_code, info.channels, info.sample_rate, info.bits_per_sample) != fmt:
+            raise ValueError(f"WAV format mismatch: {fmt} vs {(info.format_code, info.channels, info.sample_rate, info.bits_per_sample)}")
+    total = sum(len(info.data) for info in infos)
+    header = wav_header(total, first.format_code, first.sample_rate, first.channels, first.bits_per_sample // 8)
+    return b"".join([header, *(info.data for info in infos)])
+
+
+def _header_fields(data_len: int, format_code: int, sample_rate: int, channels: int, bytes_per_sample: int) -> tuple:
+    return (
+        b"RIFF", data_len + 36, b"WAVE", b"fmt ", 16, format_code, channels, sample_rate,
+        sample_rate * channels * bytes_per_sample, channels * bytes_per_sample, bytes_per_sample * 8,
+        b"data", data_len,
+    )
+
+
+def to_float32(info: WavInfo) -> Optional[np.ndarray]:
+    """Сэмплы WAV як float32 [-1, 1] (формы (n,) або (n, channels))."""
+    if info.format_code == WAVE_FORMAT_IEEE_FLOAT and info.bits_per_sample == 32:
+        samples = np.frombuffer(info.data, dtype="<f4", count=len(info.data) // 4)
+    elif info.format_code == WAVE_FORMAT_PCM and info.bits_per_sample == 16:
+        samples = np.frombuffer(info.data, dtype="<i2", count=len(info.data) // 2).astype(np.float32) / 32768.0
+    elif info.format_code == WAVE_FORMAT_MULAW and info.bits_per_sample == 8:
+        samples = mulaw_decode(np.frombuffer(info.data, dtype=np.uint8)).astype(np.float32) / 32768.0
+    else:
+        return None
+    if info.channels > 1:
+        samples = samples[: len(samples) - len(samples) % info.channels].reshape(-1, info.channels)
+    return samples
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Лінейная перадыскрэтызацыя (np.interp) — для маўлення хапае."""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    n_out = max(1, int(round(len(samples) * dst_rate / src_rate)))
+    positions = np.arange(n_out, dtype=np.float64) * (src_rate / dst_rate)
+    src_index = np.arange(len(samples), dtype=np.float64)
+    if samples.ndim == 1:
+        return np.interp(positions, src_index, samples).astype(np.float32)
+    return np.stack(
+        [np.interp(positions, src_index, samples[:, c]) for c in range(samples.shape[1])], axis=1
+    ).astype(np.float32)
+
+
+def mulaw_encode(pcm16: np.ndarray) -> np.ndarray:
+    """G.711 μ-law: int16 -> uint8 (вектарызавана)."""
+    x = pcm16.astype(np.int32)
+    sign = np.where(x < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(x), _MULAW_CLIP) + _MULAW_BIAS
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def mulaw_decode(encoded: np.ndarray) -> np.ndarray:
+    """G.711 μ-law: uint8 -> int16."""
+    u = ~encoded.astype(np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+class AudioEncoder:
+    """
+    Перакадоўка TTS-аўдыя для voice-сокета.
+
+    Спецыфікацыя — `<codec>[@<rate>]`: `f32` (як ёсць), `pcm16` (удвая менш),
+    `mulaw` (у чатыры разы менш), напр. `mulaw@16000`. Кожны кавалак застаецца
+    самастойным WAV, таму кліент дэкадуе яго асобна.
+    """
+
+    def __init__(self, codec: str = DEFAULT_CODEC, sample_rate: Optional[int] = None):
+        if codec not in _CODECS:
+            raise ValueError(f"Unsupported audio codec '{codec}'")
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.format_code, self.bytes_per_sample = _CODECS[codec]
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @classmethod
+    def negotiate(cls, spec: Optional[str]) -> "AudioEncoder":
+        """?codec=... -> кодэр; невядомая спецыфікацыя -> DEFAULT_CODEC."""
+        codec, _, rate = (spec or DEFAULT_CODEC).lower().partition("@")
+        try:
+            sample_rate = int(rate) if rate else None
+            if sample_rate is not None and not 8000 <= sample_rate <= 48000:
+                raise ValueError(f"sample rate {sample_rate} out of range")
+            return cls(codec, sample_rate)
+        except ValueError as e:
+            log.warning(f"Audio codec '{spec}' rejected ({e}); using {DEFAULT_CODEC}")
+            return cls(DEFAULT_CODEC)
+
+    def describe(self) -> Dict:
+        return {"type": "audio_format", "codec": self.codec, "sample_rate": self.sample_rate, "container": "wav"}
+
+    def encode(self, chunk):
+        """WAV-кавалак (bytes / memoryview) -> кадр для send_bytes; без перакадоўкі — той жа аб'ект."""
+        self.bytes_in += len(chunk)
+        encoded = self._encode(chunk)
+        self.bytes_out += len(encoded)
+        return encoded
+
+    def _encode(self, chunk):
+        info = parse_wav(chunk)
+        if info is None:
+            # Не WAV (mp3 і г.д.) — аддаем як ёсць
+            return chunk
+        dst_rate = self.sample_rate or info.sample_rate
+        if info.format_code == self.format_code and dst_rate == info.sample_rate:
+            return chunk
+        samples = to_float32(info)
+        if samples is None:
+            return chunk
+        samples = resample(samples, info.sample_rate, dst_rate).reshape(-1)
+
+        # Сэмплы пішуцца адразу ў буфер кадра, за загалоўкам
+        frame = wav_buffer(len(samples) * self.bytes_per_sample, self.format_code, dst_rate, info.channels, self.bytes_per_sample)
+        if self.codec == "f32":
+            np.frombuffer(frame, dtype="<f4", offset=WAV_HEADER_SIZE)[:] = samples
+        else:
+            pcm16 = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+            if self.codec == "pcm16":
+                np.frombuffer(frame, dtype="<i2", offset=WAV_HEADER_SIZE)[:] = pcm16
+            else:
+                np.frombuffer(frame, dtype=np.uint8, offset=WAV_HEADER_SIZE)[:] = mulaw_encode(pcm16)
+        return memoryview(frame)
+
+    def stats(self) -> Dict:
+        return {
+            "codec": self.codec,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None,
+        }
@@ -0,0 +1,165 @@
+# services/audio_egress.py
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from services.audio_codec import WAV_HEADER_SIZE, parse_wav, wav_buffer
+
+log = logging.getLogger(__name__)
+
+EGRESS_POLICIES = ("drop", "pause", "disconnect")
+
+
+class AudioEgressBuffer:
+    """
+    Абмежаваная чарга выходнага аўдыя аднаго voice-сокета.
+
+    • бюджэт — у байтах (max_bytes), а не ў кавалках;
+    • пры перапаўненні паводзіны задае policy:
+        drop       — новы кавалак адкідаецца (лічыцца ў stats),
+        pause      — вытворца чакае, пакуль кліент не разгрузіць буфер,
+        disconnect — буфер закрываецца, а злучэнне трэба разарваць (overflowed);
+    • get() склейвае дробныя WAV-кавалкі аднолькавага фармату ў адзін кадр
+      да frame_bytes — менш паведамленняў і роўнейшае прайграванне.
+
+    Усе метады — з event loop-а злучэння; з іншых патокаў — праз
+    asyncio.run_coroutine_threadsafe(buffer.put(chunk), loop).
+    Кавалкі — bytes або memoryview; яны не капіююцца, акрамя склейвання ў кадр.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, policy: str = "pause", frame_bytes: int = 32 * 1024):
+        if policy not in EGRESS_POLICIES:
+            raise ValueError(f"Unknown egress policy '{policy}' (expected one of {EGRESS_POLICIES})")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.frame_bytes = frame_bytes
+        self.overflowed = False
+        self._chunks: Deque[bytes] = deque()
+        self._queued_bytes = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+        self._stats: Dict[str, int] = {
+            "chunks_in": 0,
+            "bytes_in": 0,
+            "frames_out": 0,
+            "chunks_coalesced": 0,
+            "dropped_chunks": 0,
+            "dropped_bytes": 0,
+            "cleared_chunks": 0,
+            "producer_pauses": 0,
+            "peak_bytes": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._queued_bytes
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def put(self, chunk: bytes) -> bool:
+        """Ставіць кавалак у чаргу. False — злучэнне больш не прымае аўдыя (вытворцу варта спыніцца)."""
+        size = len(chunk)
+        async with self._cond:
+            if self._closed:
+                return False
+            if not self._fits(size):
+                if self.policy == "drop":
+                    self._stats["dropped_chunks"] += 1
+                    self._stats["dropped_bytes"] += size
+                    return True
+                if self.policy == "disconnect":
+                    log.warning(f"Audio egress overflow ({self._queued_bytes} bytes queued); closing connection")
+                    self.overflowed = True
+                    self._closed = True
+                    self._cond.notify_all()
+                    return False
+                self._stats["producer_pauses"] += 1
+                await self._cond.wait_for(lambda: self._closed or self._fits(size))
+                if self._closed:
+                    return False
+            self._chunks.append(chunk)
+            self._queued_bytes += size
+            self._stats["chunks_in"] += 1
+            self._stats["bytes_in"] += size
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._queued_bytes)
+            self._cond.notify_all()
+            return True
+
+    async def get(self) -> Optional[memoryview]:
+        """Наступны кадр для адпраўкі (магчыма, склеены з некалькіх кавалкаў); None — буфер закрыты."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._chunks or self._closed)
+            if not self._chunks or self.overflowed:
+                return None
+            frame = self._take_frame()
+            self._stats["frames_out"] += 1
+            self._cond.notify_all()
+            return frame
+
+    async def clear(self) -> int:
+        """Выкідае ўсё неадпраўленае (interrupt); вяртае колькасць выкінутых кавалкаў."""
+        async with self._cond:
+            discarded = len(self._chunks)
+            self._chunks.clear()
+            self._queued_bytes = 0
+            self._stats["cleared_chunks"] += discarded
+            self._cond.notify_all()
+            return discarded
+
+    async def close(self):
+        """Закрывае буфер: get() аддае None, вытворцы, што чакаюць месца, вызваляюцца."""
+        async with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "max_bytes": self.max_bytes,
+            "queued_bytes": self._queued_bytes,
+            "queued_chunks": len(self._chunks),
+            "occupancy": round(self._queued_bytes / self.max_bytes, 3) if self.max_bytes else None,
+            "overflowed": self.overflowed,
+            **self._stats,
+        }
+
+    def _fits(self, size: int) -> bool:
+        # Кавалак, большы за ўвесь бюджэт, прапускаем у пусты буфер — інакш ён не пройдзе ніколі
+        return self._queued_bytes + size <= self.max_bytes or not self._chunks
+
+    def _take_frame(self) -> memoryview:
+        first = self._chunks.popleft()
+        self._queued_bytes -= len(first)
+        info = parse_wav(first) if self._chunks else None
+        if info is None:
+            return memoryview(first)
+
+        fmt = (info.format_code, info.channels, info.sample_rate, info.bits_per_sample)
+        payloads = [info.data]
+        total = len(info.data)
+        while self._chunks:
+            nxt = parse_wav(self._chunks[0])
+            if nxt is None or (nxt.format_code, nxt.channels, nxt.sample_rate, nxt.bits_per_sample) != fmt:
+                break
+            if total + len(nxt.data) > self.frame_bytes:
+                break
+            self._queued_bytes -= len(self._chunks.popleft())
+            payloads.append(nxt.data)
+            total += len(nxt.data)
+
+        if len(payloads) == 1:
+            return memoryview(first)
+        self._stats["chunks_coalesced"] += len(payloads)
+        frame = wav_buffer(total, info.format_code, info.sample_rate, info.channels, info.bits_per_sample // 8)
+        offset = WAV_HEADER_SIZE
+        for payload in payloads:
+            frame[offset:offset + len(payload)] = payload
+            offset += len(payload)
+        return memoryview(frame)
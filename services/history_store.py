@@ -0,0 +1,118 @@
+# services/history_store.py
+
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class ChatMessage:
+    """Адно паведамленне гісторыі; __slots__ — без __dict__ на кожны аб'ект."""
+
+    __slots__ = ("seq", "role", "content", "ts")
+
+    def __init__(self, seq: int, role: str, content: str, ts: float):
+        self.seq = seq
+        self.role = role
+        self.content = content
+        self.ts = ts
+
+    def to_dict(self) -> Dict:
+        return {"id": self.seq, "role": self.role, "content": self.content, "ts": self.ts}
+
+
+class _UserHistory:
+    __slots__ = ("messages", "next_seq", "last_access")
+
+    def __init__(self, max_messages: int):
+        self.messages: Deque[ChatMessage] = deque(maxlen=max_messages)
+        self.next_seq = 1
+        self.last_access = time.monotonic()
+
+
+class ChatHistoryStore:
+    """
+    Абмежаваная гісторыя чата ў памяці.
+
+    • на карыстальніка — не больш за max_messages (старыя выцясняюцца);
+    • карыстальнікаў — не больш за max_users (LRU);
+    • гісторыя, да якой не звярталіся ttl_seconds, выдаляецца.
+    """
+
+    def __init__(self, max_messages: int = 200, max_users: int = 1000, ttl_seconds: float = 24 * 3600):
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users: "OrderedDict[str, _UserHistory]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def append(self, user_id: str, role: str, content: str) -> ChatMessage:
+        history = self._touch(user_id, create=True)
+        msg = ChatMessage(history.next_seq, role, content, time.time())
+        history.next_seq += 1
+        history.messages.append(msg)
+        self._evict()
+        return msg
+
+    def page(self, user_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[ChatMessage], Optional[int]]:
+        """
+        Старонка гісторыі ў храналагічным парадку.
+
+        before — курсор (id паведамлення): вяртаюцца паведамленні старэйшыя за яго,
+        без курсора — апошнія. Другі элемент — курсор на папярэднюю старонку або None.
+        """
+        history = self._touch(user_id, create=False)
+        if history is None or limit <= 0:
+            return [], None
+
+        page: List[ChatMessage] = []
+        has_more = False
+        for msg in reversed(history.messages):
+            if before is not None and msg.seq >= before:
+                continue
+            if len(page) == limit:
+                has_more = True
+                break
+            page.append(msg)
+        page.reverse()
+        next_cursor = page[0].seq if has_more and page else None
+        return page, next_cursor
+
+    def clear(self, user_id: str):
+        self._users.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self._users),
+            "messages": sum(len(h.messages) for h in self._users.values()),
+            "max_users": self.max_users,
+            "max_messages_per_user": self.max_messages,
+        }
+
+    def _touch(self, user_id: str, create: bool) -> Optional[_UserHistory]:
+        history = self._users.get(user_id)
+        now = time.monotonic()
+        if history is not None and now - history.last_access > self.ttl_seconds:
+            del self._users[user_id]
+            history = None
+        if history is None:
+            if not create:
+                return None
+            history = _UserHistory(self.max_messages)
+            self._users[user_id] = history
+        history.last_access = now
+        self._users.move_to_end(user_id)
+        return history
+
+    def _evict(self):
+        # LRU па колькасці карыстальнікаў
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        # TTL: самыя старыя ў пачатку OrderedDict
+        now = time.monotonic()
+        while self._users:
+            user_id, history = next(iter(self._users.items()))
+            if now - history.last_access <= self.ttl_seconds:
+                break
+            del self._users[user_id]
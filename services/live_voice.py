@@ -0,0 +1,160 @@
+# services/live_voice.py
+"""
+«Жывы» рэжым /api/voice: аўдыя ідзе ў мадэль падчас маўлення.
+
+Сесія мадэлі адкрываецца на пачатку рэплікі (і потым перавыкарыстоўваецца
+для наступных), PCM-кадры перадаюцца па меры паступлення, а пасля канца
+маўлення застаецца толькі сігнал завяршэння (activity_end) — загрузка
+ўсёй рэплікі больш не на крытычным шляху.
+
+LiveVoiceBackend / LiveVoiceTurn — інтэрфейс; GeminiLiveBackend — рэалізацыя
+праз client.aio.live.connect. Кліент перадаецца фабрыкай, таму бэкенд
+правяраецца з афлайн-заменай live-сесіі.
+"""
+
+import abc
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from google.genai import types
+
+log = logging.getLogger(__name__)
+
+
+class LiveVoiceTurn(abc.ABC):
+    """Адна рэпліка карыстальніка і адказ мадэлі ў жывой сесіі."""
+
+    @abc.abstractmethod
+    async def send_audio(self, pcm: bytes):
+        """Кавалак PCM16 mono (як прыходзіць ад кліента)."""
+
+    @abc.abstractmethod
+    async def end_audio(self):
+        """Карыстальнік скончыў гаварыць — мадэль можа адказваць."""
+
+    @abc.abstractmethod
+    def replies(self) -> AsyncIterator[str]:
+        """Тэкст адказу кавалкамі, да канца хода."""
+
+
+class LiveVoiceBackend(abc.ABC):
+    @abc.abstractmethod
+    async def start_turn(self) -> LiveVoiceTurn:
+        """Пачатак рэплікі; пры неабходнасці адкрывае сесію."""
+
+    @abc.abstractmethod
+    async def reset(self):
+        """Закрывае сесію (ход перапынены або сесія зламалася); наступны start_turn адкрые новую."""
+
+    async def close(self):
+        await self.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class GeminiLiveTurn(LiveVoiceTurn):
+    def __init__(self, backend: "GeminiLiveBackend", session: Any):
+        self._backend = backend
+        self._session = session
+        self.complete = False
+
+    async def send_audio(self, pcm: bytes):
+        await self._session.send_realtime_input(
+            audio=types.Blob(data=bytes(pcm), mime_type=f"audio/pcm;rate={self._backend.sample_rate}")
+        )
+        self._backend._stats["audio_bytes"] += len(pcm)
+
+    async def end_audio(self):
+        await self._session.send_realtime_input(activity_end=types.ActivityEnd())
+
+    async def replies(self) -> AsyncIterator[str]:
+        async for message in self._session.receive():
+            if message.text:
+                yield message.text
+            content = message.server_content
+            if content is not None and (content.turn_complete or content.interrupted):
+                break
+        self.complete = True
+
+
+class GeminiLiveBackend(LiveVoiceBackend):
+    """
+    Жывая сесія Gemini з тэкставым адказам (агучвае ўжо наш TTS).
+
+    Аўтаматычнае вызначэнне маўлення на баку API выключана: межы рэплікі
+    задае наш VAD (activity_start / activity_end). Сесія перавыкарыстоўваецца
+    паміж ходамі (яна ж трымае кантэкст размовы) і адкрываецца нанава пасля
+    перапынення, памылкі або праз max_session_seconds.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        model: str,
+        system_prompt: str,
+        sample_rate: int = 16000,
+        max_session_seconds: float = 600.0,
+    ):
+        self.client_factory = client_factory
+        self.model = model
+        self.system_prompt = system_prompt
+        self.sample_rate = sample_rate
+        self.max_session_seconds = max_session_seconds
+        self._stack: Optional[AsyncExitStack] = None
+        self._session: Any = None
+        self._opened_at = 0.0
+        self._turn: Optional[GeminiLiveTurn] = None
+        self._stats: Dict[str, int] = {"sessions_opened": 0, "turns": 0, "resets": 0, "audio_bytes": 0}
+
+    async def start_turn(self) -> LiveVoiceTurn:
+        stale = time.monotonic() - self._opened_at > self.max_session_seconds
+        if self._session is not None and (stale or (self._turn is not None and not self._turn.complete)):
+            # Непрачытаны адказ папярэдняга хода змяшаўся б з новым
+            await self.reset()
+        if self._session is None:
+            await self._open()
+        try:
+            await self._session.send_realtime_input(activity_start=types.ActivityStart())
+        except Exception:
+            await self.reset()
+            raise
+        self._turn = GeminiLiveTurn(self, self._session)
+        self._stats["turns"] += 1
+        return self._turn
+
+    async def reset(self):
+        stack, self._stack, self._session, self._turn = self._stack, None, None, None
+        if stack is not None:
+            self._stats["resets"] += 1
+            try:
+                await stack.aclose()
+            except Exception as e:
+                log.debug(f"Closing live session failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model, "open": self._session is not None, **self._stats}
+
+    async def _open(self):
+        config = types.LiveConnectConfig(
+            response_modalities=[types.Modality.TEXT],
+            system_instruction=types.Content(parts=[types.Part(text=self.system_prompt)]),
+            realtime_input_config=types.RealtimeInputConfig(
+                automatic_activity_detection=types.AutomaticActivityDetection(disabled=True),
+            ),
+        )
+        stack = AsyncExitStack()
+        try:
+            self._session = await stack.enter_async_context(
+                self.client_factory().aio.live.connect(model=self.model, config=config)
+            )
+        except BaseException:
+            await stack.aclose()
+            raise
+        self._stack = stack
+        self._opened_at = time.monotonic()
+        self._stats["sessions_opened"] += 1
+        log.info(f"Live session opened ({self.model})")
+
@@ -0,0 +1,177 @@
+# services/metrics.py
+
+import bisect
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class Counters:
+    """Патокабяспечныя лічыльнікі (інкрэменты ідуць і з event loop-а, і з воркераў)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, int] = defaultdict(int)
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._values[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._values.items()))
+
+
+# Праца, якую спынілі/не зрабілі з-за перапынення (interrupt, закрыты кліент)
+cancellation = Counters()
+
+
+# Межы кошыкаў гістаграмы, мс (верхнія, уключна)
+LATENCY_BUCKETS_MS = (
+    10, 25, 50, 100, 150, 250, 400, 600, 800, 1000, 1250, 1500, 2000, 2500, 3000,
+    4000, 5000, 7500, 10000, 15000, 20000, 30000, 60000,
+)
+
+
+class LatencyHistogram:
+    """Гістаграма затрымак з фіксаванымі кошыкамі; квантылі — інтэрпаляцыяй унутры кошыка."""
+
+    def __init__(self, buckets_ms: Tuple[int, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[idx - 1] if idx > 0 else 0.0
+                upper = self.bounds[idx] if idx < len(self.bounds) else self.max
+                return round(min(lower + (upper - lower) * (rank - seen) / n, self.max), 1)
+            seen += n
+        return round(self.max, 1)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 1) if self.count else None,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 1),
+        }
+
+
+# Канец прыёму рэплікі (end_audio ад кліента або канец маўлення па серверным VAD)
+ENDPOINT_STAGE = "audio_received"
+
+
+class VoiceTrace:
+    """
+    Трасіроўка аднаго голасавага хода: trace_id і адзнакі этапаў.
+
+    Траса пачынаецца на першым кадры рэплікі (пачатак маўлення), таму першы
+    этап — прыём аўдыя (ENDPOINT_STAGE). mark(stage) запамінае час ад пачатку
+    трасы (толькі першы раз для этапа); span этапа — ад папярэдняй адзнакі.
+    """
+
+    __slots__ = ("trace_id", "user_id", "mode", "started", "marks", "outcome", "attrs")
+
+    def __init__(self, user_id: str, mode: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.user_id = user_id
+        self.mode = mode
+        self.started = time.monotonic()
+        self.marks: List[Tuple[str, float]] = []
+        self.outcome: Optional[str] = None
+        self.attrs: Dict[str, Any] = {}
+
+    def mark(self, stage: str) -> float:
+        for name, at_ms in self.marks:
+            if name == stage:
+                return at_ms
+        at_ms = (time.monotonic() - self.started) * 1000
+        self.marks.append((stage, at_ms))
+        return at_ms
+
+    def at(self, stage: str) -> Optional[float]:
+        for name, at_ms in self.marks:
+            if name == stage:
+                return at_ms
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages, previous = [], 0.0
+        for name, at_ms in self.marks:
+            stages.append({"stage": name, "at_ms": round(at_ms, 1), "span_ms": round(at_ms - previous, 1)})
+            previous = at_ms
+        return {
+            "trace_id": self.trace_id,
+            "mode": self.mode,
+            "outcome": self.outcome,
+            "stages": stages,
+            **self.attrs,
+        }
+
+
+class TraceRecorder:
+    """
+    Збірае скончаныя трасы ў гістаграмы па этапах і па выніках.
+
+    Этап прыёму лічыцца ад першага кадра рэплікі (працягласць маўлення + загрузкі),
+    астатнія — ад канца прыёму, каб затрымка адказу не залежала ад даўжыні рэплікі.
+    """
+
+    def __init__(self, keep_recent: int = 20):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._outcomes: Dict[str, int] = defaultdict(int)
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=keep_recent)
+
+    def start(self, user_id: str, mode: str) -> VoiceTrace:
+        return VoiceTrace(user_id, mode)
+
+    def finish(self, trace: VoiceTrace, outcome: str = "ok"):
+        if trace.outcome is not None:
+            return
+        trace.outcome = outcome
+        data = trace.to_dict()
+        with self._lock:
+            self._outcomes[outcome] += 1
+            if outcome == "ok":
+                endpoint = trace.at(ENDPOINT_STAGE)
+                for name, at_ms in trace.marks:
+                    if endpoint is not None and name != ENDPOINT_STAGE:
+                        at_ms -= endpoint
+                    self._histograms[f"{trace.mode}.{name}"].observe(at_ms)
+            self._recent.append(data)
+        log.info(f"Voice trace {trace.trace_id} ({outcome}): "
+                 + ", ".join(f"{s['stage']}={s['at_ms']}ms" for s in data["stages"]))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "outcomes": dict(self._outcomes),
+                "stages": {name: h.summary() for name, h in sorted(self._histograms.items())},
+                "recent": list(self._recent),
+            }
+
+
+# Затрымкі голасавага канвеера (/api/voice)
+voice_traces = TraceRecorder()
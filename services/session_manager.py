@@ -0,0 +1,237 @@
+# services/session_manager.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# Прыблізныя "накладныя" байты на падзею (id, author, actions, timestamps)
+_EVENT_OVERHEAD_BYTES = 512
+
+
+class _SessionEntry:
+    __slots__ = ("session_id", "last_used")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.last_used = time.monotonic()
+
+
+class SessionManager:
+    """
+    Жыццёвы цыкл ADK-сесій: user_id -> session_id з выцясненнем.
+
+    • сесія, якой не карысталіся ttl_seconds, выдаляецца разам з артэфактамі;
+    • рэзідэнтных сесій не больш за max_sessions (LRU);
+    • пасля кожнага хода ў сесіі застаюцца толькі апошнія max_events падзей
+      (абрэзка заўсёды пачынаецца з паведамлення карыстальніка);
+    • сесія, у якой ход выконваецца або чакае ў чарзе (is_busy), не выцясняецца;
+    • замацаваная сесія (pin, напр. адкрыты галасавы сокет) не выцясняецца да unpin.
+    """
+
+    def __init__(
+        self,
+        session_service,
+        artifact_service,
+        app_name: str,
+        ttl_seconds: float,
+        max_sessions: int,
+        max_events: int,
+        is_busy: Optional[Callable[[str], bool]] = None,
+    ):
+        self.session_service = session_service
+        self.artifact_service = artifact_service
+        self.app_name = app_name
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_events = max_events
+        self.is_busy = is_busy
+        self._sessions: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        # user_id -> колькасць адкрытых злучэнняў, што трымаюць session_id
+        self._pinned: Dict[str, int] = {}
+        self._create_lock = asyncio.Lock()
+        self._evicted = 0
+        self._compacted_events = 0
+
+    async def get_or_create(self, user_id: str) -> str:
+        entry = self._sessions.get(user_id)
+        if (
+            entry is not None
+            and time.monotonic() - entry.last_used > self.ttl_seconds
+            and not self._busy(user_id, entry.session_id)
+        ):
+            await self.evict(user_id)
+            entry = None
+
+        if entry is None:
+            async with self._create_lock:
+                entry = self._sessions.get(user_id)
+                if entry is None:
+                    session_id = await self._resume(user_id)
+                    if session_id is None:
+                        log.info(f"Creating new session for user {user_id}")
+                        session = await self.session_service.create_session(
+                            app_name=self.app_name, user_id=user_id
+                        )
+                        session_id = session.id
+                    entry = _SessionEntry(session_id)
+                    self._sessions[user_id] = entry
+
+        self.touch(user_id)
+        await self.sweep(keep=user_id)
+        return entry.session_id
+
+    async def _resume(self, user_id: str) -> Optional[str]:
+        """Апошняя незастарэлая захаваная сесія карыстальніка (для персістэнтных сховішчаў пасля рэстарту)."""
+        try:
+            response = await self.session_service.list_sessions(app_name=self.app_name, user_id=user_id)
+        except Exception as e:
+            log.error(f"Failed to list sessions of user {user_id}: {e}")
+            return None
+        sessions = sorted(response.sessions, key=lambda s: s.last_update_time, reverse=True)
+        if not sessions or time.time() - sessions[0].last_update_time > self.ttl_seconds:
+            return None
+        log.info(f"Resuming session {sessions[0].id} for user {user_id}")
+        return sessions[0].id
+
+    def touch(self, user_id: str):
+        entry = self._sessions.get(user_id)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._sessions.move_to_end(user_id)
+
+    async def sweep(self, keep: Optional[str] = None):
+        """
+        Выдаляе састарэлыя сесіі і лішнія па LRU (самыя старыя — у пачатку).
+        Занятыя сесіі і keep (сесія бягучага запыту) застаюцца, нават калі ліміт перавышаны.
+        """
+        now = time.monotonic()
+        victims: List[str] = []
+        overflow = len(self._sessions) - self.max_sessions
+        for user_id, entry in self._sessions.items():
+            if overflow <= 0 and now - entry.last_used <= self.ttl_seconds:
+                break
+            if user_id == keep or self._busy(user_id, entry.session_id):
+                # Ход яшчэ ідзе або чакае — сесію і артэфакты не чапаем, выцясняем наступную
+                continue
+            victims.append(user_id)
+            overflow -= 1
+        for user_id in victims:
+            await self.evict(user_id)
+
+    def pin(self, user_id: str):
+        """Сесія карыстальніка не выцясняецца, пакуль кожны pin не вызвалены праз unpin."""
+        self._pinned[user_id] = self._pinned.get(user_id, 0) + 1
+        self.touch(user_id)
+
+    def unpin(self, user_id: str):
+        count = self._pinned.get(user_id, 0) - 1
+        if count > 0:
+            self._pinned[user_id] = count
+        else:
+            self._pinned.pop(user_id, None)
+        self.touch(user_id)
+
+    def _busy(self, user_id: str, session_id: str) -> bool:
+        if user_id in self._pinned:
+            return True
+        return self.is_busy is not None and self.is_busy(session_id)
+
+    async def evict(self, user_id: str):
+        entry = self._sessions.pop(user_id, None)
+        if entry is None:
+            return
+        self._evicted += 1
+        log.info(f"Evicting session {entry.session_id} of user {user_id}")
+        try:
+            keys = await self.artifact_service.list_artifact_keys(
+                app_name=self.app_name, user_id=user_id, session_id=entry.session_id
+            )
+            for filename in keys:
+                await self.artifact_service.delete_artifact(
+                    app_name=self.app_name, user_id=user_id, session_id=entry.session_id, filename=filename
+                )
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=user_id, session_id=entry.session_id
+            )
+        except Exception as e:
+            log.error(f"Failed to evict session {entry.session_id}: {e}")
+
+    def compact(self, user_id: str, session_id: str):
+        """Пакідае ў сесіі толькі апошнія max_events падзей. Выклікаць на event loop-е, дзе жывуць сесіі."""
+        trim = getattr(self.session_service, "trim_events", None)
+        if trim is not None:
+            self._compacted_events += trim(self.app_name, user_id, session_id, self.max_events)
+            return
+
+        # InMemorySessionService: правім захаваны аб'ект (get_session вяртае копію)
+        stored = getattr(self.session_service, "sessions", {}).get(self.app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return
+        cut = trim_point(stored.events, self.max_events)
+        if cut:
+            del stored.events[:cut]
+            self._compacted_events += cut
+
+    def stats(self) -> Dict[str, Any]:
+        event_count, event_bytes = 0, 0
+        backend_stats = None
+        resident_stats = getattr(self.session_service, "resident_stats", None)
+        if resident_stats is not None:
+            backend_stats = resident_stats()
+            event_count, event_bytes = backend_stats["events"], backend_stats["event_bytes"]
+        else:
+            stored_sessions = getattr(self.session_service, "sessions", {}).get(self.app_name, {})
+            for user_id, entry in list(self._sessions.items()):
+                stored = stored_sessions.get(user_id, {}).get(entry.session_id)
+                if stored is None:
+                    continue
+                event_count += len(stored.events)
+                event_bytes += sum(event_size(ev) for ev in stored.events)
+
+        artifact_bytes = 0
+        for versions in list(getattr(self.artifact_service, "artifacts", {}).values()):
+            for part in versions:
+                data = getattr(getattr(part, "inline_data", None), "data", None)
+                artifact_bytes += len(data) if data else 0
+
+        stats = {
+            "resident_sessions": len(self._sessions),
+            "resident_events": event_count,
+            "resident_event_bytes": event_bytes,
+            "resident_artifact_bytes": artifact_bytes,
+            "pinned_sessions": len(self._pinned),
+            "evicted_sessions": self._evicted,
+            "compacted_events": self._compacted_events,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+        }
+        if backend_stats is not None:
+            stats["backend"] = backend_stats
+        return stats
+
+
+def trim_point(events: List[Any], max_events: int) -> int:
+    """Колькі падзей з пачатку можна выкінуць, каб засталося <= max_events і гісторыя пачыналася з user-хода."""
+    if len(events) <= max_events:
+        return 0
+    for idx in range(len(events) - max_events, len(events)):
+        if getattr(events[idx], "author", None) == "user":
+            return idx
+    return 0
+
+
+def event_size(event) -> int:
+    """Прыблізны памер падзеі ў памяці: тэкст + inline-дадзеныя + накладныя."""
+    size = _EVENT_OVERHEAD_BYTES
+    content = getattr(event, "content", None)
+    for part in (getattr(content, "parts", None) or []):
+        if getattr(part, "text", None):
+            size += len(part.text.encode("utf-8"))
+        data = getattr(getattr(part, "inline_data", None), "data", None)
+        if data:
+            size += len(data)
+    return size
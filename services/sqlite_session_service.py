@@ -0,0 +1,512 @@
+# services/sqlite_session_service.py
+"""
+SQLite-сховішча ADK-сесій (WAL) з адкладзеным (write-behind) запісам.
+
+• append_event толькі абнаўляе кэш у памяці і ставіць запіс у чаргу —
+  гарачы шлях ніколі не чакае fsync;
+• асобны паток пачкамі (адна транзакцыя) скідае чаргу ў базу кожныя
+  flush_interval секунд або калі назбіралася batch_size аперацый;
+• нядаўнія сесіі чытаюцца з LRU-кэша, астатнія — з базы (у патоку, па-за event loop);
+  сесія з незапісанымі аперацыямі з кэша не выцясняецца, таму чытанне з базы
+  ніколі не патрабуе прымусовага скіду чаргі;
+• app:/user: стан чытаецца з базы адзін раз (у патоку) і далей жыве ў памяці;
+• пачкі трапляюць у базу строга ў парадку аперацый: забраць чаргу і
+  запісаць яе можа толькі адзін паток за раз (_flush_lock), а пачак, які не
+  запісаўся, не губляецца — ён паўтараецца першым пры наступным скідзе.
+
+Працэс, які піша ў сесію, павінен быць адзін (кэш не сінхранізуецца паміж
+працэсамі); затое сесіі перажываюць рэстарт.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from services.session_manager import event_size, trim_point
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+# Аперацыі, што належаць адной сесіі: (kind, app_name, user_id, session_id, ...)
+_SESSION_OPS = ("session", "event", "trim", "delete")
+
+
+class SqliteSessionService(BaseSessionService):
+    """Drop-in замена InMemorySessionService з захаваннем у лакальны SQLite."""
+
+    def __init__(
+        self,
+        db_path: str,
+        cache_size: int = 256,
+        flush_interval: float = 0.5,
+        batch_size: int = 200,
+    ):
+        self.db_path = db_path
+        self.cache_size = max(1, cache_size)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+
+        # Кэш і чарга запісаў бароняцца адным замком: сесіі чапаюць і event loop, і воркеры
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self._app_state: Dict[str, Dict[str, Any]] = {}
+        self._user_state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pending: List[Tuple] = []
+        # Колькі аперацый кожнай сесіі яшчэ не ў базе (такія сесіі трымаюцца ў кэшы)
+        self._dirty: Dict[SessionKey, int] = {}
+        # Забраць чаргу + запісаць — пад адным замком (парадак замкаў: _lock -> _flush_lock).
+        # _failed — пачак, які не запісаўся; бароніцца _flush_lock і ідзе ў базу першым.
+        self._flush_lock = threading.Lock()
+        self._failed: List[Tuple] = []
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._flushed_batches = 0
+        self._flushed_ops = 0
+
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-session-writer", daemon=True)
+        self._writer.start()
+
+    # ────────────────────────── BaseSessionService API ──────────────────────────
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state or {})
+        session = Session(
+            id=session_id, app_name=app_name, user_id=user_id, state=session_state, events=[],
+            last_update_time=time.time(),
+        )
+        await self._load_shared_state(app_name, [user_id])
+        with self._lock:
+            self._apply_shared_state(app_name, user_id, app_delta, user_delta)
+            self._put_cache((app_name, user_id, session_id), session)
+            self._enqueue(("session", app_name, user_id, session_id, json.dumps(session_state), session.last_update_time))
+        return self._merged_copy(session, None)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await self._get_stored((app_name, user_id, session_id))
+        if session is None:
+            return None
+        await self._load_shared_state(app_name, [user_id])
+        with self._lock:
+            return self._merged_copy(session, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        query = "SELECT app_name, user_id, id, state, update_time FROM sessions WHERE app_name = ?"
+        params: Tuple = (app_name,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        rows = await asyncio.to_thread(self._query, query, params)
+        with self._lock:
+            users = {user for _, user, *_ in rows} | {
+                key[1] for key in self._cache if key[0] == app_name and (user_id is None or key[1] == user_id)
+            }
+        await self._load_shared_state(app_name, users)
+        sessions = []
+        with self._lock:
+            # Незапісанае бярэм з памяці: кэш мае апошні стан, а «брудная» сесія па-за кэшам — выдаленая
+            listed = set()
+            for app, user, sid, state_json, update_time in rows:
+                key = (app, user, sid)
+                listed.add(key)
+                cached = self._cache.get(key)
+                if cached is None and key in self._dirty:
+                    continue
+                session = Session(
+                    id=sid, app_name=app, user_id=user, events=[],
+                    state=cached.state if cached is not None else json.loads(state_json),
+                    last_update_time=cached.last_update_time if cached is not None else update_time,
+                )
+                sessions.append(self._merged_copy(session, None))
+            for key, cached in self._cache.items():
+                if key in listed or key[0] != app_name or (user_id is not None and key[1] != user_id):
+                    continue
+                session = Session(
+                    id=cached.id, app_name=cached.app_name, user_id=cached.user_id, state=cached.state, events=[],
+                    last_update_time=cached.last_update_time,
+                )
+                sessions.append(self._merged_copy(session, None))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self._lock:
+            self._cache.pop((app_name, user_id, session_id), None)
+            self._enqueue(("delete", app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        delta = (event.actions.state_delta if event.actions and event.actions.state_delta else {})
+        app_delta, user_delta, session_delta = _split_state(delta)
+        loaded = await self._get_stored(key)
+        if loaded is None:
+            raise ValueError(f"Session {session.id} not found")
+        await self._load_shared_state(session.app_name, [session.user_id])
+        with self._lock:
+            # Пасля await чыстую сесію мог выцесніць іншы паток — вяртаем яе ў кэш, калі яна не выдаленая
+            stored = self._cache.get(key)
+            if stored is None:
+                if key in self._dirty:
+                    raise ValueError(f"Session {session.id} not found")
+                self._put_cache(key, loaded)
+                stored = loaded
+            stored.events.append(event)
+            stored.state.update(session_delta)
+            stored.last_update_time = event.timestamp
+            self._apply_shared_state(session.app_name, session.user_id, app_delta, user_delta)
+            self._enqueue(("event", *key, event.model_dump_json(exclude_none=True)))
+            self._enqueue(("session", *key, json.dumps(stored.state), stored.last_update_time))
+        return event
+
+    # ────────────────────────── дадатковае API ──────────────────────────
+    def trim_events(self, app_name: str, user_id: str, session_id: str, max_events: int) -> int:
+        """Пакідае апошнія max_events падзей (для SessionManager.compact). Вяртае колькасць выдаленых."""
+        with self._lock:
+            stored = self._cache.get((app_name, user_id, session_id))
+            if stored is None:
+                return 0
+            cut = trim_point(stored.events, max_events)
+            if cut:
+                del stored.events[:cut]
+                self._enqueue(("trim", app_name, user_id, session_id, len(stored.events)))
+            return cut
+
+    def resident_stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = list(self._cache.values())
+            pending = len(self._pending) + len(self._failed)
+        return {
+            "cached_sessions": len(sessions),
+            "events": sum(len(s.events) for s in sessions),
+            "event_bytes": sum(event_size(ev) for s in sessions for ev in s.events),
+            "pending_writes": pending,
+            "flushed_batches": self._flushed_batches,
+            "flushed_ops": self._flushed_ops,
+        }
+
+    def flush(self):
+        """Сінхронна скідае чаргу запісаў у базу (памылка запісу падымаецца, пачак застаецца ў чарзе)."""
+        with self._lock:
+            self._flush_lock.acquire()
+            batch = self._take_batch()
+        try:
+            ok = self._write_or_requeue(batch)
+        finally:
+            self._flush_lock.release()
+        if not ok:
+            raise sqlite3.OperationalError(f"SQLite session flush failed; {len(batch)} ops kept for retry")
+        with self._lock:
+            self._mark_written(batch)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            log.error(f"Closing SQLite session store with unwritten changes: {e}")
+        with self._db_lock:
+            self._db.close()
+
+    # ────────────────────────── унутранае ──────────────────────────
+    def _enqueue(self, op: Tuple):
+        self._pending.append(op)
+        if op[0] in _SESSION_OPS:
+            key = op[1:4]
+            self._dirty[key] = self._dirty.get(key, 0) + 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.notify()
+
+    def _writer_loop(self):
+        ok = True
+        while True:
+            with self._lock:
+                # Пасля памылкі запісу чакаем заўсёды — каб не круціць паўторы без паўзы
+                if not self._closed and (not ok or len(self._pending) < self.batch_size):
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+                self._flush_lock.acquire()
+                batch = self._take_batch()
+            try:
+                ok = self._write_or_requeue(batch)
+            finally:
+                self._flush_lock.release()
+            if ok:
+                with self._lock:
+                    self._mark_written(batch)
+
+    def _take_batch(self) -> List[Tuple]:
+        """Забірае ўсю чаргу: спачатку няўдалы пачак, потым новыя аперацыі (трымаць _lock і _flush_lock)."""
+        batch = self._failed + self._pending
+        self._failed, self._pending = [], []
+        return batch
+
+    def _write_or_requeue(self, batch: List[Tuple]) -> bool:
+        """Піша пачак (трымаць _flush_lock); пры памылцы пачак вяртаецца ў _failed на паўтор."""
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            self._failed = batch
+            log.error(f"SQLite session write-behind failed ({len(batch)} ops), will retry: {e}")
+            return False
+        return True
+
+    def _mark_written(self, batch: List[Tuple]):
+        """Пачак у базе: яго сесіі больш не «брудныя» і зноў могуць выцясняцца з кэша (трымаць _lock)."""
+        for op in batch:
+            if op[0] in _SESSION_OPS:
+                key = op[1:4]
+                left = self._dirty.get(key, 0) - 1
+                if left > 0:
+                    self._dirty[key] = left
+                else:
+                    self._dirty.pop(key, None)
+        self._shrink_cache()
+
+    def _write_batch(self, batch: List[Tuple]):
+        if not batch:
+            return
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN")
+            try:
+                for op in batch:
+                    kind = op[0]
+                    if kind == "session":
+                        cur.execute(
+                            "INSERT INTO sessions (app_name, user_id, id, state, update_time) VALUES (?, ?, ?, ?, ?) "
+                            "ON CONFLICT (app_name, user_id, id) DO UPDATE SET state = excluded.state, "
+                            "update_time = excluded.update_time",
+                            op[1:],
+                        )
+                    elif kind == "event":
+                        cur.execute(
+                            "INSERT INTO events (app_name, user_id, session_id, data) VALUES (?, ?, ?, ?)", op[1:]
+                        )
+                    elif kind == "app_state":
+                        cur.execute(
+                            "INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                            "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state",
+                            op[1:],
+                        )
+                    elif kind == "user_state":
+                        cur.execute(
+                            "INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                            "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+                            op[1:],
+                        )
+                    elif kind == "trim":
+                        _, app, user, sid, keep = op
+                        cur.execute(
+                            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq NOT IN "
+                            "(SELECT seq FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                            "ORDER BY seq DESC LIMIT ?)",
+                            (app, user, sid, app, user, sid, keep),
+                        )
+                    elif kind == "delete":
+                        cur.execute(
+                            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", op[1:]
+                        )
+                        cur.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", op[1:])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        self._flushed_batches += 1
+        self._flushed_ops += len(batch)
+
+    async def _get_stored(self, key: SessionKey) -> Optional[Session]:
+        """Сесія з кэша або з базы; база чытаецца ў патоку, без self._lock і без скіду чаргі."""
+        with self._lock:
+            session = self._cache.get(key)
+            if session is not None:
+                self._cache.move_to_end(key)
+                return session
+            if key in self._dirty:
+                # Па-за кэшам «брудная» толькі выдаленая сесія, чый delete яшчэ ў чарзе
+                return None
+
+        loaded = await asyncio.to_thread(self._read_session, key)
+        with self._lock:
+            # Пакуль чыталі, сесію маглі загрузіць, стварыць або выдаліць
+            session = self._cache.get(key)
+            if session is None and loaded is not None and key not in self._dirty:
+                self._put_cache(key, loaded)
+                session = loaded
+            return session
+
+    def _read_session(self, key: SessionKey) -> Optional[Session]:
+        app_name, user_id, session_id = key
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            event_rows = self._db.execute(
+                "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq", key
+            ).fetchall()
+        return Session(
+            id=session_id, app_name=app_name, user_id=user_id, state=json.loads(row[0]),
+            events=[Event.model_validate_json(data) for (data,) in event_rows],
+            last_update_time=row[1],
+        )
+
+    def _query(self, query: str, params: Tuple) -> List[Tuple]:
+        with self._db_lock:
+            return self._db.execute(query, params).fetchall()
+
+    def _put_cache(self, key: SessionKey, session: Session):
+        self._cache[key] = session
+        self._cache.move_to_end(key)
+        self._shrink_cache()
+
+    def _shrink_cache(self):
+        """Выцясняе найстарэйшыя сесіі звыш cache_size; сесіі з незапісанымі аперацыямі і толькі што
+        пакладзеная (апошняя) застаюцца."""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        for key in [key for key in list(self._cache)[:-1] if key not in self._dirty][:excess]:
+            del self._cache[key]
+
+    async def _load_shared_state(self, app_name: str, user_ids: Iterable[str]):
+        """Падцягвае з базы app:/user: стан, якога яшчэ няма ў памяці (у патоку, да self._lock)."""
+        with self._lock:
+            load_app = app_name not in self._app_state
+            missing = [user_id for user_id in user_ids if (app_name, user_id) not in self._user_state]
+        if not load_app and not missing:
+            return
+        app_state, user_states = await asyncio.to_thread(self._read_shared_state, app_name, load_app, missing)
+        with self._lock:
+            # Пакуль чыталі, стан мог з'явіцца (і змяніцца) у памяці — ён навейшы за базу
+            if app_state is not None:
+                self._app_state.setdefault(app_name, app_state)
+            for user_id, state in user_states.items():
+                self._user_state.setdefault((app_name, user_id), state)
+
+    def _read_shared_state(
+        self, app_name: str, load_app: bool, user_ids: List[str]
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        app_state, user_states = None, {}
+        with self._db_lock:
+            if load_app:
+                row = self._db.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+                app_state = json.loads(row[0]) if row else {}
+            for user_id in user_ids:
+                row = self._db.execute(
+                    "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+                ).fetchone()
+                user_states[user_id] = json.loads(row[0]) if row else {}
+        return app_state, user_states
+
+    def _shared_state(self, app_name: str, user_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Стан з памяці (загружаецца загадзя праз _load_shared_state; трымаць _lock)."""
+        return self._app_state.setdefault(app_name, {}), self._user_state.setdefault((app_name, user_id), {})
+
+    def _apply_shared_state(self, app_name: str, user_id: str, app_delta: Dict, user_delta: Dict):
+        app_state, user_state = self._shared_state(app_name, user_id)
+        if app_delta:
+            app_state.update(app_delta)
+            self._enqueue(("app_state", app_name, json.dumps(app_state)))
+        if user_delta:
+            user_state.update(user_delta)
+            self._enqueue(("user_state", app_name, user_id, json.dumps(user_state)))
+
+    def _merged_copy(self, session: Session, config: Optional[GetSessionConfig]) -> Session:
+        """Копія сесіі з app:/user: станам і фільтрам GetSessionConfig (як у InMemorySessionService)."""
+        copied = copy.deepcopy(session)
+        if config:
+            if config.num_recent_events:
+                copied.events = copied.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                copied.events = [e for e in copied.events if e.timestamp >= config.after_timestamp]
+        app_state, user_state = self._shared_state(session.app_name, session.user_id)
+        for k, v in app_state.items():
+            copied.state[State.APP_PREFIX + k] = v
+        for k, v in user_state.items():
+            copied.state[State.USER_PREFIX + k] = v
+        return copied
+
+
+def _split_state(delta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """state_delta -> (app-стан, user-стан, стан сесіі); temp:-ключы не захоўваюцца."""
+    app_delta, user_delta, session_delta = {}, {}, {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app_delta[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_delta[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_delta[key] = value
+    return app_delta, user_delta, session_delta
+
@@ -0,0 +1,158 @@
+# services/turn_scheduler.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+
+class SessionBusyError(RuntimeError):
+    """Чарга хадоў сесіі поўная."""
+
+
+class TurnTicket:
+    """
+    Месца ў чарзе хадоў адной сесіі.
+
+        ticket = scheduler.admit(session_id, text)   # SessionBusyError, калі чарга поўная
+        async with ticket:
+            if ticket.superseded:
+                return            # тэкст перайшоў у навейшы ход
+            run(ticket.text)
+    """
+
+    __slots__ = ("_scheduler", "key", "text", "coalescible", "superseded", "_acquired", "_released", "_admitted_at")
+
+    def __init__(self, scheduler: "TurnScheduler", key: str, text: Optional[str], coalescible: bool):
+        self._scheduler = scheduler
+        self.key = key
+        self.text = text
+        self.coalescible = coalescible
+        self.superseded = False
+        self._acquired = False
+        self._released = False
+        self._admitted_at = time.monotonic()
+
+    async def wait(self):
+        """Чакае, пакуль скончацца ўсе папярэднія хады сесіі (superseded-білет вяртаецца адразу)."""
+        await self._scheduler._acquire(self)
+
+    def release(self):
+        """Вызваляе сесію для наступнага хода. Ідэмпатэнтна; бяспечна і без wait()."""
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self)
+
+    async def __aenter__(self) -> "TurnTicket":
+        await self.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class _Lane:
+    __slots__ = ("lock", "waiting")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiting: Deque[TurnTicket] = deque()
+
+
+class TurnScheduler:
+    """
+    Серыялізацыя хадоў па сесіях.
+
+    • у сесіі адначасова выконваецца адзін ход, астатнія чакаюць у FIFO;
+    • у чарзе не больш за max_queued хадоў — далей SessionBusyError (429 / "заняты");
+    • з coalesce=True новы тэкставы ход паглынае яшчэ не запушчаны тэкставы
+      папярэднік: тэксты злучаюцца, а старэйшы білет пазначаецца superseded.
+    """
+
+    def __init__(self, max_queued: int = 2):
+        self.max_queued = max_queued
+        self._lanes: Dict[str, _Lane] = {}
+        self._admitted = 0
+        self._rejected = 0
+        self._coalesced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waits = 0
+
+    def admit(self, key: str, text: Optional[str] = None, coalesce: bool = False) -> TurnTicket:
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        ticket = TurnTicket(self, key, text, coalesce)
+
+        previous = lane.waiting[-1] if lane.waiting else None
+        if coalesce and previous is not None and previous.coalescible and not previous.superseded:
+            # Папярэдні ход яшчэ не пачаўся: забіраем яго тэкст і займаем яго месца
+            previous.superseded = True
+            lane.waiting.pop()
+            ticket.text = "\n".join(t for t in (previous.text, text) if t)
+            self._coalesced += 1
+            log.info(f"Coalesced queued turn into a newer one for session {key}")
+        elif len(lane.waiting) >= self.max_queued:
+            self._rejected += 1
+            self._drop_idle(key, lane)
+            raise SessionBusyError(f"Session {key} already has {len(lane.waiting)} queued turns")
+
+        lane.waiting.append(ticket)
+        self._admitted += 1
+        return ticket
+
+    def busy(self, key: str) -> bool:
+        """Ці ёсць у сесіі ход, які выконваецца або чакае."""
+        lane = self._lanes.get(key)
+        return lane is not None and (lane.lock.locked() or bool(lane.waiting))
+
+    def stats(self) -> Dict:
+        lanes = list(self._lanes.values())
+        return {
+            "sessions": len(lanes),
+            "running": sum(1 for lane in lanes if lane.lock.locked()),
+            "queued": sum(len(lane.waiting) for lane in lanes),
+            "max_queued": self.max_queued,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "coalesced": self._coalesced,
+            "wait_avg_ms": round(self._wait_total / self._waits * 1000, 1) if self._waits else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 1),
+        }
+
+    async def _acquire(self, ticket: TurnTicket):
+        if ticket.superseded:
+            # Чакаць няма чаго: ход ужо перададзены навейшаму білету
+            return
+        lane = self._lanes[ticket.key]
+        try:
+            await lane.lock.acquire()
+        except BaseException:
+            ticket.release()
+            raise
+        ticket._acquired = True
+        if ticket in lane.waiting:
+            lane.waiting.remove(ticket)
+        waited = time.monotonic() - ticket._admitted_at
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._waits += 1
+
+    def _release(self, ticket: TurnTicket):
+        lane = self._lanes.get(ticket.key)
+        if lane is None:
+            return
+        if ticket._acquired:
+            lane.lock.release()
+        elif ticket in lane.waiting:
+            # Білет адмянілі да пачатку хода
+            lane.waiting.remove(ticket)
+        self._drop_idle(ticket.key, lane)
+
+    def _drop_idle(self, key: str, lane: _Lane):
+        if not lane.waiting and not lane.lock.locked() and self._lanes.get(key) is lane:
+            del self._lanes[key]
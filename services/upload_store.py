@@ -0,0 +1,324 @@
+# services/upload_store.py
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from google.genai import types
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+log = logging.getLogger(__name__)
+
+# Gemini Files API захоўвае файлы 48 гадзін; бярэм з запасам
+FILE_URI_TTL_SECONDS = 47 * 3600
+# Запас на multipart-канверт і тэкставыя палі формы звыш найбольшага файла
+FORM_ENVELOPE_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Файл перавышае ліміт памеру для свайго MIME-тыпу."""
+
+    def __init__(self, filename: str, mime_type: str, limit: int):
+        super().__init__(f"File '{filename}' ({mime_type}) exceeds the {limit} byte limit")
+        self.filename = filename
+        self.mime_type = mime_type
+        self.limit = limit
+
+
+@dataclass
+class StoredUpload:
+    digest: str
+    path: Path
+    mime_type: str
+    size: int
+    file_uri: Optional[str] = None
+    file_uri_expires: float = 0.0
+    # Адна загрузка ў Gemini Files API на змест адначасова
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+
+
+def parse_size(value: str) -> int:
+    """'20MB' / '512KB' / '1048576' -> байты."""
+    value = value.strip().upper()
+    for suffix, mult in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024), ("B", 1)):
+        if value.endswith(suffix):
+            return int(float(value[: -len(suffix)]) * mult)
+    return int(value)
+
+
+def parse_size_limits(spec: str) -> Dict[str, int]:
+    """'image/*=20MB,video/*=200MB,application/pdf=50MB' -> {mime_pattern: bytes}."""
+    limits: Dict[str, int] = {}
+    for item in filter(None, (x.strip() for x in spec.split(","))):
+        pattern, _, size = item.partition("=")
+        if not size:
+            log.warning(f"Ignoring malformed upload size limit '{item}'")
+            continue
+        limits[pattern.strip().lower()] = parse_size(size)
+    return limits
+
+
+class UploadStore:
+    """
+    Захоўванне загружаных файлаў па хэшы зместу (sha256).
+
+    Цела multipart-запыту разбіраецца па меры паступлення (receive_form): кожны
+    файл адразу кавалкамі пішацца ў spool-файл па-за event loop-ам і адначасова
+    хэшуецца, а ліміт яго MIME-тыпу правяраецца на кожным кавалку. Калі такі
+    змест ужо ёсць, запіс і далейшая апрацоўка (загрузка ў Gemini Files API)
+    прапускаюцца. Індэкс зместу абмежаваны index_size (LRU).
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        size_limits: Dict[str, int],
+        default_limit: int,
+        inline_max_bytes: int,
+        chunk_size: int = 1024 * 1024,
+        client_factory: Optional[Callable[[], Any]] = None,
+        index_size: int = 1024,
+    ):
+        self.root = root
+        self.spool_dir = root / ".spool"
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.size_limits = size_limits
+        self.default_limit = default_limit
+        self.inline_max_bytes = inline_max_bytes
+        self.chunk_size = chunk_size
+        self.client_factory = client_factory
+        self.index_size = max(1, index_size)
+        self._index: "OrderedDict[str, StoredUpload]" = OrderedDict()
+
+    @property
+    def max_limit(self) -> int:
+        return max([self.default_limit, *self.size_limits.values()])
+
+    @property
+    def max_body(self) -> int:
+        """Найбольшае цела запыту: найбольшы файл + запас на multipart-канверт і тэкставыя палі."""
+        return self.max_limit + FORM_ENVELOPE_BYTES
+
+    def limit_for(self, mime_type: str) -> int:
+        mime_type = (mime_type or "").lower()
+        if mime_type in self.size_limits:
+            return self.size_limits[mime_type]
+        wildcard = mime_type.split("/", 1)[0] + "/*"
+        return self.size_limits.get(wildcard, self.default_limit)
+
+    async def receive_form(
+        self, content_type: str, body: AsyncIterator[bytes], mime_for: Callable[[str], str]
+    ) -> Tuple[Dict[str, str], List[StoredUpload]]:
+        """Чытае форму з патоку цела запыту: (тэкставыя палі, захаваныя файлы).
+
+        Файлы ідуць проста ў spool (без прамежкавай копіі ўсяго цела); UploadTooLargeError —
+        як толькі файл перавысіў ліміт свайго MIME-тыпу або цела — max_body
+        (у тым ліку chunked-запыт без Content-Length). mime_for(filename) — тып
+        файла, калі кліент яго не прыслаў.
+        """
+        form_type, params = parse_options_header(content_type)
+        if form_type == b"application/x-www-form-urlencoded":
+            data = bytearray()
+            async for chunk in body:
+                data += chunk
+                if len(data) > FORM_ENVELOPE_BYTES:
+                    raise UploadTooLargeError("form", form_type.decode(), FORM_ENVELOPE_BYTES)
+            return dict(parse_qsl(data.decode("utf-8", "replace"), keep_blank_values=True)), []
+        if form_type != b"multipart/form-data":
+            return {}, []
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("multipart/form-data request without a boundary")
+
+        # Парсер выклікае callbacks сінхронна — падзеі збіраюцца і апрацоўваюцца пасля кожнага кавалка
+        events: List[Tuple[str, bytes]] = []
+
+        def on(kind: str):
+            return lambda: events.append((kind, b""))
+
+        def on_data(kind: str):
+            return lambda data, start, end: events.append((kind, bytes(data[start:end])))
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on("begin"),
+            "on_header_field": on_data("header_field"),
+            "on_header_value": on_data("header_value"),
+            "on_header_end": on("header_end"),
+            "on_headers_finished": on("headers_finished"),
+            "on_part_data": on_data("data"),
+            "on_part_end": on("end"),
+        })
+
+        fields: Dict[str, str] = {}
+        uploads: List[StoredUpload] = []
+        headers: Dict[bytes, bytes] = {}
+        header_field, header_value = b"", b""
+        name, value = "", bytearray()
+        spool: Optional[_Spool] = None
+
+        async def handle(kind: str, data: bytes):
+            nonlocal header_field, header_value, name, value, spool
+            if kind == "begin":
+                headers.clear()
+                name, value = "", bytearray()
+            elif kind == "header_field":
+                header_field += data
+            elif kind == "header_value":
+                header_value += data
+            elif kind == "header_end":
+                headers[header_field.lower()] = header_value
+                header_field, header_value = b"", b""
+            elif kind == "headers_finished":
+                _, options = parse_options_header(headers.get(b"content-disposition", b""))
+                name = options.get(b"name", b"").decode("utf-8", "replace")
+                if b"filename" in options:
+                    filename = options[b"filename"].decode("utf-8", "replace") or "upload"
+                    mime_type = headers.get(b"content-type", b"").decode("latin-1") or mime_for(filename)
+                    spool = _Spool(self.spool_dir, filename, mime_type, self.limit_for(mime_type), self.chunk_size)
+            elif kind == "data":
+                if spool is not None:
+                    await spool.write(data)
+                else:
+                    value += data
+            elif kind == "end":
+                if spool is not None:
+                    await spool.close()
+                    current, spool = spool, None
+                    if current.size:
+                        uploads.append(self._commit(current))
+                    else:
+                        # Пустое поле файла (нічога не выбрана)
+                        current.discard()
+                else:
+                    fields[name] = value.decode("utf-8", "replace")
+
+        received = 0
+        try:
+            async for chunk in body:
+                received += len(chunk)
+                if received > self.max_body:
+                    raise UploadTooLargeError("request", form_type.decode(), self.max_body)
+                parser.write(chunk)
+                for kind, data in events:
+                    await handle(kind, data)
+                events.clear()
+            parser.finalize()
+            for kind, data in events:
+                await handle(kind, data)
+        except BaseException:
+            if spool is not None:
+                spool.discard()
+            raise
+        return fields, uploads
+
+    def _commit(self, spool: "_Spool") -> StoredUpload:
+        """Перамяшчае дапісаны spool пад імя па хэшы (або выкідае яго, калі такі змест ужо ёсць)."""
+        digest = spool.hasher.hexdigest()
+        known = self._index.get(digest)
+        ext = Path(spool.filename).suffix.lower() or mimetypes.guess_extension(spool.mime_type) or ""
+        final_path = known.path if known else self.root / f"{digest}{ext}"
+        try:
+            if final_path.exists():
+                log.info(f"Upload {spool.filename} is a duplicate of {final_path.name}; skipping write")
+                spool.discard()
+            else:
+                os.replace(spool.path, final_path)
+        except BaseException:
+            spool.discard()
+            raise
+
+        if known is None:
+            known = StoredUpload(digest=digest, path=final_path, mime_type=spool.mime_type, size=spool.size)
+            self._index[digest] = known
+            while len(self._index) > self.index_size:
+                # Файл застаецца на дыску (дубль усё роўна не пішацца); губляецца толькі file_uri
+                self._index.popitem(last=False)
+        self._index.move_to_end(digest)
+        return known
+
+    async def to_part(self, stored: StoredUpload) -> types.Part:
+        """Part для агента: невялікія файлы — inline, вялікія — праз Gemini Files API (адзін раз на змест)."""
+        client = self.client_factory() if self.client_factory else None
+        if stored.size <= self.inline_max_bytes or client is None:
+            data = await asyncio.to_thread(stored.path.read_bytes)
+            return types.Part(inline_data=types.Blob(data=data, mime_type=stored.mime_type))
+
+        async with stored.lock:
+            if not stored.file_uri or stored.file_uri_expires < time.time():
+                stored.file_uri = await self._upload_to_gemini(client, stored)
+                stored.file_uri_expires = time.time() + FILE_URI_TTL_SECONDS
+            else:
+                log.info(f"Reusing Gemini file {stored.file_uri} for {stored.path.name}")
+        return types.Part(file_data=types.FileData(file_uri=stored.file_uri, mime_type=stored.mime_type))
+
+    async def _upload_to_gemini(self, client, stored: StoredUpload, timeout: float = 300.0) -> str:
+        log.info(f"Uploading {stored.path.name} ({stored.size} bytes) to Gemini Files API")
+        uploaded = await client.aio.files.upload(
+            file=str(stored.path),
+            config=types.UploadFileConfig(mime_type=stored.mime_type),
+        )
+        # Відэа і вялікія файлы спачатку апрацоўваюцца на баку Gemini
+        deadline = time.monotonic() + timeout
+        while uploaded.state and uploaded.state.name == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Gemini is still processing {uploaded.name}")
+            await asyncio.sleep(2)
+            uploaded = await client.aio.files.get(name=uploaded.name)
+        if uploaded.state and uploaded.state.name == "FAILED":
+            raise RuntimeError(f"Gemini failed to process {uploaded.name}")
+        return uploaded.uri
+
+
+class _Spool:
+    """Файл з цела запыту: кавалкі збіраюцца да chunk_size, хэшуюцца і пішуцца ў патоку."""
+
+    def __init__(self, spool_dir: Path, filename: str, mime_type: str, limit: int, chunk_size: int):
+        self.filename = filename
+        self.mime_type = mime_type
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        fd, spool_name = tempfile.mkstemp(dir=spool_dir)
+        self.path = Path(spool_name)
+        self._file = os.fdopen(fd, "wb")
+        self._buffer = bytearray()
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise UploadTooLargeError(self.filename, self.mime_type, self.limit)
+        self._buffer += chunk
+        if len(self._buffer) >= self.chunk_size:
+            await self._flush()
+
+    async def close(self):
+        await self._flush()
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+    async def _flush(self):
+        if self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.to_thread(_hash_and_write, self.hasher, self._file, data)
+
+
+def _hash_and_write(hasher, spool, chunk: bytes):
+    hasher.update(chunk)
+    spool.write(chunk)
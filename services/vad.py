@@ -0,0 +1,192 @@
+# services/vad.py
+
+import logging
+from collections import deque
+from typing import Deque, List, Optional
+
+import numpy as np
+
+from services.audio_codec import WAV_HEADER_SIZE, WAVE_FORMAT_PCM, write_wav_header
+
+log = logging.getLogger(__name__)
+
+
+class UtteranceBuffer:
+    """
+    Буфер адной рэплікі: PCM16 з зарэзерваваным месцам пад WAV-загаловак.
+
+    take() дапісвае загаловак на месца і аддае сам bytearray (без капіявання
+    ўсяго буфера), а для наступнай рэплікі пачынае новы.
+    """
+
+    def __init__(self, max_bytes: int, sample_rate: int = 16000):
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self._buf = bytearray(WAV_HEADER_SIZE)
+
+    def __len__(self) -> int:
+        """Колькасць байтаў PCM (без загалоўка)."""
+        return len(self._buf) - WAV_HEADER_SIZE
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.max_bytes
+
+    def append(self, pcm) -> bool:
+        """Дадае PCM; тое, што не ўлазіць у max_bytes, адкідаецца. False — буфер поўны."""
+        room = self.max_bytes - len(self)
+        if room <= 0:
+            return False
+        if len(pcm) > room:
+            pcm = memoryview(pcm)[:room]
+        self._buf += pcm
+        return not self.full
+
+    def truncate(self, nbytes: int):
+        """Адрэзвае nbytes з канца (напрыклад, ціхі хвост)."""
+        nbytes = min(nbytes, len(self))
+        if nbytes > 0:
+            del self._buf[-nbytes:]
+
+    def take(self) -> bytearray:
+        """Гатовы WAV (загаловак + PCM); буфер пачынаецца нанава."""
+        wav = self._buf
+        write_wav_header(wav, len(wav) - WAV_HEADER_SIZE, WAVE_FORMAT_PCM, self.sample_rate, 1, 2)
+        self._buf = bytearray(WAV_HEADER_SIZE)
+        return wav
+
+    def clear(self):
+        del self._buf[WAV_HEADER_SIZE:]
+
+
+class StreamingVad:
+    """
+    Серверны VAD па энергіі кадраў для 16 kHz int16 mono.
+
+    • энергія ўсіх кадраў кавалка лічыцца адной вектарызаванай аперацыяй NumPy;
+    • парог — адаптыўны ўзровень шуму (EMA па ціхіх кадрах) × threshold_ratio,
+      але не ніжэй за min_rms;
+    • прамова пачынаецца пасля onset_ms галасавых кадраў (з pre_roll_ms папярэдняга
+      аўдыя), заканчваецца пасля hangover_ms цішыні; ціхі хвост абразаецца;
+    • рэпліка даўжэй за max_seconds рэжацца прымусова, карацейшая за
+      min_speech_ms — адкідаецца.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_ratio: float = 3.0,
+        min_rms: float = 300.0,
+        onset_ms: int = 60,
+        hangover_ms: int = 600,
+        pre_roll_ms: int = 200,
+        tail_ms: int = 100,
+        min_speech_ms: int = 200,
+        max_seconds: float = 30.0,
+        noise_alpha: float = 0.05,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_ratio = threshold_ratio
+        self.min_energy = min_rms ** 2
+        self.onset_frames = max(1, onset_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.tail_frames = tail_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.noise_alpha = noise_alpha
+
+        self.buffer = UtteranceBuffer(int(max_seconds * sample_rate) * 2, sample_rate)
+        self._pre_roll: Deque[bytes] = deque(maxlen=max(self.onset_frames, pre_roll_ms // frame_ms))
+        self._carry = b""
+        self._noise_floor: Optional[float] = None
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silence_run = 0
+        self._speech_frames = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    def process(self, chunk: bytes) -> List[bytearray]:
+        """Апрацоўвае кавалак PCM; вяртае скончаныя рэплікі (WAV)."""
+        data = self._carry + chunk if self._carry else chunk
+        n_frames = len(data) // self.frame_bytes
+        usable = n_frames * self.frame_bytes
+        self._carry = bytes(data[usable:])
+        if n_frames == 0:
+            return []
+
+        samples = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(n_frames, self.frame_samples)
+        energies = np.mean(np.square(samples, dtype=np.float32), axis=1)
+
+        view = memoryview(data)
+        utterances: List[bytearray] = []
+        for idx, energy in enumerate(energies.tolist()):
+            frame = view[idx * self.frame_bytes:(idx + 1) * self.frame_bytes]
+            done = self._step(frame, energy)
+            if done is not None:
+                utterances.append(done)
+        return utterances
+
+    def flush(self) -> Optional[bytearray]:
+        """Прымусовы канец рэплікі (напр., кліент даслаў end_audio)."""
+        self._carry = b""
+        if not self._in_speech:
+            self._reset()
+            return None
+        return self._finish()
+
+    def _step(self, frame: memoryview, energy: float) -> Optional[bytearray]:
+        if self._noise_floor is None:
+            self._noise_floor = energy
+        threshold = max(self._noise_floor * self.threshold_ratio, self.min_energy)
+        voiced = energy > threshold
+
+        if not self._in_speech:
+            # Узровень шуму вучым толькі на цішыні
+            if not voiced:
+                self._noise_floor += self.noise_alpha * (energy - self._noise_floor)
+                self._voiced_run = 0
+                self._pre_roll.append(bytes(frame))
+                return None
+            self._voiced_run += 1
+            self._pre_roll.append(bytes(frame))
+            if self._voiced_run < self.onset_frames:
+                return None
+            self._in_speech = True
+            self._speech_frames = self._voiced_run
+            self._silence_run = 0
+            for pre in self._pre_roll:
+                self.buffer.append(pre)
+            self._pre_roll.clear()
+            return None
+
+        self.buffer.append(frame)
+        if voiced:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.hangover_frames or self.buffer.full:
+            return self._finish()
+        return None
+
+    def _finish(self) -> Optional[bytearray]:
+        trailing = max(0, self._silence_run - self.tail_frames)
+        self.buffer.truncate(trailing * self.frame_bytes)
+        speech_frames = self._speech_frames
+        self._reset()
+        if speech_frames < self.min_speech_frames:
+            self.buffer.clear()
+            return None
+        return self.buffer.take()
+
+    def _reset(self):
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silence_run = 0
+        self._speech_frames = 0
+        self._pre_roll.clear()
@@ -0,0 +1,316 @@
+# services/voice_memory.py
+"""
+Памяць размовы для простага галасавога агента (SIMPLE_VOICE_AGENT).
+
+• VoiceConversation — апошнія хады аднаго злучэння (тэкставы запіс рэплікі
+  карыстальніка + тэкст адказу) у межах бюджэту токенаў; аўдыя хада трымаецца,
+  толькі пакуль у фоне не гатовы яго запіс; старэйшыя хады ў фоне згортваюцца
+  ў кароткі змест;
+• SystemPromptCache — статычны сістэмны промпт праз явны кэш кантэксту
+  Gemini (client.aio.caches), з адкатам на звычайны system_instruction;
+  промпт карацейшы за мінімум кэша адразу ідзе inline.
+
+Кліент Gemini перадаецца звонку (для размовы — фабрыка, бо кліент ствараецца
+лянотна): дастаткова аб'екта з aio.models.generate_content і aio.caches.create.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from google.genai import types
+
+log = logging.getLogger(__name__)
+
+# Ацэнка токенаў без запыту да API: Gemini лічыць аўдыя як 32 токены/с
+AUDIO_TOKENS_PER_SECOND = 32
+PCM16_BYTES_PER_SECOND = 16000 * 2
+CHARS_PER_TOKEN = 3
+
+SUMMARY_INSTRUCTION = (
+    "Коратка перакажы папярэднюю размову карыстальніка з галасавым памочнікам: "
+    "тэмы, факты пра карыстальніка, яго просьбы і дамоўленасці. "
+    "Не больш за 5 сказаў, па-беларуску, без уводзін."
+)
+TRANSCRIBE_INSTRUCTION = (
+    "Запішы дакладна, што сказаў карыстальнік у гэтым аўдыя. "
+    "Толькі тэкст выказвання, без каментароў і перакладу."
+)
+# Калі запіс рэплікі атрымаць не ўдалося, у кантэкст ідзе гэты тэкст (аўдыя не захоўваецца)
+UNTRANSCRIBED_TEXT = "(галасавое паведамленне)"
+# Мінімальны памер явнага кэша кантэксту Gemini (токены)
+MIN_CACHE_TOKENS = 1024
+
+
+def estimate_text_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_audio_tokens(wav_bytes: int) -> int:
+    return max(1, wav_bytes * AUDIO_TOKENS_PER_SECOND // PCM16_BYTES_PER_SECOND)
+
+
+@dataclass
+class VoiceTurn:
+    reply: str
+    transcript: Optional[str] = None
+    # Аўдыя рэплікі — толькі пакуль няма transcript
+    audio: Optional[bytes] = None
+
+    @property
+    def tokens(self) -> int:
+        user = estimate_audio_tokens(len(self.audio)) if self.audio is not None else estimate_text_tokens(self.user_text)
+        return user + estimate_text_tokens(self.reply)
+
+    @property
+    def user_text(self) -> str:
+        return self.transcript or UNTRANSCRIBED_TEXT
+
+    def contents(self) -> List[types.Content]:
+        if self.audio is not None:
+            user_part = types.Part(inline_data=types.Blob(mime_type="audio/wav", data=self.audio))
+        else:
+            user_part = types.Part(text=self.user_text)
+        return [
+            types.Content(role="user", parts=[user_part]),
+            types.Content(role="model", parts=[types.Part(text=self.reply)]),
+        ]
+
+
+class VoiceConversation:
+    """
+    Кантэкст аднаго voice-злучэння.
+
+    Пасля кожнага хода яго аўдыя ў фоне ператвараецца ў тэкст (summary_model)
+    і адкідаецца; пакуль запісу няма, у кантэкст ідзе само аўдыя. Калі хады перавышаюць token_budget, усе, акрамя keep_turns апошніх,
+    у фоне перадаюцца на summarize і замяняюцца зместам; пакуль змест
+    рыхтуецца, яны застаюцца ў кантэксце. Пры перавышэнні hard_budget
+    (фонавы змест не паспявае) найстарэйшыя хады адкідаюцца адразу.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        summary_model: str,
+        token_budget: int = 8000,
+        keep_turns: int = 4,
+        hard_budget: Optional[int] = None,
+    ):
+        self.client_factory = client_factory
+        self.summary_model = summary_model
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.hard_budget = hard_budget or token_budget * 2
+        self.summary = ""
+        self.turns: List[VoiceTurn] = []
+        self._summarizing: Optional[asyncio.Task] = None
+        self._transcribing: Set[asyncio.Task] = set()
+        self._stats: Dict[str, int] = {
+            "turns": 0, "transcripts": 0, "transcript_failures": 0,
+            "summaries": 0, "summary_failures": 0, "dropped_turns": 0,
+        }
+
+    @property
+    def tokens(self) -> int:
+        return estimate_text_tokens(self.summary) + sum(t.tokens for t in self.turns)
+
+    def contents(self, audio: bytes) -> List[types.Content]:
+        """Кантэкст для новага хода: змест + апошнія хады + новае аўдыя карыстальніка."""
+        contents: List[types.Content] = []
+        if self.summary:
+            contents.append(types.Content(role="user", parts=[types.Part(text=f"Змест папярэдняй размовы: {self.summary}")]))
+        for turn in self.turns:
+            contents.extend(turn.contents())
+        contents.append(
+            types.Content(role="user", parts=[types.Part(inline_data=types.Blob(mime_type="audio/wav", data=audio))])
+        )
+        return contents
+
+    def add_turn(self, audio: bytes, reply: str):
+        """Запамінае скончаны (або перапынены, але часткова агучаны) ход."""
+        reply = reply.strip()
+        if not reply:
+            return
+        turn = VoiceTurn(reply, audio=bytes(audio))
+        self.turns.append(turn)
+        self._stats["turns"] += 1
+        task = asyncio.create_task(self._transcribe(turn))
+        self._transcribing.add(task)
+        task.add_done_callback(self._transcribing.discard)
+        self._compact()
+
+    def close(self):
+        if self._summarizing is not None and not self._summarizing.done():
+            self._summarizing.cancel()
+        for task in list(self._transcribing):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": self.tokens,
+            "resident_turns": len(self.turns),
+            "audio_turns": sum(1 for t in self.turns if t.audio is not None),
+            "has_summary": bool(self.summary),
+            **self._stats,
+        }
+
+    async def _transcribe(self, turn: VoiceTurn):
+        contents = [
+            types.Content(role="user", parts=[
+                types.Part(inline_data=types.Blob(mime_type="audio/wav", data=turn.audio)),
+                types.Part(text=TRANSCRIBE_INSTRUCTION),
+            ])
+        ]
+        try:
+            response = await self.client_factory().aio.models.generate_content(
+                model=self.summary_model,
+                contents=contents,
+                config=types.GenerateContentConfig(temperature=0.0),
+            )
+            transcript = (response.text or "").strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"Voice turn transcription failed: {e}")
+            transcript = ""
+        # Аўдыя больш не трымаем у любым выпадку: кантэкст расце толькі тэкстам
+        turn.transcript, turn.audio = transcript, None
+        self._stats["transcripts" if transcript else "transcript_failures"] += 1
+
+    def _compact(self):
+        while self.tokens > self.hard_budget and len(self.turns) > 1:
+            self.turns.pop(0)
+            self._stats["dropped_turns"] += 1
+        if self.tokens <= self.token_budget or len(self.turns) <= self.keep_turns:
+            return
+        if self._summarizing is not None and not self._summarizing.done():
+            return
+        old = self.turns[: len(self.turns) - self.keep_turns]
+        self._summarizing = asyncio.create_task(self._summarize(old))
+
+    async def _summarize(self, old: List[VoiceTurn]):
+        contents: List[types.Content] = []
+        if self.summary:
+            contents.append(types.Content(role="user", parts=[types.Part(text=f"Ранейшы змест: {self.summary}")]))
+        for turn in old:
+            contents.extend(turn.contents())
+        contents.append(types.Content(role="user", parts=[types.Part(text=SUMMARY_INSTRUCTION)]))
+        try:
+            response = await self.client_factory().aio.models.generate_content(
+                model=self.summary_model,
+                contents=contents,
+                config=types.GenerateContentConfig(temperature=0.2),
+            )
+            summary = (response.text or "").strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["summary_failures"] += 1
+            log.warning(f"Voice conversation summary failed: {e}")
+            return
+        if not summary:
+            self._stats["summary_failures"] += 1
+            return
+        # Хады маглі ўжо адкінуць па hard_budget — выдаляем толькі тыя, што яшчэ ёсць
+        self.turns = [t for t in self.turns if not any(t is o for o in old)]
+        self.summary = summary
+        self._stats["summaries"] += 1
+        log.info(f"Voice conversation summarized {len(old)} turns into {len(summary)} chars")
+
+
+class SystemPromptCache:
+    """
+    Сістэмны промпт у явным кэшы кантэксту Gemini.
+
+    config_fields() вяртае або {"cached_content": name}, або
+    {"system_instruction": prompt} (калі кэш стварыць нельга: мадэль не
+    падтрымлівае, квота і г.д.). Промпт карацейшы за min_tokens у кэш
+    не спрабуе трапіць зусім — API такі кэш не створыць. Пасля
+    няўдачы новая спроба — не раней за retry_after секунд; кэш
+    пераствараецца за refresh_margin секунд да заканчэння ttl.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        system_prompt: str,
+        ttl_seconds: int = 3600,
+        refresh_margin: int = 120,
+        retry_after: int = 600,
+        min_tokens: int = MIN_CACHE_TOKENS,
+    ):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._name: Optional[str] = None
+        self._expires = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+        self._stats: Dict[str, int] = {"created": 0, "failures": 0, "hits": 0, "fallbacks": 0}
+        self.enabled = estimate_text_tokens(system_prompt) >= min_tokens
+        if not self.enabled:
+            log.info(f"System prompt is below the {min_tokens}-token cache minimum; sending it inline")
+
+    async def config_fields(self) -> Dict[str, Any]:
+        name = await self._current()
+        if name:
+            self._stats["hits"] += 1
+            return {"cached_content": name}
+        self._stats["fallbacks"] += 1
+        return {"system_instruction": self.system_prompt}
+
+    def invalidate(self):
+        """Кэш знік на баку API (напр., 404 на cached_content) — наступны ход створыць новы."""
+        self._name = None
+        self._expires = 0.0
+
+    async def close(self):
+        if self._name:
+            try:
+                await self.client.aio.caches.delete(name=self._name)
+            except Exception as e:
+                log.debug(f"Failed to delete prompt cache {self._name}: {e}")
+            self._name = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "active": self._name is not None, **self._stats}
+
+    async def _current(self) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if self._name and now < self._expires - self.refresh_margin:
+            return self._name
+        if now < self._retry_at:
+            return None
+        async with self._lock:
+            now = time.monotonic()
+            if self._name and now < self._expires - self.refresh_margin:
+                return self._name
+            try:
+                cache = await self.client.aio.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=self.system_prompt,
+                        ttl=f"{self.ttl_seconds}s",
+                        display_name="simple-voice-system-prompt",
+                    ),
+                )
+            except Exception as e:
+                self._stats["failures"] += 1
+                self._retry_at = now + self.retry_after
+                self._name = None
+                log.info(f"System prompt cache unavailable for {self.model} ({e}); sending the prompt inline")
+                return None
+            self._name = cache.name
+            self._expires = now + self.ttl_seconds
+            self._stats["created"] += 1
+            log.info(f"System prompt cached as {cache.name} for {self.ttl_seconds}s")
+            return self._name
+
@@ -0,0 +1,260 @@
+# services/voice_pipeline.py
+
+import asyncio
+import logging
+import re
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Deque, List, Optional
+
+from services.metrics import cancellation
+
+log = logging.getLogger(__name__)
+
+# Скарачэнні, пасля якіх кропка не заканчвае сказ (ніжні рэгістр, без кропкі)
+BELARUSIAN_ABBREVIATIONS = frozenset({
+    "т", "зн", "г", "гг", "ст", "стст", "вул", "пр", "пл", "сп", "спадар", "спн", "д", "к", "кв", "п",
+    "с", "м", "км", "см", "мм", "кг", "гр", "тыс", "млн", "млрд", "руб", "кап", "р", "проф", "акад",
+    "дац", "канд", "д-р", "навук", "напр", "гл", "параўн", "мал", "табл", "разд", "арт", "вып", "н",
+    "э", "ін", "інш", "і", "пад", "рэд", "ул", "буйн", "заг", "абл", "паш", "рас", "бел", "англ",
+    "ням", "лац", "стар", "etc", "vs", "mr", "mrs", "dr", "st",
+})
+
+_SENTENCE_END = ".!?…"
+_CLOSERS = "\"'»”)]"
+_CLAUSE_BREAK = re.compile(r"[,;:—–](?=\s)")
+_LAST_WORD = re.compile(r"([\w\-]+)$")
+
+
+class SentenceSegmenter:
+    """
+    Струменевы падзел тэксту LLM на сказы для TTS.
+
+    • канец сказа — `.!?…` (з закрывальнымі дужкамі/двукоссем) + прабел і
+      не малая літара пасля; скарачэнні («т. зн.», «г.», «вул.»), ініцыялы
+      («Я. Купала») і дзесятковыя дробы («3.5») сказ не заканчваюць;
+    • першы сегмент можна адрэзаць ужо па коске (first_clause_chars), каб
+      хутчэй пачаць агучванне;
+    • доўгі буфер без канца сказа рэжацца па коске/працяжніку або прабелу (max_chars).
+    """
+
+    def __init__(self, max_chars: int = 220, first_clause_chars: int = 60, min_chars: int = 12):
+        self.max_chars = max_chars
+        self.first_clause_chars = first_clause_chars
+        self.min_chars = min_chars
+        self._buf = ""
+        self._scan = 0
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        """Дадае кавалак тэксту; вяртае гатовыя сегменты (магчыма, пусты спіс)."""
+        self._buf += text
+        segments: List[str] = []
+        while True:
+            segment = self._next_sentence() or self._next_clause()
+            if segment is None:
+                break
+            segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """Рэшта буфера ў канцы адказу."""
+        tail = self._buf.strip()
+        self._buf, self._scan = "", 0
+        if tail:
+            self._emitted += 1
+            return tail
+        return None
+
+    def _next_sentence(self) -> Optional[str]:
+        buf = self._buf
+        i = self._scan
+        while i < len(buf):
+            ch = buf[i]
+            if ch == "\n" and buf[:i].strip():
+                return self._cut(i, i + 1)
+            if ch not in _SENTENCE_END:
+                i += 1
+                continue
+            j = i
+            while j < len(buf) and (buf[j] in _SENTENCE_END or buf[j] in _CLOSERS):
+                j += 1
+            if j == len(buf):
+                # Не ведаем, што далей — чакаем наступны кавалак
+                self._scan = i
+                return None
+            if not buf[j].isspace():
+                i = j
+                continue
+            k = j
+            while k < len(buf) and buf[k].isspace():
+                k += 1
+            if k == len(buf):
+                self._scan = i
+                return None
+            if self._is_boundary(buf, i, j, buf[k]) and len(buf[:j].strip()) >= self.min_chars:
+                return self._cut(j, k)
+            i = k
+        self._scan = len(buf)
+        return None
+
+    def _is_boundary(self, buf: str, start: int, end: int, next_char: str) -> bool:
+        punct = buf[start:end]
+        if next_char.islower():
+            return False
+        if punct.rstrip(_CLOSERS) != ".":
+            # ! ? … і шматкроп'е — заўсёды канец сказа
+            return True
+        match = _LAST_WORD.search(buf[:start])
+        if not match:
+            return True
+        word = match.group(1)
+        if word.lower() in BELARUSIAN_ABBREVIATIONS:
+            return False
+        # Ініцыял: адна вялікая літара перад кропкай
+        if len(word) == 1 and word.isalpha() and word.isupper():
+            return False
+        return True
+
+    def _next_clause(self) -> Optional[str]:
+        buf = self._buf
+        first = self._emitted == 0
+        if first and len(buf) >= self.first_clause_chars:
+            breaks = [m.end() for m in _CLAUSE_BREAK.finditer(buf) if m.end() >= self.min_chars]
+            if breaks:
+                return self._cut(breaks[-1], breaks[-1])
+        if len(buf) <= self.max_chars:
+            return None
+        window = buf[: self.max_chars]
+        breaks = [m.end() for m in _CLAUSE_BREAK.finditer(window) if m.end() >= self.min_chars]
+        if breaks:
+            return self._cut(breaks[-1], breaks[-1])
+        space = window.rfind(" ")
+        cut = space if space >= self.min_chars else self.max_chars
+        return self._cut(cut, cut)
+
+    def _cut(self, end: int, rest: int) -> Optional[str]:
+        segment = self._buf[:end].strip()
+        self._buf = self._buf[rest:].lstrip()
+        self._scan = 0
+        if not segment:
+            return None
+        self._emitted += 1
+        return segment
+
+
+def split_text(text: str, max_chars: int = 300, min_chars: int = 12) -> List[str]:
+    """
+    Гатовы тэкст цалкам -> сегменты для TTS па межах сказаў; суседнія сказы
+    аб'ядноўваюцца, пакуль сегмент не даўжэйшы за max_chars.
+    """
+    # first_clause_chars больш за тэкст: першы сегмент па коске тут не патрэбны
+    segmenter = SentenceSegmenter(max_chars=max_chars, first_clause_chars=len(text) + 1, min_chars=min_chars)
+    sentences = segmenter.feed(text)
+    tail = segmenter.flush()
+    if tail:
+        sentences.append(tail)
+    segments: List[str] = []
+    for sentence in sentences:
+        if segments and len(segments[-1]) + 1 + len(sentence) <= max_chars:
+            segments[-1] += " " + sentence
+        else:
+            segments.append(sentence)
+    return segments
+
+
+async def gather_prefixes(
+    tasks: List["asyncio.Future"],
+    on_prefix: Optional[Callable[[List], Awaitable[None]]] = None,
+) -> List:
+    """
+    Як asyncio.gather (вынікі ў парадку задач, падае на першай памылцы любой
+    задачы), але кожны раз, калі гатовы даўжэйшы непарыўны пачатак вынікаў,
+    выклікае on_prefix(пачатак) — да апошняй задачы; поўны спіс толькі вяртаецца.
+    """
+    results: List = [None] * len(tasks)
+    index = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    ready = reported = 0
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            results[index[task]] = task.result()
+        while ready < len(tasks) and tasks[ready].done():
+            ready += 1
+        if on_prefix is not None and ready > reported and ready < len(tasks):
+            reported = ready
+            await on_prefix(results[:ready])
+    return results
+
+
+class OrderedTtsPipeline:
+    """
+    Паралельны сінтэз сегментаў са строгім парадкам выхаду.
+
+    Сегмент N+1 сінтэзуецца, пакуль аўдыя сегмента N яшчэ аддаецца кліенту;
+    адначасова працуе не больш за lookahead + 1 запытаў TTS. Кавалкі
+    трапляюць у sink строга ў парадку сегментаў.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], AsyncIterator[bytes]],
+        sink: Callable[[bytes], Awaitable[None]],
+        lookahead: int = 1,
+    ):
+        self.synthesize = synthesize
+        self.sink = sink
+        self._slots = asyncio.Semaphore(lookahead + 1)
+        self._order: "asyncio.Queue[Optional[asyncio.Queue]]" = asyncio.Queue()
+        self._tasks: Deque[asyncio.Task] = deque()
+        self._sequencer = asyncio.create_task(self._run_sequencer())
+        self.segments = 0
+
+    def put(self, segment: str):
+        """Ставіць сегмент у чаргу агучвання (не блакуе)."""
+        chunks: asyncio.Queue = asyncio.Queue()
+        self._tasks.append(asyncio.create_task(self._synthesize_segment(segment, chunks)))
+        self._order.put_nowait(chunks)
+        self.segments += 1
+
+    async def close(self):
+        """Чакае, пакуль усе пастаўленыя сегменты будуць агучаны і аддадзены ў sink."""
+        self._order.put_nowait(None)
+        await self._sequencer
+
+    def cancel(self):
+        pending = [task for task in self._tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        self._sequencer.cancel()
+        if pending:
+            cancellation.inc("tts_segments_cancelled", len(pending))
+
+    async def _synthesize_segment(self, segment: str, chunks: asyncio.Queue):
+        try:
+            async with self._slots:
+                log.info(f"TTS pipeline: synthesizing segment: {segment[:30]}...")
+                # aclosing: пры адмене генератар TTS закрываецца адразу (і адмяняе свой job)
+                async with aclosing(self.synthesize(segment)) as audio:
+                    async for chunk in audio:
+                        chunks.put_nowait(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"TTS pipeline: segment failed: {e}")
+        finally:
+            chunks.put_nowait(None)
+
+    async def _run_sequencer(self):
+        while True:
+            chunks = await self._order.get()
+            if chunks is None:
+                break
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                await self.sink(chunk)
+            if self._tasks:
+                self._tasks.popleft()
@@ -0,0 +1,77 @@
+# services/voice_protocol.py
+
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+log = logging.getLogger(__name__)
+
+# v1 — кожнае паведамленне `response` нясе ўвесь назапашаны тэкст (стары кліент);
+# v2 — `response_delta` з нумарам + перыядычны `response_snapshot` для рэсінхранізацыі.
+PROTOCOL_LEGACY = 1
+PROTOCOL_DELTA = 2
+SUPPORTED_PROTOCOLS = (PROTOCOL_LEGACY, PROTOCOL_DELTA)
+
+_turn_ids = itertools.count(1)
+
+
+def negotiate_protocol(requested: Any) -> int:
+    """?proto=... -> версія пратакола (невядомае значэнне -> v1)."""
+    try:
+        version = int(requested)
+    except (TypeError, ValueError):
+        return PROTOCOL_LEGACY
+    return version if version in SUPPORTED_PROTOCOLS else PROTOCOL_LEGACY
+
+
+class ResponseStream:
+    """
+    Тэкст аднаго адказу на voice-сокеце.
+
+    v2: кожны кавалак — `{"type": "response_delta", "turn", "seq", "text"}`,
+    кожныя snapshot_every дэльт і ў канцы — `response_snapshot` з поўным
+    тэкстам (seq — нумар апошняй уключанай дэльты). Кліент, які прапусціў
+    дэльту, чакае бліжэйшы snapshot. Аб'ём трафіку — O(n) замест O(n²).
+    """
+
+    def __init__(
+        self,
+        send_json: Callable[[Dict[str, Any]], Awaitable[None]],
+        protocol: int,
+        snapshot_every: int = 32,
+    ):
+        self.send_json = send_json
+        self.protocol = protocol
+        self.snapshot_every = snapshot_every
+        self.turn = next(_turn_ids)
+        self.seq = 0
+        self._parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    async def append(self, chunk: str):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        if self.protocol == PROTOCOL_LEGACY:
+            await self.send_json({"type": "response", "text": self.text})
+            return
+        self.seq += 1
+        await self.send_json({"type": "response_delta", "turn": self.turn, "seq": self.seq, "text": chunk})
+        if self.seq % self.snapshot_every == 0:
+            await self._snapshot(final=False)
+
+    async def finish(self):
+        """Закрывае адказ; у v2 дасылае фінальны snapshot."""
+        if self.protocol == PROTOCOL_DELTA and self._parts:
+            await self._snapshot(final=True)
+
+    async def _snapshot(self, final: bool):
+        text = "".join(self._parts)
+        # Злучаем кавалкі, каб наступныя snapshot-ы не склейвалі спіс нанава
+        self._parts = [text]
+        await self.send_json({
+            "type": "response_snapshot", "turn": self.turn, "seq": self.seq, "text": text, "final": final,
+        })
@@ -0,0 +1,106 @@
+# services/worker_pool.py
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+log = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(RuntimeError):
+    """Пул заняты: усе воркеры працуюць і чарга запоўненая."""
+
+
+class BoundedWorkerPool:
+    """
+    Агульны (на ўвесь працэс) пул патокаў з абмежаванай чаргой.
+
+    Колькасць патокаў фіксаваная (max_workers), колькасць задач, якія чакаюць
+    свабоднага воркера, — не больш за max_queue. Калі і тое, і другое занята,
+    submit() адразу кідае PoolSaturatedError, каб выклікаючы бок мог адмовіць
+    кліенту, а не назапашваць працу.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        with self._lock:
+            if self._queued + self._active >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"Worker pool '{self.name}' is saturated "
+                    f"({self._active} active, {self._queued} queued)"
+                )
+            self._queued += 1
+            self._submitted += 1
+
+        enqueued_at = time.monotonic()
+
+        def _run():
+            wait = time.monotonic() - enqueued_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._started += 1
+                self._wait_total += wait
+                self._wait_last = wait
+                self._wait_max = max(self._wait_max, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        try:
+            future = self._executor.submit(_run)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        # Задача, адмененая ў чарзе, так і не запусцілася — вызваляем яе месца
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            # Адмененыя ў чарзе задачы не пачыналіся і ў сярэдні час чакання не ўваходзяць
+            started = self._started
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active_workers": self._active,
+                "queue_depth": self._queued,
+                "submitted": self._submitted,
+                "started": started,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_avg_ms": round(self._wait_total / started * 1000, 1) if started else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 1),
+                "wait_last_ms": round(self._wait_last * 1000, 1),
+            }
+
+    def shutdown(self, wait: bool = False):
+        log.info(f"Shutting down worker pool '{self.name}'")
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.artifact_store import ArtifactStore
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(tmp_path, index_size=2)
+
+
+@pytest.fixture
+def client(store):
+    async def get_file(request):
+        path = store.resolve(request.path_params["filename"])
+        return store.file_response(path, request, media_type="audio/wav")
+
+    return TestClient(Starlette(routes=[Route("/api/files/{filename}", get_file)]))
+
+
+@pytest.fixture
+def name(store):
+    digest = hashlib.sha256(DATA).hexdigest()
+    asyncio.run(store._write_once(f"{digest}.wav", DATA))
+    return f"{digest}.wav"
+
+
+def test_matching_if_none_match_is_not_modified(client, name):
+    etag = client.get(f"/api/files/{name}").headers["etag"]
+    response = client.get(f"/api/files/{name}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_range_returns_partial_content(client, name):
+    response = client.get(f"/api/files/{name}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+    assert response.content == DATA[100:200]
+
+    suffix = client.get(f"/api/files/{name}", headers={"Range": "bytes=-24"})
+    assert suffix.headers["content-range"] == f"bytes {len(DATA) - 24}-{len(DATA) - 1}/{len(DATA)}"
+    assert suffix.content == DATA[-24:]
+
+
+def test_unsatisfiable_range(client, name):
+    response = client.get(f"/api/files/{name}", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_materialize_writes_once_and_bounds_the_index(store):
+    async def load_artifact(**kwargs):
+        data = kwargs["filename"].encode() * 10
+        return SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type="audio/wav"))
+
+    service = SimpleNamespace(load_artifact=load_artifact)
+    delta = {f"tts_{i}.wav": 0 for i in range(4)}
+    first = asyncio.run(store.materialize_many(service, "app", "u", "s", delta))
+    again = asyncio.run(store.materialize_many(service, "app", "u", "s", delta))
+
+    assert [a.url for a in first] == [a.url for a in again]
+    assert all((store.root / a.url.rsplit("/", 1)[1]).exists() for a in first)
+    assert len(store._written) == 2
@@ -0,0 +1,45 @@
+import struct
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from services.audio_codec import (
+    WAV_HEADER_SIZE,
+    WAVE_FORMAT_IEEE_FLOAT,
+    WAVE_FORMAT_PCM,
+    concat_wav,
+    parse_wav,
+    wav_buffer,
+)
+
+
+def _wav(payload: bytes, format_code=WAVE_FORMAT_PCM, sample_rate=16000, bytes_per_sample=2) -> bytes:
+    buf = wav_buffer(len(payload), format_code, sample_rate, 1, bytes_per_sample)
+    buf[WAV_HEADER_SIZE:] = payload
+    return bytes(buf)
+
+
+def test_concat_wav_rewrites_header_lengths():
+    parts = [b"\x01\x00" * 10, b"\x02\x00" * 5, b"\x03\x00" * 7]
+    joined = concat_wav([_wav(p) for p in parts])
+
+    riff_size = struct.unpack_from("<I", joined, 4)[0]
+    data_size = struct.unpack_from("<I", joined, 40)[0]
+    assert data_size == sum(len(p) for p in parts)
+    assert riff_size == len(joined) - 8
+    info = parse_wav(joined)
+    assert bytes(info.data) == b"".join(parts)
+    assert (info.sample_rate, info.bits_per_sample) == (16000, 16)
+
+
+def test_concat_wav_single_chunk_is_returned_as_is():
+    wav = _wav(b"\x00" * 8)
+    assert concat_wav([memoryview(wav)]) == wav
+
+
+def test_concat_wav_rejects_mixed_formats_and_non_wav():
+    with pytest.raises(ValueError):
+        concat_wav([_wav(b"\x00" * 8), _wav(b"\x00" * 8, WAVE_FORMAT_IEEE_FLOAT, 24000, 4)])
+    with pytest.raises(ValueError):
+        concat_wav([_wav(b"\x00" * 8), b"not a wav"])
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from services.live_voice import GeminiLiveBackend
+
+
+class FakeSession:
+    """Афлайн live-сесія: на activity_end адказвае колькасцю атрыманых байтаў."""
+
+    def __init__(self):
+        self.received = 0
+        self.events = []
+        self._replies: asyncio.Queue = asyncio.Queue()
+
+    async def send_realtime_input(self, audio=None, activity_start=None, activity_end=None):
+        if activity_start is not None:
+            self.events.append("start")
+            self.received = 0
+        if audio is not None:
+            self.received += len(audio.data)
+        if activity_end is not None:
+            self.events.append("end")
+            for text in ("Атрымана ", f"{self.received} байтаў."):
+                self._replies.put_nowait(SimpleNamespace(text=text, server_content=None))
+            done = SimpleNamespace(turn_complete=True, interrupted=False)
+            self._replies.put_nowait(SimpleNamespace(text=None, server_content=done))
+
+    async def receive(self):
+        while True:
+            message = await self._replies.get()
+            yield message
+            if message.server_content is not None:
+                return
+
+
+class FakeConnect:
+    def __init__(self, live):
+        self.live = live
+
+    async def __aenter__(self):
+        self.live.sessions.append(FakeSession())
+        return self.live.sessions[-1]
+
+    async def __aexit__(self, *exc):
+        self.live.closed += 1
+
+
+class FakeLive:
+    def __init__(self):
+        self.sessions = []
+        self.closed = 0
+
+    def connect(self, model, config):
+        return FakeConnect(self)
+
+
+@pytest.fixture
+def live():
+    return FakeLive()
+
+
+@pytest.fixture
+def backend(live):
+    client = SimpleNamespace(aio=SimpleNamespace(live=live))
+    return GeminiLiveBackend(lambda: client, "fake-live", "prompt")
+
+
+async def _speak(backend, frames: int) -> str:
+    turn = await backend.start_turn()
+    for _ in range(frames):
+        await turn.send_audio(bytes(3200))
+    await turn.end_audio()
+    return "".join([text async for text in turn.replies()])
+
+
+def test_session_is_reused_between_turns(backend, live):
+    async def scenario():
+        assert await _speak(backend, 3) == "Атрымана 9600 байтаў."
+        assert await _speak(backend, 2) == "Атрымана 6400 байтаў."
+        await backend.close()
+
+    asyncio.run(scenario())
+    assert len(live.sessions) == 1
+    assert live.sessions[0].events == ["start", "end", "start", "end"]
+    assert backend.stats()["audio_bytes"] == 16000
+
+
+def test_unread_reply_reopens_the_session(backend, live):
+    async def scenario():
+        turn = await backend.start_turn()
+        await turn.end_audio()
+        # Адказ не дачытаны (ход перапынены) — наступны ход у новай сесіі
+        await backend.start_turn()
+        assert len(live.sessions) == 2 and live.closed == 1
+        await backend.close()
+
+    asyncio.run(scenario())
+    assert live.closed == 2
@@ -0,0 +1,21 @@
+from services.metrics import ENDPOINT_STAGE, TraceRecorder
+
+
+def test_stages_after_endpoint_are_measured_from_it():
+    recorder = TraceRecorder()
+    trace = recorder.start("u", "simple")
+    trace.marks = [(ENDPOINT_STAGE, 2000.0), ("first_token", 2300.0), ("first_tts_chunk", 2500.0)]
+    recorder.finish(trace)
+
+    stages = recorder.snapshot()["stages"]
+    assert stages[f"simple.{ENDPOINT_STAGE}"]["max_ms"] == 2000.0
+    assert stages["simple.first_token"]["max_ms"] == 300.0
+    assert stages["simple.first_tts_chunk"]["max_ms"] == 500.0
+    assert [s["span_ms"] for s in trace.to_dict()["stages"]] == [2000.0, 300.0, 200.0]
+
+
+def test_mark_keeps_the_first_time_of_a_stage():
+    trace = TraceRecorder().start("u", "agent")
+    first = trace.mark(ENDPOINT_STAGE)
+    assert trace.mark(ENDPOINT_STAGE) == first == trace.at(ENDPOINT_STAGE)
+    assert trace.at("first_token") is None
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from services.session_manager import SessionManager
+
+
+class FakeSessionService:
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    async def create_session(self, app_name, user_id):
+        self.created += 1
+        return SimpleNamespace(id=f"{user_id}-{self.created}")
+
+    async def list_sessions(self, app_name, user_id):
+        return SimpleNamespace(sessions=[])
+
+    async def delete_session(self, app_name, user_id, session_id):
+        self.deleted.append(session_id)
+
+
+class FakeArtifactService:
+    async def list_artifact_keys(self, app_name, user_id, session_id):
+        return []
+
+
+def _manager(service, **kwargs):
+    options = {"ttl_seconds": 60, "max_sessions": 10, "max_events": 50}
+    options.update(kwargs)
+    return SessionManager(service, FakeArtifactService(), "app", **options)
+
+
+def test_pinned_session_survives_ttl_and_lru():
+    async def scenario():
+        service = FakeSessionService()
+        manager = _manager(service, max_sessions=1)
+        voice = await manager.get_or_create("voice")
+        manager.pin("voice")
+        manager._sessions["voice"].last_used = time.monotonic() - 3600
+
+        await manager.get_or_create("other")
+        assert service.deleted == []
+        assert await manager.get_or_create("voice") == voice
+
+        manager.unpin("voice")
+        manager._sessions["voice"].last_used = time.monotonic() - 3600
+        await manager.get_or_create("other")
+        assert voice in service.deleted
+
+    asyncio.run(scenario())
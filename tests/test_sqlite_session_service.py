@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from google.adk.events import Event, EventActions
+
+from services.sqlite_session_service import SqliteSessionService
+
+
+def test_shared_state_survives_restart(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+
+    async def write():
+        service = SqliteSessionService(db_path, flush_interval=0.01)
+        session = await service.create_session(app_name="app", user_id="u", state={"app:lang": "be"})
+        event = Event(invocation_id="inv", author="user", actions=EventActions(state_delta={"user:name": "Юзік"}))
+        await service.append_event(session, event)
+        service.close()
+        return session.id
+
+    async def read(session_id):
+        service = SqliteSessionService(db_path)
+        try:
+            return await service.get_session(app_name="app", user_id="u", session_id=session_id)
+        finally:
+            service.close()
+
+    session = asyncio.run(read(asyncio.run(write())))
+    assert session.state["app:lang"] == "be"
+    assert session.state["user:name"] == "Юзік"
+    assert len(session.events) == 1
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from services.turn_scheduler import SessionBusyError, TurnScheduler
+
+
+def test_second_turn_waits_for_the_first():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=2)
+        order = []
+        first_running = asyncio.Event()
+        release_first = asyncio.Event()
+
+        async def first():
+            async with scheduler.admit("s"):
+                order.append("first start")
+                first_running.set()
+                await release_first.wait()
+                order.append("first end")
+
+        async def second():
+            await first_running.wait()
+            async with scheduler.admit("s"):
+                order.append("second start")
+
+        tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+        await first_running.wait()
+        await asyncio.sleep(0.01)
+        assert order == ["first start"] and scheduler.busy("s")
+        release_first.set()
+        await asyncio.gather(*tasks)
+        assert order == ["first start", "first end", "second start"]
+        assert not scheduler.busy("s")
+
+    asyncio.run(scenario())
+
+
+def test_newer_turn_coalesces_a_queued_one():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=2)
+        running = scheduler.admit("s", "a", coalesce=True)
+        await running.wait()
+        queued = scheduler.admit("s", "b", coalesce=True)
+        newer = scheduler.admit("s", "c", coalesce=True)
+
+        assert queued.superseded and newer.text == "b\nc"
+        await queued.wait()  # superseded: returns at once
+        queued.release()
+        running.release()
+        async with newer:
+            assert not newer.superseded
+        assert scheduler.stats()["coalesced"] == 1
+        assert not scheduler.busy("s")
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=1)
+        running = scheduler.admit("s")
+        await running.wait()
+        scheduler.admit("s")
+        with pytest.raises(SessionBusyError):
+            scheduler.admit("s")
+        assert scheduler.stats()["rejected"] == 1
+        # Other sessions are not affected
+        scheduler.admit("other").release()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_releases_its_slot():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=1)
+        running = scheduler.admit("s")
+        await running.wait()
+        waiter = asyncio.create_task(scheduler.admit("s").wait())
+        await asyncio.sleep(0)
+        with pytest.raises(SessionBusyError):
+            scheduler.admit("s")
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The cancelled turn left the queue: a new one fits and runs once the first ends
+        ticket = scheduler.admit("s")
+        running.release()
+        async with ticket:
+            assert scheduler.stats()["running"] == 1
+        assert not scheduler.busy("s")
+
+    asyncio.run(scenario())
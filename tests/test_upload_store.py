@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.genai")
+pytest.importorskip("python_multipart")
+
+from services.upload_store import UploadStore, UploadTooLargeError
+
+BOUNDARY = "----yuzik"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _multipart(fields, files) -> bytes:
+    body = b""
+    for name, value in fields.items():
+        body += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        ).encode()
+    for filename, mime_type, data in files:
+        body += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body: bytes, size: int = 1000):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def _store(tmp_path, **kwargs):
+    options = {"size_limits": {"image/*": 4096}, "default_limit": 1024, "inline_max_bytes": 1024, "chunk_size": 2048}
+    options.update(kwargs)
+    return UploadStore(tmp_path, **options)
+
+
+def _receive(store, body, mime_for=lambda name: "application/octet-stream"):
+    return asyncio.run(store.receive_form(CONTENT_TYPE, _chunks(body), mime_for))
+
+
+def test_fields_and_files_are_spooled_and_deduplicated(tmp_path):
+    store = _store(tmp_path)
+    image = bytes(range(256)) * 12
+    body = _multipart({"text": "Вітаю", "user_id": "u1"}, [("a.png", "image/png", image), ("b.png", "image/png", image)])
+
+    fields, uploads = _receive(store, body)
+
+    assert fields == {"text": "Вітаю", "user_id": "u1"}
+    assert len(uploads) == 2 and uploads[0] is uploads[1]
+    assert uploads[0].path.read_bytes() == image
+    assert list(store.spool_dir.iterdir()) == []
+
+
+def test_mime_cap_is_enforced_while_streaming(tmp_path):
+    store = _store(tmp_path)
+    body = _multipart({}, [("notes.txt", "text/plain", b"x" * 2000)])
+
+    with pytest.raises(UploadTooLargeError) as exc:
+        _receive(store, body)
+
+    assert exc.value.limit == 1024
+    assert list(store.spool_dir.iterdir()) == []
+
+
+def test_body_cap_applies_without_content_length(tmp_path):
+    store = _store(tmp_path)
+    body = _multipart({"text": "x" * (store.max_body + 1)}, [])
+
+    with pytest.raises(UploadTooLargeError):
+        _receive(store, body)
+
+
+def test_index_is_bounded(tmp_path):
+    store = _store(tmp_path, index_size=2)
+    for i in range(4):
+        _receive(store, _multipart({}, [(f"{i}.png", "image/png", bytes([i]) * 10)]))
+    assert len(store._index) == 2
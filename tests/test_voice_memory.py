@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from services.voice_memory import (
+    PCM16_BYTES_PER_SECOND,
+    UNTRANSCRIBED_TEXT,
+    SystemPromptCache,
+    VoiceConversation,
+)
+
+LONG_PROMPT = "Ты галасавы памочнік. " * 400
+
+
+class FakeModels:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls: List[Dict[str, Any]] = []
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls.append({"model": model, "contents": contents})
+        if self.fail:
+            raise ValueError("quota")
+        return SimpleNamespace(text="Якое сёння надвор'е ў Мінску?")
+
+
+class FakeCaches:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = 0
+
+    async def create(self, model, config):
+        if self.fail:
+            raise ValueError("Cached content is too small")
+        self.created += 1
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+    async def delete(self, name):
+        pass
+
+
+def fake_client(fail_models: bool = False, fail_cache: bool = False):
+    return SimpleNamespace(aio=SimpleNamespace(models=FakeModels(fail_models), caches=FakeCaches(fail_cache)))
+
+
+async def _settle(conversation: VoiceConversation):
+    await asyncio.gather(*conversation._transcribing)
+    if conversation._summarizing is not None:
+        await conversation._summarizing
+
+
+def test_prompt_cache_reuses_created_cache():
+    async def scenario():
+        client = fake_client()
+        cache = SystemPromptCache(client, "m", LONG_PROMPT)
+        assert await cache.config_fields() == {"cached_content": "cachedContents/1"}
+        assert await cache.config_fields() == {"cached_content": "cachedContents/1"}
+        assert client.aio.caches.created == 1
+
+    asyncio.run(scenario())
+
+
+def test_prompt_cache_failure_waits_before_retry():
+    async def scenario():
+        cache = SystemPromptCache(fake_client(fail_cache=True), "m", LONG_PROMPT)
+        assert await cache.config_fields() == {"system_instruction": LONG_PROMPT}
+        await cache.config_fields()
+        assert cache.stats()["failures"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_short_prompt_is_never_cached():
+    async def scenario():
+        client = fake_client()
+        cache = SystemPromptCache(client, "m", "prompt")
+        assert await cache.config_fields() == {"system_instruction": "prompt"}
+        assert client.aio.caches.created == 0
+        assert cache.stats()["enabled"] is False
+
+    asyncio.run(scenario())
+
+
+def test_turn_audio_is_replaced_by_transcript():
+    async def scenario():
+        client = fake_client()
+        conversation = VoiceConversation(lambda: client, "m", token_budget=10_000)
+        conversation.add_turn(bytes(PCM16_BYTES_PER_SECOND * 5), "Сонечна.")
+        assert conversation.turns[0].audio is not None
+        await _settle(conversation)
+
+        turn = conversation.turns[0]
+        assert turn.audio is None and turn.transcript == "Якое сёння надвор'е ў Мінску?"
+        user, model, new = conversation.contents(bytes(16))
+        assert user.parts[0].text == turn.transcript and model.parts[0].text == "Сонечна."
+        assert new.parts[0].inline_data is not None
+
+    asyncio.run(scenario())
+
+
+def test_failed_transcription_drops_audio():
+    async def scenario():
+        conversation = VoiceConversation(lambda: fake_client(fail_models=True), "m")
+        conversation.add_turn(bytes(PCM16_BYTES_PER_SECOND), "Адказ.")
+        await _settle(conversation)
+        assert conversation.turns[0].audio is None
+        assert conversation.contents(bytes(16))[0].parts[0].text == UNTRANSCRIBED_TEXT
+        assert conversation.stats()["transcript_failures"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_old_turns_are_summarized():
+    async def scenario():
+        client = fake_client()
+        conversation = VoiceConversation(lambda: client, "m", token_budget=200, keep_turns=2)
+        for i in range(6):
+            conversation.add_turn(bytes(PCM16_BYTES_PER_SECOND), f"Адказ {i}. " * 10)
+            await _settle(conversation)
+        assert conversation.summary and len(conversation.turns) <= 4, conversation.stats()
+        contents = conversation.contents(bytes(16))
+        assert contents[0].parts[0].text.startswith("Змест") and contents[-1].role == "user"
+
+    asyncio.run(scenario())
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+import config
+from services.voice_pipeline import OrderedTtsPipeline, SentenceSegmenter, gather_prefixes, split_text
+
+
+def _segments(text: str, **kwargs):
+    segmenter = SentenceSegmenter(first_clause_chars=10_000, **kwargs)
+    segments = segmenter.feed(text)
+    tail = segmenter.flush()
+    return segments + ([tail] if tail else [])
+
+
+def test_sentences_end_at_terminal_punctuation():
+    assert _segments("Добры дзень, спадар! Як вашы справы? Усё добра.") == [
+        "Добры дзень, спадар!", "Як вашы справы?", "Усё добра.",
+    ]
+
+
+def test_abbreviations_initials_and_decimals_do_not_end_a_sentence():
+    text = (
+        "Музей на вул. Леніна адкрыты, т. зн. сёння. "
+        "Вершы напісаў Я. Купала ў 1906 г. Тэмпература — 3.5 градуса. Канец."
+    )
+    assert _segments(text) == [
+        "Музей на вул. Леніна адкрыты, т. зн. сёння.",
+        "Вершы напісаў Я. Купала ў 1906 г. Тэмпература — 3.5 градуса.",
+        "Канец.",
+    ]
+
+
+def test_streamed_chunks_wait_for_the_next_character():
+    segmenter = SentenceSegmenter(first_clause_chars=10_000)
+    assert segmenter.feed("Гэта першы сказ.") == []
+    assert segmenter.feed(" Другі") == ["Гэта першы сказ."]
+    assert segmenter.flush() == "Другі"
+
+
+def test_first_segment_may_end_at_a_comma():
+    segmenter = SentenceSegmenter(first_clause_chars=30)
+    assert segmenter.feed("Калі казаць пра надвор'е ў Мінску, заўтра ") == ["Калі казаць пра надвор'е ў Мінску,"]
+
+
+def test_split_text_packs_sentences_up_to_max_chars():
+    sentence = "Гэта даволі доўгі сказ пра беларускую мову і культуру."
+    text = " ".join([sentence] * 20)
+    segments = split_text(text, max_chars=config.TTS_SEGMENT_MAX_CHARS)
+
+    assert len(segments) > 1
+    assert all(len(s) <= config.TTS_SEGMENT_MAX_CHARS for s in segments)
+    # Пакуецца шчыльна: наступны сказ ужо не ўлез бы
+    assert all(len(s) + 1 + len(sentence) > config.TTS_SEGMENT_MAX_CHARS for s in segments[:-1])
+    assert " ".join(segments) == text
+
+
+def test_split_text_cuts_a_sentence_longer_than_max_chars():
+    text = "слова " * 100
+    segments = split_text(text, max_chars=50)
+    assert all(len(s) <= 50 for s in segments)
+    assert " ".join(segments).split() == text.split()
+
+
+def test_pipeline_keeps_segment_order_when_synthesis_finishes_out_of_order():
+    delays = {"a": 0.05, "b": 0.0, "c": 0.02}
+
+    async def synthesize(segment):
+        await asyncio.sleep(delays[segment])
+        for i in range(2):
+            yield f"{segment}{i}".encode()
+
+    async def scenario():
+        out = []
+
+        async def sink(chunk):
+            out.append(chunk.decode())
+
+        pipeline = OrderedTtsPipeline(synthesize, sink, lookahead=2)
+        for segment in "abc":
+            pipeline.put(segment)
+        await pipeline.close()
+        return out
+
+    assert asyncio.run(scenario()) == ["a0", "a1", "b0", "b1", "c0", "c1"]
+
+
+def test_failed_segment_is_skipped_without_stalling_the_rest():
+    async def synthesize(segment):
+        if segment == "bad":
+            raise ConnectionError("TTS down")
+        yield segment.encode()
+
+    async def scenario():
+        out = []
+
+        async def sink(chunk):
+            out.append(chunk.decode())
+
+        pipeline = OrderedTtsPipeline(synthesize, sink)
+        for segment in ("one", "bad", "two"):
+            pipeline.put(segment)
+        await pipeline.close()
+        return out
+
+    assert asyncio.run(scenario()) == ["one", "two"]
+
+
+def test_gather_prefixes_reports_each_longer_in_order_prefix():
+    delays = {"a": 0.03, "b": 0.0, "c": 0.06, "d": 0.01}
+
+    async def synthesize(segment):
+        await asyncio.sleep(delays[segment])
+        return segment
+
+    async def scenario():
+        prefixes = []
+
+        async def on_prefix(prefix):
+            prefixes.append("".join(prefix))
+
+        tasks = [asyncio.create_task(synthesize(segment)) for segment in "abcd"]
+        return await gather_prefixes(tasks, on_prefix), prefixes
+
+    results, prefixes = asyncio.run(scenario())
+    # "b" і "d" гатовыя раней, але пачатак расце толькі па парадку; поўны вынік не паўтараецца
+    assert results == ["a", "b", "c", "d"]
+    assert prefixes == ["ab"]
+
+
+def test_gather_prefixes_fails_on_the_first_error_of_any_task():
+    async def scenario():
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def broken():
+            raise ConnectionError("TTS down")
+
+        tasks = [asyncio.create_task(slow()), asyncio.create_task(broken())]
+        try:
+            await asyncio.wait_for(gather_prefixes(tasks), timeout=1)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
@@ -0,0 +1,56 @@
+# tools/bench/sqlite_sessions.py
+"""
+Накладныя выдаткі SqliteSessionService на ход супраць InMemorySessionService:
+    python -m tools.bench.sqlite_sessions [turns] [events_per_turn]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.genai import types
+
+from services.sqlite_session_service import SqliteSessionService
+
+
+async def bench_service(service: BaseSessionService, turns: int, events_per_turn: int) -> List[float]:
+    session = await service.create_session(app_name="bench", user_id="u")
+    timings = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        # Тыповы ход: get_session + некалькі append_event
+        session = await service.get_session(app_name="bench", user_id="u", session_id=session.id)
+        for i in range(events_per_turn):
+            author = "user" if i == 0 else "router_agent"
+            event = Event(
+                invocation_id=f"inv-{turn}",
+                author=author,
+                content=types.Content(role="user" if i == 0 else "model", parts=[types.Part(text="Вітаю! " * 40)]),
+            )
+            await service.append_event(session, event)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: List[float]):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:>10}: mean {statistics.mean(timings) * 1e3:.3f} ms/turn, p95 {p95 * 1e3:.3f} ms/turn")
+
+
+def main(turns: int = 500, events_per_turn: int = 4):
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_service = SqliteSessionService(os.path.join(tmp, "bench.db"))
+        report("in-memory", asyncio.run(bench_service(InMemorySessionService(), turns, events_per_turn)))
+        report("sqlite", asyncio.run(bench_service(sqlite_service, turns, events_per_turn)))
+        sqlite_service.close()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -10,38 +10,87 @@ from __future__ import annotations
 
 import os
 import traceback
-from typing import Optional, AsyncGenerator, Dict, Any, Tuple
+from typing import Any, Optional, AsyncGenerator, Dict, List, Tuple
 import asyncio
-import base64
+import binascii
 import re
+import threading
+import time
+from contextlib import aclosing
+from pathlib import Path
 
 import logging
 from google.genai import types
 from google.adk.tools import FunctionTool, ToolContext
-from gradio_client import Client, handle_file
+from gradio_client import handle_file
+
+import config
+from services.audio_codec import WAV_HEADER_SIZE, WAVE_FORMAT_IEEE_FLOAT, concat_wav, wav_buffer
+from services.audio_egress import AudioEgressBuffer
+from services.metrics import cancellation
+from services.voice_pipeline import gather_prefixes, split_text
+from services.worker_pool import PoolSaturatedError
+from tools.tts_cache import TtsCache, speaker_fingerprint
+from tools.tts_clients import PRIORITY_BATCH, PRIORITY_VOICE, TtsClientPool
+from tools.tts_stream_engine import TtsStreamEngine
 
 log = logging.getLogger(__name__)
 
+_MAX_PATH = 4096
+# Радок карацейшы за гэта не лічым base64-аўдыя (паведамленні, статусы)
+_MIN_BASE64_CHARS = 100
+# Сімвалы стандартных адказаў, якія TTS не агучвае (эмодзі і інш.)
+_NOT_SPOKEN = re.compile(r"[^\w\s.,!?…:;'’\-—–]")
+
 # ────────────────────────── ініцыялізацыя Gradio ─────────────────────────
 HUGGINGFACE_API_TOKEN = os.getenv("HF_TOKEN")
-voice_client = None
+# Імёны Spaces таксама ўваходзяць у ключ кэша TTS (розныя мадэлі — рознае аўдыя)
+TTS_SPACE = "archivartaunik/Bextts" if HUGGINGFACE_API_TOKEN else "archivartaunik/BeTTSNaciski"
+STREAM_TTS_SPACE = "archivartaunik/BexttsAssist"
 
-if HUGGINGFACE_API_TOKEN:
-    gradio_client = Client("archivartaunik/Bextts", hf_token=HUGGINGFACE_API_TOKEN)
-    # Кліент для стрымінгу (BexttsAssist)
-    try:
-        voice_client = Client("archivartaunik/BexttsAssist", hf_token=HUGGINGFACE_API_TOKEN)
-        log.info("BexttsAssist client initialized successfully.")
-    except Exception as e:
-        log.warning(f"Failed to initialize BexttsAssist: {e}")
-else:
+if not HUGGINGFACE_API_TOKEN:
     log.warning("HUGGINGFACE_TOKEN не зададзены — выкарыстоўваю ананімны доступ.")
-    gradio_client = Client("archivartaunik/BeTTSNaciski")
-    try:
-        voice_client = Client("archivartaunik/BexttsAssist")
-        log.info("BexttsAssist client initialized (anon).")
-    except Exception as e:
-        log.warning(f"Failed to initialize BexttsAssist (anon): {e}")
+
+# Пулы кліентаў на кожны Space; кліенты падключаюцца не пры імпарце, а ў фоне
+# пасля старту сервера (warmup_tts_clients). Галасавыя запыты маюць прыярытэт.
+batch_pool = TtsClientPool(
+    "batch", TTS_SPACE,
+    size=config.TTS_BATCH_CLIENTS,
+    max_concurrency=config.TTS_BATCH_CONCURRENCY,
+    max_waiters=config.TTS_ADMISSION_MAX_WAITERS,
+    admission_timeout=config.TTS_ADMISSION_TIMEOUT,
+    starvation_ms=config.TTS_ADMISSION_STARVATION_MS,
+    token=HUGGINGFACE_API_TOKEN,
+    connect_timeout=config.TTS_CLIENT_WAIT,
+    **({"download_files": False} if config.TTS_FETCH_IN_MEMORY else {}),
+)
+# Пул для стрымінгу (BexttsAssist)
+stream_pool = TtsClientPool(
+    "stream", STREAM_TTS_SPACE,
+    size=config.TTS_STREAM_CLIENTS,
+    max_concurrency=config.TTS_STREAM_CONCURRENCY,
+    max_waiters=config.TTS_ADMISSION_MAX_WAITERS,
+    admission_timeout=config.TTS_ADMISSION_TIMEOUT,
+    starvation_ms=config.TTS_ADMISSION_STARVATION_MS,
+    token=HUGGINGFACE_API_TOKEN,
+    connect_timeout=config.TTS_CLIENT_WAIT,
+    # Файлы-вынікі не спампоўваюцца ў часовыя файлы — _item_to_chunk чытае іх у памяць
+    **({"download_files": False} if config.TTS_FETCH_IN_MEMORY else {}),
+)
+TTS_POOLS = (stream_pool, batch_pool)
+
+# Агульны пул вытворцаў для стрымінгавага TTS (колькасць адначасовых Gradio-job-аў абмежаваная)
+tts_engine = TtsStreamEngine(
+    "tts-stream", max_workers=config.TTS_STREAM_WORKERS, max_queue=config.TTS_STREAM_QUEUE_SIZE
+)
+
+# Кэш агучаных фраз: аднолькавы тэкст не сінтэзуецца паўторна
+tts_cache = TtsCache(
+    Path(config.TTS_CACHE_DIR) if config.TTS_CACHE_DIR else None,
+    memory_bytes=config.TTS_CACHE_MEMORY_BYTES,
+    disk_bytes=config.TTS_CACHE_DISK_BYTES,
+    max_text_chars=config.TTS_CACHE_MAX_TEXT_CHARS,
+) if config.TTS_CACHE_ENABLED else None
 
 
 # ────────────────────────── асноўная функцыя ─────────────────────────────
@@ -67,54 +116,71 @@ async def synthesize_speech(
     types.Part
         Part, які ўтрымлівае толькі метаданыя артэфакта (без байтаў).
     """
-    result_path: Optional[str] = None
-
-
     try:
         # Check if streaming is enabled for this user AND voice client is ready
         user_id = tool_context.user_id if tool_context else None
-        if user_id and user_id in voice_queues and voice_client:
+        if user_id and user_id in voice_queues and stream_pool.available:
             log.info(f"Streaming TTS for user {user_id}")
-            queue, loop = voice_queues[user_id]
+            egress, loop = voice_queues[user_id]
             
-            # Stream directly to queue (thread-safe)
-            async for chunk in stream_speech(text, speaker_audio_path):
-                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            # Stream into the connection's egress buffer (its loop); waits while the buffer is full
+            async with aclosing(stream_speech(text, speaker_audio_path)) as chunks:
+                async for chunk in chunks:
+                    accepted = await asyncio.wrap_future(
+                        asyncio.run_coroutine_threadsafe(egress.put(chunk), loop)
+                    )
+                    if not accepted:
+                        # Злучэнне закрыта/перапоўнена — далей не сінтэзуем
+                        break
             
             # Signal end of stream if needed, or just let it be.
             # Frontend handles continuous stream.
             
             return types.Part(text="[Audio streamed directly]")
 
-        # --- выклік Gradio TTS (Standard Mode) ------------------------------------------------
-        if speaker_audio_path:
-            if not os.path.exists(speaker_audio_path):
-                raise FileNotFoundError(f"File for cloning not found: {speaker_audio_path}")
-            result_path = gradio_client.predict(
-                belarusian_story=text,
-                speaker_audio_file=handle_file(speaker_audio_path),
-                api_name="/predict",
-            )
-        else:
-            result_path = gradio_client.predict(
-                belarusian_story=text,
-                speaker_audio_file=None,
-                api_name="/predict",
-            )
+        # --- падзел на сегменты -------------------------------------------------------------
+        if speaker_audio_path and not os.path.exists(speaker_audio_path):
+            raise FileNotFoundError(f"File for cloning not found: {speaker_audio_path}")
+        segments = split_text(text, max_chars=config.TTS_SEGMENT_MAX_CHARS)
+        if not segments:
+            raise ValueError("Nothing to synthesize: text is empty.")
+        speaker = await asyncio.to_thread(speaker_fingerprint, speaker_audio_path) if speaker_audio_path else "default"
 
-        if not result_path or not os.path.exists(result_path):
-            raise ConnectionError("TTS API did not return a WAV file.")
+        # --- выклік Gradio TTS (Standard Mode) ------------------------------------------------
+        # Сегменты паралельна, але не больш за max_concurrency пула ў патоках адначасова
+        # (семафор бярэцца да to_thread — лішнія чакаюць у event loop, а не займаюць воркеры).
+        # Тайм-аўт допуску — толькі для першага сегмента, які не ўзяты з кэша: астатнія стартуюць
+        # пасля дапушчэння запыту і чакаюць слот да TTS_SEGMENT_SLOT_TIMEOUT; парадак аўдыя — парадак сегментаў.
+        # TTS_SEGMENT_PROGRESSIVE: гатовы пачатак сегментаў адразу захоўваецца як версія артэфакта,
+        # каб яго можна было слухаць да канца сінтэзу
+        started = time.monotonic()
+        run = _SegmentRun(batch_pool.max_concurrency)
+        tasks = [
+            asyncio.create_task(_synthesize_segment(segment, speaker_audio_path, speaker, run))
+            for segment in segments
+        ]
+
+        async def save_prefix(prefix: List[memoryview]):
+            await _save_audio(tool_context, concat_wav(prefix))
+            log.info(f"TTS saved {len(prefix)}/{len(segments)} segments, {round((time.monotonic() - started) * 1000)} ms")
 
-        # --- чытаем WAV --------------------------------------------------------
-        with open(result_path, "rb") as f:
-            audio_bytes = f.read()
+        try:
+            # Падае на першай памылцы — не чакаем сегментаў, што стаяць за няўдалым допускам
+            parts: List[memoryview] = await gather_prefixes(
+                tasks, save_prefix if config.TTS_SEGMENT_PROGRESSIVE else None
+            )
+        finally:
+            run.cancelled.set()
+            for task in tasks:
+                task.cancel()
+        audio_bytes = concat_wav(parts)
+        log.info(
+            f"TTS synthesized {len(text)} chars in {len(segments)} segments, "
+            f"{round((time.monotonic() - started) * 1000)} ms"
+        )
 
         # --- ствараем Part і захоўваем як артэфакт ----------------------------
-        audio_part = types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav")
-        artifact_part = await tool_context.save_artifact(
-            filename="tts_output.wav",
-            artifact=audio_part,
-        )
+        artifact_part = await _save_audio(tool_context, audio_bytes)
 
         return artifact_part  # ⬅️ вяртаем Part з artifact (без inline_data)
 
@@ -123,20 +189,95 @@ async def synthesize_speech(
         # вяртаем тэкставую памылку, каб агент мог апрацаваць
         return types.Part(text=f"Памылка пры сінтэзе маўлення: {exc!r}")
 
-    finally:
-        # --- ачышчаем часовы файл --------------------------------------------
-        if result_path and os.path.exists(result_path):
+
+async def _save_audio(tool_context: ToolContext, audio_bytes: bytes):
+    """Захоўвае WAV як чарговую версію артэфакта tts_output.wav."""
+    audio_part = types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav")
+    return await tool_context.save_artifact(
+        filename="tts_output.wav",
+        artifact=audio_part,
+    )
+
+
+class _SegmentSkipped(Exception):
+    """Сегмент не сінтэзаваны, бо запыт ужо праваліўся на іншым сегменце."""
+
+
+class _SegmentRun:
+    """Агульны стан сегментаў аднаго запыту Standard Mode."""
+
+    __slots__ = ("slots", "admitting", "admitted", "cancelled")
+
+    def __init__(self, max_concurrency: int):
+        # Не больш за max_concurrency сегментаў у патоках адначасова
+        self.slots = asyncio.Semaphore(max_concurrency)
+        # Першы сегмент, які не ўзяты з кэша, праходзіць звычайны допуск у пул
+        self.admitting = False
+        # Выстаўляецца, толькі калі гэты сегмент сапраўды атрымаў слот
+        self.admitted = asyncio.Event()
+        # Патокі, што ўжо чакаюць слот, cancel() не спыняе — яны правяраюць гэты сцяг перад выклікам
+        self.cancelled = threading.Event()
+
+
+async def _synthesize_segment(
+    segment: str, speaker_audio_path: Optional[str], speaker: str, run: _SegmentRun
+) -> memoryview:
+    """Адзін сегмент праз пакетны Space (з кэшам па тэксце сегмента).
+
+    Першы сегмент, не знойдзены ў кэшы, праходзіць звычайны допуск (з тайм-аўтам) і,
+    атрымаўшы слот, адзначае запыт дапушчаным; астатнія чакаюць гэтага і бяруць слот
+    пула па-за лімітам чаргі. Калі запыт ужо скасаваны, атрыманы слот вяртаецца без выкліку Space.
+    """
+    cache_key = tts_cache.key(segment, TTS_SPACE, speaker) if tts_cache is not None else None
+    if cache_key:
+        cached = await asyncio.to_thread(tts_cache.get, cache_key)
+        if cached:
+            log.info(f"TTS cache hit ({len(segment)} chars)")
+            return memoryview(cached[0])
+
+    first = not run.admitting
+    if first:
+        run.admitting = True
+    else:
+        await run.admitted.wait()
+    loop = asyncio.get_running_loop()
+
+    def predict() -> memoryview:
+        # Пакетны выклік: чакае месца ў пуле (пасля галасавых запытаў)
+        timeout = None if first else config.TTS_SEGMENT_SLOT_TIMEOUT
+        with batch_pool.lease(PRIORITY_BATCH, timeout, admitted=not first) as lazy:
+            if first:
+                loop.call_soon_threadsafe(run.admitted.set)
+            if run.cancelled.is_set():
+                # Запыт ужо не патрэбны — не марнуем квоту Space
+                raise _SegmentSkipped()
+            client = lazy.get()
             try:
-                os.remove(result_path)
-            except OSError as exc:
-                log.error(f"Не атрымалася выдаліць {result_path}: {exc}")
+                result = client.predict(
+                    belarusian_story=segment,
+                    speaker_audio_file=handle_file(speaker_audio_path) if speaker_audio_path else None,
+                    api_name="/predict",
+                )
+            except Exception as e:
+                lazy.report_failure(e)
+                raise
+            audio = _item_to_chunk(result, lazy)
+        if audio is None:
+            raise ConnectionError("TTS API did not return a WAV file.")
+        return audio
+
+    async with run.slots:
+        audio = await asyncio.to_thread(predict)
+    if cache_key:
+        await asyncio.to_thread(tts_cache.put, cache_key, [audio])
+    return audio
 
 
 # ────────────────────────── global queues for voice streaming ─────────────
-voice_queues: Dict[str, Tuple[asyncio.Queue, asyncio.AbstractEventLoop]] = {}
+voice_queues: Dict[str, Tuple[AudioEgressBuffer, asyncio.AbstractEventLoop]] = {}
 
-def register_voice_user(user_id: str, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
-    voice_queues[user_id] = (queue, loop)
+def register_voice_user(user_id: str, egress: AudioEgressBuffer, loop: asyncio.AbstractEventLoop):
+    voice_queues[user_id] = (egress, loop)
     log.info(f"Registered voice queue for user {user_id}")
 
 def unregister_voice_user(user_id: str):
@@ -144,140 +285,239 @@ def unregister_voice_user(user_id: str):
         del voice_queues[user_id]
         log.info(f"Unregistered voice queue for user {user_id}")
 
-def looks_like_base64(s: str) -> bool:
-    """Check if string looks like base64 (heuristic)."""
-    if not isinstance(s, str):
-        return False
-    if s.startswith("http://") or s.startswith("https://"):
-        return False
-    if s.startswith("data:"):
-        return True
-    # If it is long and continuous, likely base64
-    if len(s) > 100 and not any(c.isspace() for c in s):
-        return True
-    return False
-
-async def stream_speech(text: str, speaker_audio_path: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+async def stream_speech(
+    text: str, speaker_audio_path: Optional[str] = None, priority: int = PRIORITY_VOICE
+) -> AsyncGenerator[bytes, None]:
     """
     Стрымінг аўдыя праз BexttsAssist.
     Вяртае генератар, які yield-зіць байты аўдыя (WAV chunk).
+
+    Job выконваецца ў агульным пуле tts_engine (а не ў асобным патоку на
+    кожны стрым). Калі генератар закрываюць раней (interrupt, aclose),
+    Gradio-job адмяняецца, а неаддадзеныя кавалкі выкідаюцца.
+    Калі пул BexttsAssist заняты, а TTS_STREAM_FALLBACK уключаны, фраза
+    агучваецца праз пакетны Space адным кавалкам.
     """
-    if not voice_client:
-        log.error("Voice client (BexttsAssist) is not initialized. Cannot stream TTS.")
+    cache_key = await _cache_key(text, STREAM_TTS_SPACE, speaker_audio_path)
+    if cache_key:
+        cached = await asyncio.to_thread(tts_cache.get, cache_key)
+        if cached:
+            log.info(f"TTS cache hit ({len(text)} chars, {len(cached)} chunks)")
+            for chunk in cached:
+                yield chunk
+            return
+
+    if not stream_pool.available:
+        log.error(f"Voice clients (BexttsAssist) are unavailable: {stream_pool.health()['clients']}. Cannot stream TTS.")
         return
-    
-    import asyncio
-    import queue
-    import threading
-    import struct
-    
-    loop = asyncio.get_running_loop()
-    
+
     log.info(f"Streaming TTS via BexttsAssist. Text length: {len(text)}. First 100 chars: {text[:100]}")
-    
-    # Queue to bridge the blocking thread and async generator
-    chunk_queue = queue.Queue()
-    SENTINEL_DONE = object()
-    
-    def producer_thread():
+
+    used: Dict[str, Any] = {}
+
+    def start_job():
+        audio_input = handle_file(speaker_audio_path) if speaker_audio_path else None
+        # Runs in the producer pool: waits here for an admission slot and for client warmup
+        pool, api_name, kwargs = stream_pool, "/text_to_speech", {"text_input": text, "speaker_audio": audio_input}
+        if config.TTS_STREAM_FALLBACK and stream_pool.saturated and not batch_pool.saturated:
+            pool, api_name = batch_pool, "/predict"
+            kwargs = {"belarusian_story": text, "speaker_audio_file": audio_input}
+            stream_pool.note_fallback()
+            used["fallback"] = True
+            log.info("BexttsAssist pool is saturated; falling back to the batch TTS Space")
+        lazy = pool.acquire(priority)
+        used["client"] = lazy
         try:
-            audio_input = handle_file(speaker_audio_path) if speaker_audio_path else None
             # Use submit() to get an iterator over yields (streaming)
-            job = voice_client.submit(
-                text_input=text,
-                speaker_audio=audio_input,
-                api_name="/text_to_speech"
-            )
-            
-            # Iterate over updates from the job
-            for result in job:
-                chunk_queue.put(result)
-                
+            return _LeasedJob(lazy.get().submit(api_name=api_name, **kwargs), lambda: pool.release(lazy))
         except Exception as e:
-            log.error(f"BexttsAssist prediction error: {e}")
-            traceback.print_exc()
-        finally:
-            chunk_queue.put(SENTINEL_DONE)
-
-    # Start the blocking Gradio client interaction in a separate thread
-    t = threading.Thread(target=producer_thread, daemon=True)
-    t.start()
-    
-    def add_wav_header(pcm_data: bytes, sample_rate: int = 24000, channels: int = 1) -> bytes:
-        """Add WAV header to raw PCM data (Float32)."""
-        byte_count = len(pcm_data)
-        # 36 bytes for header info + data length
-        header = struct.pack('<4sI4s4sIHHIIHH4sI', 
-            b'RIFF',
-            byte_count + 36,
-            b'WAVE',
-            b'fmt ',
-            16,              # Subchunk1Size
-            3,               # AudioFormat: 3 for IEEE Float
-            channels,        # NumChannels
-            sample_rate,     # SampleRate
-            sample_rate * channels * 4, # ByteRate
-            channels * 4,    # BlockAlign
-            32,              # BitsPerSample (Float32)
-            b'data',
-            byte_count
-        )
-        return header + pcm_data
-
-    # Helper to process a single result item (path or base64) and yield bytes
-    def process_item_sync(item):
-        path_to_read = None
-        bytes_to_yield = None
-        
-        if isinstance(item, str):
-            if os.path.exists(item):
-                path_to_read = item
-            elif looks_like_base64(item):
-                try:
-                    bytes_to_yield = base64.b64decode(item)
-                except: pass
-        
-        if bytes_to_yield:
-             if not bytes_to_yield.startswith(b'RIFF'):
-                 # Add header if raw
-                 bytes_to_yield = add_wav_header(bytes_to_yield)
-             return bytes_to_yield
-        
-        elif path_to_read:
-            file_size = os.path.getsize(path_to_read)
-            # log.info(f"Yielding audio file: {path_to_read} ({file_size} bytes)")
-            with open(path_to_read, "rb") as f:
-                content = f.read()
-            try:
-                os.remove(path_to_read)
-            except: pass
-            return content
-        return None
+            pool.release(lazy)
+            lazy.report_failure(e)
+            raise
 
-    # Consumption loop
-    while True:
-        # Run queue.get in executor to avoid blocking the event loop
-        result = await loop.run_in_executor(None, chunk_queue.get)
-        
-        if result is SENTINEL_DONE:
-            break
-            
-        # Log result type roughly
-        # with open("tts_debug.log", "a", encoding="utf-8") as f:
-        #     f.write(f"Stream result: {str(result)[:200]}\n")
-
-        # Iterate over result content (tuple or single)
-        items_to_process = result if isinstance(result, (list, tuple)) else [result]
-        
-        for item in items_to_process:
-            audio_chunk = process_item_sync(item)
-            if audio_chunk:
+    # Кавалкі чытаюцца/дэкадуюцца ў патоку пула і трапляюць у чаргу спажыўца гатовымі
+    def convert(result) -> List[memoryview]:
+        return _result_to_chunks(result, used.get("client"))
+
+    produced: List[memoryview] = []
+    try:
+        async with aclosing(tts_engine.stream(
+            f"{len(text)} chars", start_job, convert, _cancel_job, _discard_result
+        )) as chunks:
+            async for audio_chunk in chunks:
                 log.info(f"Yielding audio chunk ({len(audio_chunk)} bytes)")
+                if cache_key:
+                    produced.append(audio_chunk)
                 yield audio_chunk
+    except PoolSaturatedError as e:
+        log.error(f"TTS stream rejected: {e}")
+        return
+    except Exception as e:
+        log.error(f"BexttsAssist prediction error: {e}")
+        return
 
+    # Аўдыя з запаснога Space — іншы голас/мадэль, пад ключ BexttsAssist яго не кладзём
+    if cache_key and produced and not used.get("fallback"):
+        await asyncio.to_thread(tts_cache.put, cache_key, produced)
     log.info("Finished streaming TTS.")
 
 
+def _item_to_chunk(item, lazy=None) -> Optional[memoryview]:
+    """
+    Адзін элемент выніку Gradio -> WAV-кавалак (memoryview).
+
+    FileData (download_files=False) чытаецца са Space адразу ў памяць, base64
+    дэкадуецца без асобнай праверкі радка, лакальны файл чытаецца ў гатовы
+    буфер і выдаляецца. Да send_bytes дадзеныя капіююцца не больш за раз.
+    """
+    if isinstance(item, dict):
+        url = item.get("url")
+        if not url or lazy is None:
+            return None
+        return _as_wav(lazy.fetch(url))
+    if not isinstance(item, str) or not item:
+        return None
+    if item.startswith(("http://", "https://")):
+        return _as_wav(lazy.fetch(item)) if lazy is not None else None
+    if len(item) < _MAX_PATH and os.path.exists(item):
+        return _read_file(item)
+    payload = item.partition(",")[2] if item.startswith("data:") else item
+    if len(payload) <= _MIN_BASE64_CHARS:
+        return None
+    try:
+        # Прабелы/пераносы a2b_base64 прапускае сам — папярэдні агляд радка не патрэбны
+        return _as_wav(binascii.a2b_base64(payload))
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _as_wav(data: bytes) -> memoryview:
+    """Гатовы WAV — як ёсць; сырыя Float32-сэмплы (24 кГц) — у буфер з загалоўкам (адна копія)."""
+    if data[:4] == b"RIFF":
+        return memoryview(data)
+    frame = wav_buffer(len(data), WAVE_FORMAT_IEEE_FLOAT, 24000, 1, 4)
+    frame[WAV_HEADER_SIZE:] = data
+    return memoryview(frame)
+
+
+def _read_file(path: str) -> memoryview:
+    """Файл цалкам у адзін буфер (readinto, без прамежкавых bytes), потым выдаляецца."""
+    with open(path, "rb", buffering=0) as f:
+        buf = bytearray(os.fstat(f.fileno()).st_size)
+        view = memoryview(buf)
+        filled = 0
+        while filled < len(buf):
+            n = f.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return view[:filled]
+
+
+def _result_to_chunks(result, lazy=None) -> List[memoryview]:
+    """Вынік Gradio (кортэж або адзін элемент) -> кавалкі аўдыя; выконваецца ў патоку-вытворцы."""
+    items = result if isinstance(result, (list, tuple)) else [result]
+    return [chunk for chunk in (_item_to_chunk(item, lazy) for item in items) if chunk]
+
+
+async def _cache_key(text: str, model: str, speaker_audio_path: Optional[str]) -> Optional[str]:
+    if tts_cache is None:
+        return None
+    speaker = await asyncio.to_thread(speaker_fingerprint, speaker_audio_path) if speaker_audio_path else "default"
+    return tts_cache.key(text, model, speaker)
+
+
+def warmup_tts_clients():
+    """Фонавае падключэнне TTS-кліентаў (выклікаецца пасля старту сервера, не блакуе)."""
+    for pool in TTS_POOLS:
+        pool.warmup()
+
+
+async def check_tts_clients():
+    """Health-check усіх TTS-кліентаў; тыя, што не адказваюць, перападключаюцца ў фоне."""
+    for pool in TTS_POOLS:
+        await asyncio.to_thread(pool.check)
+
+
+def tts_clients_health() -> Dict[str, Dict]:
+    return {pool.name: pool.health() for pool in TTS_POOLS}
+
+
+def tts_pools_stats() -> Dict[str, Dict]:
+    return {pool.name: pool.stats() for pool in TTS_POOLS}
+
+
+def speak_phrase(phrase: str, priority: int = PRIORITY_VOICE) -> AsyncGenerator[bytes, None]:
+    """Стандартны адказ (заняты / памылка / няма адказу) голасам; эмодзі не агучваюцца.
+
+    Тэкст для TTS той жа, што і ў prewarm_tts_cache, таму аўдыя бярэцца з кэша.
+    """
+    return stream_speech(_NOT_SPOKEN.sub("", phrase).strip(), priority=priority)
+
+
+async def prewarm_tts_cache(phrases: List[str]):
+    """Агучвае фразы, якіх яшчэ няма ў кэшы (стандартныя адказы для speak_phrase) — пры старце, у фоне."""
+    if tts_cache is None:
+        return
+    warmed = 0
+    for phrase in phrases:
+        try:
+            async with aclosing(speak_phrase(phrase, priority=PRIORITY_BATCH)) as chunks:
+                async for _ in chunks:
+                    pass
+            warmed += 1
+        except Exception as e:
+            log.warning(f"TTS pre-warm failed for '{phrase[:30]}': {e}")
+    log.info(f"TTS cache pre-warmed: {warmed}/{len(phrases)} phrases; {tts_cache.stats()}")
+
+
+class _LeasedJob:
+    """Gradio-job, які трымае месца ў пуле кліентаў да канца ітэрацыі або адмены."""
+
+    def __init__(self, job, release):
+        self.job = job
+        self._release = release
+        self._released = threading.Lock()
+
+    def __iter__(self):
+        try:
+            yield from self.job
+        finally:
+            self.release()
+
+    def cancel(self):
+        try:
+            return self.job.cancel()
+        finally:
+            self.release()
+
+    def release(self):
+        if self._released.acquire(blocking=False):
+            self._release()
+
+
+def _cancel_job(job):
+    try:
+        job.cancel()
+        cancellation.inc("tts_jobs_cancelled")
+    except Exception as e:
+        log.warning(f"Failed to cancel BexttsAssist job: {e}")
+
+
+def _discard_result(result):
+    """Выдаляе часовыя файлы з неаддадзенага выніку Gradio."""
+    for item in (result if isinstance(result, (list, tuple)) else [result]):
+        if isinstance(item, str) and len(item) < _MAX_PATH and os.path.exists(item):
+            try:
+                os.remove(item)
+            except OSError:
+                pass
+
+
 
 # ────────────────────────── рэгістрацыя ў ADK ────────────────────────────
 synthesize_speech_tool = FunctionTool(func=synthesize_speech)
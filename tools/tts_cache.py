@@ -0,0 +1,217 @@
+# tools/tts_cache.py
+"""
+Кэш сінтэзаванага маўлення па змесце.
+
+Ключ — sha256 ад нармалізаванага тэксту, голасу (хэш файла-ўзору) і мадэлі TTS,
+значэнне — спіс аўдыя-кавалкаў (кожны — самастойны WAV), таму з кэша можна
+аддаваць аўдыя тымі ж кавалкамі, што і падчас стрымінгу.
+Два ўзроўні: LRU у памяці (бюджэт у байтах) і файлы на дыску.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LENGTH = struct.Struct("<I")
+_MAGIC = b"TTSC1"
+
+
+def normalize_text(text: str) -> str:
+    """NFC + адзін прабел паміж словамі: розныя прабелы/камбінаваныя літары не даюць новага ключа."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def speaker_fingerprint(speaker_audio_path: Optional[str]) -> str:
+    """Голас па змесце файла-ўзору (часовыя файлы маюць кожны раз новае імя)."""
+    if not speaker_audio_path:
+        return "default"
+    digest = hashlib.sha256()
+    with open(speaker_audio_path, "rb") as f:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TtsCache:
+    def __init__(
+        self,
+        root: Optional[Path],
+        memory_bytes: int = 32 * 1024 * 1024,
+        disk_bytes: int = 512 * 1024 * 1024,
+        max_text_chars: int = 500,
+    ):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_text_chars = max_text_chars
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if root is not None:
+            root.mkdir(parents=True, exist_ok=True)
+            self._disk_used = sum(p.stat().st_size for p in root.glob("*.tts"))
+
+    def key(self, text: str, model: str, speaker: str = "default") -> Optional[str]:
+        """Ключ кэша; None — тэкст не кэшуецца (пусты або задоўгі)."""
+        normalized = normalize_text(text)
+        if not normalized or len(normalized) > self.max_text_chars:
+            return None
+        return hashlib.sha256("\x00".join((model, speaker, normalized)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """Кавалкі аўдыя або None. Чытанне з дыска блакуе — з async-кода выклікаць праз to_thread."""
+        with self._lock:
+            chunks = self._memory.get(key)
+            if chunks is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return chunks
+        chunks = self._read_disk(key)
+        with self._lock:
+            if chunks is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, chunks)
+        return chunks
+
+    def put(self, key: str, chunks: List[bytes]):
+        if not chunks:
+            return
+        chunks = [bytes(c) for c in chunks]
+        with self._lock:
+            self._remember(key, chunks)
+            self._stats["stores"] += 1
+        self._write_disk(key, chunks)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used,
+                **self._stats,
+            }
+
+    # ───────────── памяць ─────────────
+    def _remember(self, key: str, chunks: List[bytes]):
+        size = sum(len(c) for c in chunks)
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= sum(len(c) for c in old)
+        self._memory[key] = chunks
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= sum(len(c) for c in evicted)
+
+    # ───────────── дыск ─────────────
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.tts"
+
+    def _read_disk(self, key: str) -> Optional[List[bytes]]:
+        if self.root is None:
+            return None
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.warning(f"TTS cache read failed for {path.name}: {e}")
+            return None
+        chunks = _unpack(data)
+        if chunks is None:
+            log.warning(f"TTS cache entry {path.name} is corrupt; removing")
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mtime = апошняе выкарыстанне (для выцяснення)
+        except OSError:
+            pass
+        return chunks
+
+    def _write_disk(self, key: str, chunks: List[bytes]):
+        if self.root is None:
+            return
+        path = self._path(key)
+        if path.exists():
+            return
+        data = _pack(chunks)
+        try:
+            # Атамарна: часовы файл + rename, каб паралельны чытач не ўбачыў паловы запісу
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning(f"TTS cache write failed for {path.name}: {e}")
+            return
+        with self._lock:
+            self._disk_used += len(data)
+            over = self._disk_used > self.disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(self.root.glob("*.tts"), key=lambda p: p.stat().st_mtime)
+        for path in entries:
+            with self._lock:
+                if self._disk_used <= self.disk_bytes:
+                    return
+            self._remove(path)
+            with self._lock:
+                self._stats["evictions"] += 1
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._disk_used -= size
+
+
+def _pack(chunks: List[bytes]) -> bytes:
+    parts = [_MAGIC, _LENGTH.pack(len(chunks))]
+    for chunk in chunks:
+        parts.append(_LENGTH.pack(len(chunk)))
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+def _unpack(data: bytes) -> Optional[List[bytes]]:
+    if not data.startswith(_MAGIC):
+        return None
+    view = memoryview(data)
+    offset = len(_MAGIC)
+    try:
+        (count,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        chunks = []
+        for _ in range(count):
+            (size,) = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size
+            if offset + size > len(view):
+                return None
+            chunks.append(bytes(view[offset:offset + size]))
+            offset += size
+    except struct.error:
+        return None
+    return chunks
@@ -0,0 +1,377 @@
+# tools/tts_clients.py
+"""
+Лянотныя Gradio-кліенты для TTS.
+
+Client(...) робіць сеткавы handshake са Space, таму ён больш не ствараецца
+пры імпарце модуля: падключэнне ідзе ў фонавым патоку пасля старту
+сервера (warmup), а першы запыт чакае толькі тады, калі прагрэў яшчэ не
+скончыўся. Няўдалае падключэнне паўтараецца з экспанентнай затрымкай;
+health-check перападключае кліент, калі Space перастаў адказваць.
+
+TtsClientPool — некалькі такіх кліентаў на адзін Space з прыярытэтнай
+чаргой допуску і абмежаваннем адначасовых выклікаў.
+"""
+
+import logging
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+from gradio_client import Client
+
+from services.metrics import LatencyHistogram
+from services.worker_pool import PoolSaturatedError
+
+log = logging.getLogger(__name__)
+
+
+class TtsUnavailableError(ConnectionError):
+    """TTS Space недаступны (падключэнне не ўдалося або не паспела)."""
+
+
+class LazyGradioClient:
+    """Адзін Gradio-кліент: фонавы прагрэў, чаканне ў get(), праверка стану і перападключэнне."""
+
+    def __init__(
+        self,
+        space: str,
+        token: Optional[str] = None,
+        connect_timeout: float = 60.0,
+        retry_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        **client_kwargs: Any,
+    ):
+        self.space = space
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.client_kwargs = client_kwargs
+        self._cond = threading.Condition()
+        self._client: Optional[Client] = None
+        self._connecting = False
+        self._error: Optional[str] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._connected_at: Optional[float] = None
+        self._connect_ms: Optional[float] = None
+        self._last_check: Optional[float] = None
+        self._healthy: Optional[bool] = None
+        self._reconnects = 0
+        self._http: Optional[httpx.Client] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    @property
+    def available(self) -> bool:
+        """Ёсць кліент або варта спрабаваць (не чакаем паўтору пасля няўдалага падключэння)."""
+        return self._client is not None or self._connecting or time.monotonic() >= self._retry_at
+
+    def warmup(self):
+        """Пачынае падключэнне ў фоне (калі кліента няма і падключэнне не ідзе); не блакуе."""
+        with self._cond:
+            if self._client is not None or self._connecting or time.monotonic() < self._retry_at:
+                return
+            self._connecting = True
+        threading.Thread(target=self._connect, name=f"tts-connect-{self.space}", daemon=True).start()
+
+    def get(self, timeout: Optional[float] = None) -> Client:
+        """Гатовы кліент; пры неабходнасці чакае прагрэву (у патоку-воркеры, не ў event loop)."""
+        client = self._client
+        if client is not None:
+            return client
+        self.warmup()
+        deadline = time.monotonic() + (self.connect_timeout if timeout is None else timeout)
+        with self._cond:
+            while self._client is None and self._connecting:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._client is not None:
+                return self._client
+            reason = "still connecting" if self._connecting else self._error
+        raise TtsUnavailableError(f"TTS Space {self.space} unavailable: {reason}")
+
+    def reconnect(self, reason: str):
+        """Адкідае бягучы кліент і падключаецца нанава ў фоне."""
+        with self._cond:
+            if self._client is None:
+                return
+            log.warning(f"Reconnecting TTS client {self.space}: {reason}")
+            self._client = None
+            self._reconnects += 1
+            self._retry_at = 0.0
+            http, self._http = self._http, None
+        if http is not None:
+            http.close()
+        self.warmup()
+
+    def fetch(self, url: str, timeout: float = 60.0) -> bytes:
+        """
+        Файл-вынік са Space адразу ў памяць (для download_files=False) — без
+        часовага файла; HTTP-злучэнне са Space перавыкарыстоўваецца.
+        """
+        client = self.get()
+        with self._cond:
+            http = self._http
+            if http is None:
+                http = self._http = httpx.Client(
+                    headers=client.headers,
+                    cookies=client.cookies,
+                    verify=client.ssl_verify,
+                    follow_redirects=True,
+                    **{"timeout": timeout, **client.httpx_kwargs},
+                )
+        response = http.get(urllib.parse.urljoin(client.src, url))
+        response.raise_for_status()
+        return response.content
+
+    def check(self, timeout: float = 10.0) -> bool:
+        """Health-check: GET /config Space-а. Блакуе — з async-кода праз to_thread."""
+        client = self._client
+        if client is None:
+            self.warmup()
+            return False
+        try:
+            response = httpx.get(
+                urllib.parse.urljoin(client.src, "config"),
+                headers=client.headers,
+                cookies=client.cookies,
+                timeout=timeout,
+            )
+            healthy = response.is_success
+            reason = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            healthy, reason = False, repr(e)
+        with self._cond:
+            self._last_check = time.monotonic()
+            self._healthy = healthy
+        if not healthy:
+            self.reconnect(f"health check failed ({reason})")
+        return healthy
+
+    def report_failure(self, error: BaseException):
+        """Памылка выкліку: калі Space і праўда недаступны, health-check перападключыць кліент."""
+        if isinstance(error, (httpx.HTTPError, ConnectionError, OSError)):
+            self.check()
+
+    def health(self) -> Dict[str, Any]:
+        with self._cond:
+            if self._client is not None:
+                state = "ready"
+            elif self._connecting:
+                state = "connecting"
+            elif self._error:
+                state = "failed"
+            else:
+                state = "idle"
+            now = time.monotonic()
+            return {
+                "space": self.space,
+                "state": state,
+                "healthy": self._healthy,
+                "last_error": self._error,
+                "failures": self._failures,
+                "reconnects": self._reconnects,
+                "connect_ms": self._connect_ms,
+                "uptime_s": round(now - self._connected_at) if self._client is not None and self._connected_at else None,
+                "last_check_ago_s": round(now - self._last_check) if self._last_check else None,
+            }
+
+    def _connect(self):
+        started = time.monotonic()
+        client, error = None, None
+        try:
+            client = Client(self.space, token=self.token, verbose=False, **self.client_kwargs)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._connecting = False
+            now = time.monotonic()
+            if client is not None:
+                self._client = client
+                self._error = None
+                self._failures = 0
+                self._healthy = True
+                self._connected_at = now
+                self._connect_ms = round((now - started) * 1000, 1)
+                log.info(f"TTS client {self.space} connected in {self._connect_ms} ms")
+            else:
+                self._failures += 1
+                self._error = repr(error)
+                backoff = min(self.retry_backoff * 2 ** (self._failures - 1), self.max_backoff)
+                self._retry_at = now + backoff
+                log.warning(f"TTS client {self.space} failed to connect ({error}); retry in {backoff:.0f}s")
+            self._cond.notify_all()
+
+
+# Прыярытэты допуску: меншы — раней
+PRIORITY_VOICE = 0
+PRIORITY_BATCH = 1
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "enqueued")
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+
+class TtsClientPool:
+    """
+    Некалькі LazyGradioClient аднаго Space з кантролем допуску.
+
+    Адначасова працуе не больш за max_concurrency выклікаў; астатнія чакаюць
+    у чарзе (не больш за max_waiters, інакш — PoolSaturatedError адразу).
+    Чарга прыярытэтная (галасавыя запыты раней за пакетныя), у межах
+    прыярытэту — FIFO; запыт, які чакае даўжэй за starvation_ms, лічыцца
+    найвышэйшага прыярытэту, каб пакетныя выклікі не галадалі. Выклік
+    атрымлівае найменш загружаны гатовы кліент.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        space: str,
+        size: int = 1,
+        max_concurrency: int = 4,
+        max_waiters: int = 64,
+        admission_timeout: float = 30.0,
+        starvation_ms: float = 10000.0,
+        token: Optional[str] = None,
+        connect_timeout: float = 60.0,
+        **client_kwargs: Any,
+    ):
+        self.name = name
+        self.space = space
+        self.clients = [
+            LazyGradioClient(space, token=token, connect_timeout=connect_timeout, **client_kwargs)
+            for _ in range(max(1, size))
+        ]
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_waiters = max(0, max_waiters)
+        self.admission_timeout = admission_timeout
+        self.starvation_ms = starvation_ms
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+        self._active = 0
+        self._inflight: Dict[int, int] = {id(c): 0 for c in self.clients}
+        self._queue_ms: Dict[int, LatencyHistogram] = {}
+        self._stats: Dict[str, int] = {"admitted": 0, "rejected": 0, "timeouts": 0, "fallbacks": 0}
+
+    @property
+    def saturated(self) -> bool:
+        """Няма вольнага месца: новы выклік стаў бы ў чаргу."""
+        return self._active + len(self._waiters) >= self.max_concurrency
+
+    @property
+    def available(self) -> bool:
+        return any(c.available for c in self.clients)
+
+    @contextmanager
+    def lease(
+        self, priority: int = PRIORITY_BATCH, timeout: Optional[float] = None, admitted: bool = False
+    ) -> Iterator[LazyGradioClient]:
+        """Блакуючы допуск (у патоку-воркеры); вяртае кліент на час выкліку."""
+        client = self.acquire(priority, timeout, admitted)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def acquire(
+        self, priority: int = PRIORITY_BATCH, timeout: Optional[float] = None, admitted: bool = False
+    ) -> LazyGradioClient:
+        """admitted=True — наступная частка ўжо дапушчанага запыту: без ліміту чаргі (тайм-аўт — timeout)."""
+        timeout = self.admission_timeout if timeout is None else timeout
+        with self._cond:
+            if not admitted and self._active >= self.max_concurrency and len(self._waiters) >= self.max_waiters:
+                self._stats["rejected"] += 1
+                raise PoolSaturatedError(
+                    f"TTS pool '{self.name}' is saturated ({self._active} active, {len(self._waiters)} waiting)"
+                )
+            self._seq += 1
+            waiter = _Waiter(priority, self._seq)
+            self._waiters.append(waiter)
+            deadline = waiter.enqueued + timeout
+            try:
+                while not (self._active < self.max_concurrency and self._next() is waiter):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolSaturatedError(f"TTS pool '{self.name}': no slot within {timeout:.0f}s")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                # Пры выхадзе па тайм-аўце чарга змянілася — іншы чакаючы можа стаць першым
+                self._cond.notify_all()
+            self._active += 1
+            self._stats["admitted"] += 1
+            self._queue_ms.setdefault(priority, LatencyHistogram()).observe((time.monotonic() - waiter.enqueued) * 1000)
+            client = self._pick()
+            self._inflight[id(client)] += 1
+            return client
+
+    def release(self, client: LazyGradioClient):
+        with self._cond:
+            self._active -= 1
+            self._inflight[id(client)] -= 1
+            self._cond.notify_all()
+
+    def note_fallback(self):
+        with self._cond:
+            self._stats["fallbacks"] += 1
+
+    def warmup(self):
+        for client in self.clients:
+            client.warmup()
+
+    def check(self):
+        for client in self.clients:
+            client.check()
+
+    def health(self) -> Dict[str, Any]:
+        clients = [c.health() for c in self.clients]
+        return {
+            "space": self.space,
+            "ready": sum(c["state"] == "ready" for c in clients),
+            "clients": clients,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "space": self.space,
+                "clients": len(self.clients),
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "waiting": len(self._waiters),
+                **self._stats,
+                "queue_ms": {_PRIORITY_NAMES.get(p, str(p)): h.summary() for p, h in sorted(self._queue_ms.items())},
+            }
+
+    def _next(self) -> _Waiter:
+        now = time.monotonic()
+
+        def rank(w: _Waiter):
+            starving = (now - w.enqueued) * 1000 >= self.starvation_ms
+            return (PRIORITY_VOICE if starving else w.priority, w.seq)
+
+        return min(self._waiters, key=rank)
+
+    def _pick(self) -> LazyGradioClient:
+        # Найменш загружаны сярод гатовых; калі гатовых няма — сярод тых, што падключаюцца
+        candidates = [c for c in self.clients if c.ready] or [c for c in self.clients if c.available] or self.clients
+        return min(candidates, key=lambda c: self._inflight[id(c)])
+
+
+_PRIORITY_NAMES = {PRIORITY_VOICE: "voice", PRIORITY_BATCH: "batch"}
@@ -0,0 +1,194 @@
+# tools/tts_stream_engine.py
+"""
+Рухавік стрымінгавага TTS: блакуючыя Gradio-job-ы выконваюцца ў абмежаваным
+пуле патокаў, а гатовыя кавалкі аўдыя трапляюць у asyncio.Queue спажыўца
+праз call_soon_threadsafe — без асобнага патока на кожны стрым і без
+блакуючых get у executor-ы.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional
+
+from services.metrics import LatencyHistogram, cancellation
+from services.worker_pool import BoundedWorkerPool
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StreamStats:
+    """Метрыкі аднаго стрыма: затрымка першага кавалка, аб'ём, хуткасць, глыбіня чаргі."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.monotonic()
+        self.first_chunk_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks = 0
+        self.bytes = 0
+        self.max_queue_depth = 0
+        self.outcome: Optional[str] = None
+        self.queue: Optional[asyncio.Queue] = None
+
+    def on_chunk(self, size: int):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+        self.chunks += 1
+        self.bytes += size
+        if self.queue is not None:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+
+    @property
+    def first_chunk_ms(self) -> Optional[float]:
+        return round((self.first_chunk_at - self.started) * 1000, 1) if self.first_chunk_at else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started
+        return {
+            "label": self.label,
+            "outcome": self.outcome,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "first_chunk_ms": self.first_chunk_ms,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "bytes_per_s": round(self.bytes / elapsed) if elapsed > 0 else None,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class TtsStreamEngine:
+    """
+    Агульны пул вытворцаў для стрымінгавага TTS.
+
+    stream() запускае start_job у пуле (не больш за max_workers адначасова,
+    max_queue чакаюць; далей — PoolSaturatedError), пераўтварае кожны вынік
+    job-а ў кавалкі ўжо ў патоку-вытворцы і аддае іх спажыўцу праз
+    asyncio.Queue. Калі спажывец сыходзіць раней, job адмяняецца, а
+    неаддадзеныя кавалкі выкідаюцца.
+    """
+
+    def __init__(self, name: str = "tts-stream", max_workers: int = 8, max_queue: int = 32, keep_recent: int = 20):
+        self.pool = BoundedWorkerPool(name, max_workers=max_workers, max_queue=max_queue)
+        self._lock = threading.Lock()
+        self._active: Dict[int, StreamStats] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=keep_recent)
+        self._first_chunk = LatencyHistogram()
+        self._totals: Dict[str, int] = {"streams": 0, "chunks": 0, "bytes": 0, "ok": 0, "cancelled": 0, "error": 0}
+
+    async def stream(
+        self,
+        label: str,
+        start_job: Callable[[], Iterable[Any]],
+        convert: Callable[[Any], List[bytes]],
+        cancel_job: Callable[[Any], None],
+        discard: Callable[[Any], None],
+    ) -> AsyncIterator[bytes]:
+        """
+        start_job() — блакуючы старт job-а (ітэрацыя па ім дае вынікі);
+        convert(result) — вынік -> кавалкі аўдыя (у патоку-вытворцы);
+        cancel_job(job) / discard(result) — адмена job-а і ачыстка непатрэбнага выніку.
+        Памылка вытворцы падымаецца пасля ўсіх ужо атрыманых кавалкаў.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        state: Dict[str, Any] = {}
+        stats = StreamStats(label)
+        stats.queue = chunks
+
+        def push(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop ужо закрыты
+
+        def produce():
+            try:
+                if stop.is_set():
+                    return
+                job = start_job()
+                state["job"] = job
+                if stop.is_set():
+                    cancel_job(job)
+                    return
+                for result in job:
+                    if stop.is_set():
+                        discard(result)
+                        break
+                    for chunk in convert(result):
+                        push(chunk)
+            except Exception as e:
+                state["error"] = e
+            finally:
+                push(_DONE)
+
+        future = self.pool.submit(produce)
+        with self._lock:
+            self._active[id(stats)] = stats
+            self._totals["streams"] += 1
+        cancellation.inc("tts_streams_started")
+
+        finished = False
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                stats.on_chunk(len(item))
+                yield item
+        finally:
+            if not finished:
+                # Спажывец сышоў раней: спыняем вытворцу і адмяняем job на баку Gradio
+                stop.set()
+                cancellation.inc("tts_streams_cancelled")
+                if future.cancel():
+                    cancellation.inc("tts_streams_cancelled_queued")
+                job = state.get("job")
+                if job is not None:
+                    loop.run_in_executor(None, cancel_job, job)
+                discarded = 0
+                while not chunks.empty():
+                    if chunks.get_nowait() is not _DONE:
+                        discarded += 1
+                cancellation.inc("tts_chunks_discarded", discarded)
+                log.info(f"TTS stream '{label}' cancelled; discarded {discarded} pending chunks")
+            outcome = "error" if "error" in state else ("ok" if finished else "cancelled")
+            self._finish(stats, outcome)
+
+        if "error" in state:
+            raise state["error"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pool": self.pool.stats(),
+                "active_streams": [s.snapshot() for s in self._active.values()],
+                "totals": dict(self._totals),
+                "first_chunk_latency": self._first_chunk.summary(),
+                "recent": list(self._recent),
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+    def _finish(self, stats: StreamStats, outcome: str):
+        stats.outcome = outcome
+        stats.finished_at = time.monotonic()
+        snapshot = stats.snapshot()
+        stats.queue = None
+        with self._lock:
+            self._active.pop(id(stats), None)
+            self._totals[outcome] += 1
+            self._totals["chunks"] += stats.chunks
+            self._totals["bytes"] += stats.bytes
+            if stats.first_chunk_ms is not None:
+                self._first_chunk.observe(stats.first_chunk_ms)
+            self._recent.append(snapshot)